@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos tipos de índice FAISS: recall@k contra o índice flat (exato),
+latência por consulta (p50/p95/p99), tempo de build e memória do índice.
+
+Exemplos:
+  python benchmark_index.py                          # corpus sintético (50k x 768)
+  python benchmark_index.py --n 200000 --dim 3072    # escala do spike de vector store
+  python benchmark_index.py --real                   # vetores dos shards já indexados
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+# Add project root to sys.path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.infrastructure.faiss_index import IndexConfig, build_index, configure_search
+
+
+def synthetic_corpus(n: int, dim: int, n_queries: int, seed: int = 42):
+    """Vetores normalizados agrupados em clusters, como embeddings reais de texto."""
+    rng = np.random.default_rng(seed)
+    n_clusters = max(8, n // 500)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n)
+    vectors = centers[labels] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    picks = rng.choice(n, size=n_queries, replace=False)
+    queries = vectors[picks] + 0.05 * rng.normal(size=(n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors, queries.astype(np.float32)
+
+
+def real_corpus(index_root: str, n_queries: int, seed: int = 42):
+    """Vetores dos shards FAISS gravados (somente índices que permitem reconstrução)."""
+    parts = []
+    for index_file in sorted(Path(index_root).glob("*/index.faiss")):
+        index = faiss.read_index(str(index_file))
+        parts.append(index.reconstruct_n(0, index.ntotal))
+        print(f"📂 {index_file.parent.name}: {index.ntotal} vetores")
+    if not parts:
+        raise SystemExit(f"Nenhum shard encontrado em {index_root}. Execute initialize.py antes.")
+
+    vectors = np.vstack(parts).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    queries = vectors[picks] + 0.01 * rng.normal(size=(len(picks), vectors.shape[1])).astype(np.float32)
+    return vectors, queries.astype(np.float32)
+
+
+def default_grid(n: int):
+    """Pares (config de build, variações de busca) avaliados por padrão."""
+    nlist = int(4 * np.sqrt(n))
+    return [
+        (IndexConfig(index_type="flat"), [{}]),
+        (IndexConfig(index_type="ivf", nlist=nlist), [{"nprobe": p} for p in (1, 8, 32)]),
+        (IndexConfig(index_type="hnsw", hnsw_m=32), [{"hnsw_ef_search": ef} for ef in (32, 64, 128)]),
+        (IndexConfig(index_type="ivfpq", nlist=nlist, pq_m=32), [{"nprobe": p} for p in (8, 32)]),
+    ]
+
+
+def measure_latencies(index, queries: np.ndarray, k: int):
+    latencies = []
+    results = np.empty((len(queries), k), dtype=np.int64)
+    for i in range(len(queries)):
+        started = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results[i] = ids[0]
+    return np.asarray(latencies), results
+
+
+def recall_at_k(results: np.ndarray, ground_truth: np.ndarray) -> float:
+    k = ground_truth.shape[1]
+    hits = sum(len(set(r) & set(g)) for r, g in zip(results, ground_truth))
+    return hits / (len(ground_truth) * k)
+
+
+def effective_config(index, config: IndexConfig) -> IndexConfig:
+    """nlist/PQ podem ter sido reduzidos para caber nos dados de treino."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        return config
+    update = {"nlist": ivf.nlist}
+    if hasattr(ivf, "pq"):
+        update.update(pq_m=ivf.pq.M, pq_nbits=ivf.pq.nbits)
+    return config.model_copy(update=update)
+
+
+def run(vectors: np.ndarray, queries: np.ndarray, k: int, search_threads: int = 1):
+    n, dim = vectors.shape
+    print(f"\n📊 {n} vetores x {dim} dims, {len(queries)} consultas, k={k}\n")
+
+    ground_truth_index = faiss.IndexFlatL2(dim)
+    ground_truth_index.add(vectors)
+    _, ground_truth = ground_truth_index.search(queries, k)
+
+    header = f"{'configuração':<42} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'build s':>8} {'MB':>8}"
+    print(header)
+    print("-" * len(header))
+
+    build_threads = faiss.omp_get_max_threads()
+    for config, variants in default_grid(n):
+        # Treino e inserção usam todas as threads; a busca é medida com `search_threads`
+        faiss.omp_set_num_threads(build_threads)
+        started = time.perf_counter()
+        train = vectors[:config.train_size] if config.needs_training else vectors[:1]
+        index = build_index(config, train)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - started
+        memory_mb = len(faiss.serialize_index(index)) / 1e6
+        config = effective_config(index, config)
+
+        faiss.omp_set_num_threads(search_threads)
+        for search_params in variants:
+            variant = config.model_copy(update=search_params)
+            configure_search(index, variant)
+            latencies, results = measure_latencies(index, queries, k)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            print(
+                f"{variant.describe():<42} {recall_at_k(results, ground_truth):>9.3f} "
+                f"{p50:>8.3f} {p95:>8.3f} {p99:>8.3f} {build_seconds:>8.2f} {memory_mb:>8.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de índices FAISS (recall x latência)")
+    parser.add_argument("--n", type=int, default=50_000, help="Vetores do corpus sintético")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensão do corpus sintético")
+    parser.add_argument("--queries", type=int, default=500, help="Número de consultas")
+    parser.add_argument("-k", type=int, default=10, help="k do recall@k")
+    parser.add_argument("--real", action="store_true", help="Usar os vetores dos shards gravados em --index-path")
+    parser.add_argument("--index-path", default="vectorstore", help="Diretório dos shards (com --real)")
+    parser.add_argument("--threads", type=int, default=1, help="Threads OpenMP do FAISS (1 = latência por consulta)")
+    args = parser.parse_args()
+
+    if args.real:
+        vectors, queries = real_corpus(args.index_path, args.queries)
+    else:
+        vectors, queries = synthetic_corpus(args.n, args.dim, args.queries)
+    run(vectors, queries, args.k, search_threads=args.threads)
+
+
+if __name__ == "__main__":
+    main()
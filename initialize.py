@@ -5,6 +5,7 @@ Execute isto uma vez antes de usar o sistema RAG.
 """
 
 import sys
+import argparse
 from pathlib import Path
 
 # Add project root to sys.path
@@ -16,7 +17,7 @@ from src.infrastructure.vector_store import VectorStoreRepository
 from src.infrastructure.llm_factory import LLMFactory
 
 
-def initialize():
+def initialize(force_rebuild: bool = False, refresh_corpus: bool = False, rebuild_books=None):
     """Inicializa o vectorstore e testa a conexão com a OpenAI"""
     print("🔧 Inicializando Sistema Machado Oráculo...\n")
     
@@ -39,8 +40,11 @@ def initialize():
     # 3. Inicializa vectorstore
     print("\n📚 Inicializando Vectorstore...")
     try:
-        vs_repo = VectorStoreRepository()
+        vs_repo = VectorStoreRepository(force_rebuild=force_rebuild, refresh_corpus=refresh_corpus)
+        for book_id in rebuild_books or []:
+            vs_repo.rebuild_shard(book_id, refresh_corpus=refresh_corpus)
         print("✅ Vectorstore inicializado com sucesso")
+        print(f"   📚 Livros indexados: {', '.join(vs_repo.shards)}")
         print(f"   📂 Armazenado em: {settings.faiss_index_path}")
     except Exception as e:
         print(f"❌ ERRO ao inicializar vectorstore: {e}")
@@ -65,5 +69,27 @@ def initialize():
 
 
 if __name__ == "__main__":
-    success = initialize()
+    parser = argparse.ArgumentParser(description="Inicializa o vectorstore do Machado Oráculo")
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Reconstruir o índice mesmo que o manifesto salvo ainda seja válido"
+    )
+    parser.add_argument(
+        "--refresh-corpus",
+        action="store_true",
+        help="Revalidar o corpus com o servidor (ETag/Last-Modified) e baixar de novo se mudou"
+    )
+    parser.add_argument(
+        "--rebuild-book",
+        action="append",
+        metavar="BOOK_ID",
+        help="Reconstruir apenas o shard deste livro do catálogo (pode repetir)"
+    )
+    args = parser.parse_args()
+    success = initialize(
+        force_rebuild=args.rebuild,
+        refresh_corpus=args.refresh_corpus,
+        rebuild_books=args.rebuild_book
+    )
     sys.exit(0 if success else 1)
@@ -1,3 +1,5 @@
+from typing import Literal, Optional
+
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -8,13 +10,150 @@ load_dotenv()
 class Settings(BaseSettings):
     gemini_api_key: str
     model_name: str = "gemini-2.5-flash"
+    embedding_model: str = "models/gemini-embedding-001"
     temperature: float = 0.0
     chunk_size: int = 1000
     chunk_overlap: int = 200
+    # Fatiamento: "recursive" (janelas com sobreposição) ou "chapter" (capítulos e
+    # parágrafos, com os chunks guardados como deslocamentos no arquivo do corpus)
+    chunking_mode: Literal["recursive", "chapter"] = "recursive"
+    chapter_pattern: str = r"(?i)^cap[ií]tulo\s+[\w-]+\.?$"
     book_url: str = "https://www.gutenberg.org/files/55752/55752-0.txt"  # Dom Casmurro
     storage_path: str = "dom_casmurro.txt"
     faiss_index_path: str = "vectorstore"
 
+    # Catálogo de obras (JSON). Sem catálogo, indexa apenas book_url/storage_path
+    catalog_path: Optional[str] = None
+    shard_search_workers: int = 4
+
+    # Tipo de índice FAISS: "flat" (exato), "ivf", "hnsw" ou "ivfpq" (aproximados)
+    faiss_index_type: Literal["flat", "ivf", "hnsw", "ivfpq"] = "flat"
+    faiss_nlist: int = 1024
+    faiss_nprobe: int = 16
+    faiss_hnsw_m: int = 32
+    faiss_hnsw_ef_construction: int = 80
+    faiss_hnsw_ef_search: int = 64
+    faiss_pq_m: int = 16
+    faiss_pq_nbits: int = 8
+    faiss_train_size: int = 10_000
+
+    # Carga via mmap (somente leitura): workers no mesmo host compartilham o page cache
+    mmap_index: bool = False
+    mmap_vectors_fp16: bool = False
+
+    # Recuperação: "dense" (só FAISS) ou "hybrid" (FAISS + BM25 com reciprocal rank fusion)
+    retrieval_mode: Literal["dense", "hybrid"] = "hybrid"
+    hybrid_fetch_k: int = 20
+    rrf_k: int = 60
+    bm25_k1: float = 1.5
+    bm25_b: float = 0.75
+
+    # Cache em memória (LRU + TTL) de embeddings de pergunta e ids de resultado
+    query_cache_enabled: bool = True
+    query_cache_max_entries: int = 1024
+    query_cache_ttl_seconds: float = 3600.0
+
+    # Micro-batching dos embeddings de pergunta entre sessões concorrentes
+    query_batch_enabled: bool = True
+    query_batch_window_ms: float = 5.0
+    query_batch_max_size: int = 32
+
+    # Pós-processamento da busca: funde chunks sobrepostos/adjacentes (até merge_max_gap
+    # de distância) e, opcionalmente, diversifica os candidatos por MMR antes do reranker
+    merge_adjacent_chunks: bool = True
+    merge_max_gap: int = 4
+    mmr_enabled: bool = False
+    mmr_k: int = 6
+    mmr_lambda: float = 0.5
+
+    # Cache semântico de respostas validadas (na frente do grafo): perguntas com
+    # embedding similar acima do limiar reaproveitam a resposta sem chamar o LLM
+    answer_cache_enabled: bool = True
+    answer_cache_path: str = ".cache/answers.sqlite"
+    answer_cache_threshold: float = 0.95
+    answer_cache_ttl_seconds: Optional[float] = 7 * 24 * 3600.0
+    answer_cache_max_entries: int = 5000
+
+    # Reranqueamento local: recupera "largo" (retriever_k) e envia ao grader LLM só o top-N
+    retriever_k: int = 10
+    rerank_enabled: bool = True
+    rerank_method: Literal["lexical", "embedding", "hybrid", "cross_encoder"] = "hybrid"
+    rerank_top_n: int = 3
+    rerank_threshold: Optional[float] = None
+    rerank_lexical_weight: float = 0.3
+    rerank_cross_encoder_model: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+    # Pré-filtro local do guardrail: aceita perguntas muito próximas do centróide do corpus,
+    # rejeita as muito distantes sem termos do gazetteer e escala o resto ao LLM
+    guardrail_prefilter_enabled: bool = True
+    guardrail_accept_similarity: float = 0.8
+    guardrail_reject_similarity: float = 0.35
+    guardrail_gazetteer_min_count: int = 3
+
+    # Execução especulativa: guardrail e busca (e, opcionalmente, a avaliação) em
+    # paralelo; uma rejeição do guardrail descarta o trabalho especulativo
+    speculative_retrieval: bool = False
+    speculative_grading: bool = False
+
+    # Avaliação de relevância (grader LLM): "per_document" (uma chamada por chunk, em
+    # paralelo) ou "batch" (todos os chunks numa chamada, com fallback por documento)
+    grading_mode: Literal["per_document", "batch"] = "per_document"
+    grading_max_concurrency: int = 4
+    # Vereditos do grader reaproveitados entre iterações: "run" (só no turno), "session"
+    # (no checkpoint da sessão, para a mesma pergunta original) ou "off"
+    grade_cache_scope: Literal["off", "run", "session"] = "run"
+    grade_cache_max_entries: int = 500
+
+    # Orçamento de tokens do prompt de geração (estimado por caracteres): o contexto
+    # fica com o que sobra após a reserva da resposta, as instruções e o histórico
+    token_chars_per_token: float = 4.0
+    generation_token_budget: int = 6000
+    generation_answer_reserve_tokens: int = 1024
+    history_token_budget: int = 800
+    history_recent_turns: int = 2
+    history_old_message_tokens: int = 60
+    context_min_chunk_tokens: int = 50
+
+    # Memoização em disco das chamadas ao LLM (só vale com temperature=0), por chain
+    llm_cache_enabled: bool = True
+    llm_cache_path: str = ".cache/llm.sqlite"
+    llm_cache_max_entries: int = 50_000
+    llm_cache_guardrail: bool = True
+    llm_cache_grader: bool = True
+    llm_cache_rewriter: bool = True
+    llm_cache_generation: bool = True
+    llm_cache_hallucination: bool = True
+
+    # Cache de embeddings em disco (evita reembedar trechos já vistos)
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = ".cache/embeddings.sqlite"
+    embedding_cache_max_entries: int = 200_000
+
+    # Ingestão: lotes de embeddings, concorrência e backoff em rate limit
+    ingest_batch_size: int = 100
+    ingest_max_concurrency: int = 4
+    ingest_max_retries: int = 6
+    ingest_backoff_seconds: float = 2.0
+
+    # Checkpointer das conversas: "memory" (MemorySaver, perdido ao reiniciar; padrão) ou "sqlite"
+    # (em disco, com expiração de sessões inativas e só os últimos checkpoints por sessão;
+    # ative com CHECKPOINTER=sqlite no .env)
+    checkpointer: Literal["memory", "sqlite"] = "memory"
+    checkpoint_path: str = ".cache/checkpoints.sqlite"
+    checkpoint_ttl_seconds: Optional[float] = 7 * 24 * 3600.0
+    checkpoint_keep_latest: int = 4
+    checkpoint_vacuum_interval_seconds: Optional[float] = 600.0
+    # Mensagens do histórico guardadas no estado da sessão (5 rodadas)
+    history_max_messages: int = 10
+
+    # Servidor HTTP (src/server.py): perguntas simultâneas, fila de espera e timeout
+    server_host: str = "127.0.0.1"
+    server_port: int = 8000
+    server_max_concurrency: int = 32
+    server_max_queue: int = 128
+    server_request_timeout: float = 60.0
+    server_max_question_chars: int = 2000
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
@@ -0,0 +1,58 @@
+"""Catálogo de obras indexadas: cada livro vira um shard FAISS independente."""
+import json
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class Book(BaseModel):
+    book_id: str = Field(description="Identificador estável, usado como nome do shard")
+    title: str
+    url: str
+    storage_path: str = Field(default="", description="Arquivo local do texto (padrão: corpus/<book_id>.txt)")
+    genre: str = "romance"
+    year: Optional[int] = None
+
+    def model_post_init(self, __context: Any) -> None:
+        if not self.storage_path:
+            self.storage_path = f"corpus/{self.book_id}.txt"
+
+
+class Catalog(BaseModel):
+    books: List[Book]
+
+    @classmethod
+    def from_file(cls, path: str) -> "Catalog":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        # Aceita tanto {"books": [...]} quanto uma lista direta de livros
+        if isinstance(data, list):
+            data = {"books": data}
+        return cls.model_validate(data)
+
+    def get(self, book_id: str) -> Book:
+        for book in self.books:
+            if book.book_id == book_id:
+                return book
+        raise KeyError(f"Livro '{book_id}' não está no catálogo")
+
+    def select(
+        self,
+        book_ids: Optional[List[str]] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Book]:
+        """Filtra livros por id e/ou metadados (ex: {"genre": "conto"} ou {"year": [1899, 1908]})."""
+        selected = self.books
+        if book_ids:
+            selected = [b for b in selected if b.book_id in book_ids]
+        for field, expected in (filter or {}).items():
+            allowed = expected if isinstance(expected, (list, tuple, set)) else [expected]
+            selected = [b for b in selected if getattr(b, field, None) in allowed]
+        return selected
+
+    def describe(self) -> str:
+        """Descrição do corpus usada nos prompts."""
+        if len(self.books) == 1:
+            return f"o livro '{self.books[0].title}' de Machado de Assis"
+        titles = ", ".join(f"'{b.title}'" for b in self.books)
+        return f"as obras de Machado de Assis ({titles})"
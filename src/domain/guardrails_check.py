@@ -1,9 +1,11 @@
+from typing import List
+
 from pydantic import BaseModel, Field
 
 
 class InputGuardrail(BaseModel):
     is_valid: bool = Field(
-        description="A pergunta é válida para o contexto de Dom Casmurro? True ou False"
+        description="A pergunta é válida para o contexto das obras indexadas de Machado de Assis? True ou False"
     )
     reason: str = Field(
         default="",
@@ -16,6 +18,20 @@ class RetrievalGrader(BaseModel):
         description="O documento contém a resposta? 'sim' ou 'nao'"
     )
 
+
+class DocumentVerdict(BaseModel):
+    index: int = Field(description="Número do documento, como aparece entre colchetes (ex: 1 para [1])")
+    binary_score: str = Field(
+        description="O documento contém a resposta? 'sim' ou 'nao'"
+    )
+
+
+class BatchRetrievalGrader(BaseModel):
+    verdicts: List[DocumentVerdict] = Field(
+        description="Um veredito para cada documento recebido, na mesma ordem"
+    )
+
+
 class HallucinationGrade(BaseModel):
     binary_score: str = Field(
         description="A resposta é apoiada pelos fatos fornecidos? 'sim' ou 'nao'"
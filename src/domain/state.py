@@ -1,4 +1,4 @@
-from typing import List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple
 from typing_extensions import TypedDict
 
 
@@ -11,12 +11,19 @@ class GraphState(TypedDict):
     question: str           # A pergunta atual (pode ser reescrita)
     generation: str         # A resposta gerada pelo LLM
     documents: List[Any]    # Lista de documentos recuperados (LangChain Documents)
+    context: str            # Contexto empacotado no orçamento de tokens (gerado e validado com o mesmo texto)
     
     # --- Controle de Fluxo ---
     loop_count: int         # Contador para evitar loops infinitos
     max_loops: int          # Número máximo de iterações permitidas
     original_question: Optional[str] # A pergunta original do usuário (para referência)
 
+    # --- Reaproveitamento entre iterações (reescrita da pergunta) ---
+    grade_cache: Dict[str, bool]        # Vereditos do grader por (pergunta original, chunk_id)
+    approved_documents: List[Any]       # Chunks aprovados em todas as iterações do turno
+    grade_stats: Dict[str, int]         # graded / reused / llm_calls do turno
+
     # --- Novos Campos (Guardrails & Memória) ---
     hallucination: bool     # Flag: True se a resposta foi considerada alucinação
+    validated: bool         # Flag: True se a resposta passou por validate_generation (elegível ao cache)
     chat_history: List[Tuple[str, str]] # Histórico de mensagens (role, message) para memória (Buffer)
\ No newline at end of file
@@ -0,0 +1,177 @@
+"""Cache semântico de respostas validadas, persistido em SQLite."""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.logging import get_logger
+
+logger = get_logger()
+
+
+class SemanticAnswerCache:
+    """
+    Respostas já validadas, encontradas pela similaridade do embedding da pergunta.
+
+    Cada entrada guarda a pergunta, seu vetor (float32), a resposta e os ids dos
+    chunks usados. A busca é exata (cosseno contra todas as entradas, mantidas
+    numa matriz em memória). Entradas gravadas com outra `index_version` (outro
+    conjunto de manifestos dos shards) são descartadas na abertura; entradas
+    mais antigas que `ttl_seconds` expiram e, acima de `max_entries`, as menos
+    usadas recentemente são removidas.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        index_version: str,
+        threshold: float = 0.95,
+        ttl_seconds: Optional[float] = None,
+        max_entries: int = 5000,
+    ):
+        self.index_version = index_version
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                chunk_ids TEXT NOT NULL,
+                index_version TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        removed = self._conn.execute("DELETE FROM answers WHERE index_version != ?", (index_version,)).rowcount
+        if removed:
+            logger.info(f"Cache de respostas: {removed} respostas de um índice anterior descartadas")
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        rows = self._conn.execute("SELECT id, vector FROM answers ORDER BY id").fetchall()
+        self._ids = [row[0] for row in rows]
+        self._matrix = (
+            np.vstack([self._normalize(np.frombuffer(blob, dtype=np.float32)) for _, blob in rows])
+            if rows else None
+        )
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def _delete(self, entry_ids: List[int]):
+        if not entry_ids:
+            return
+        placeholders = ",".join("?" * len(entry_ids))
+        self._conn.execute(f"DELETE FROM answers WHERE id IN ({placeholders})", entry_ids)
+        self._load()
+
+    def lookup(self, embedding: List[float]) -> Optional[Tuple[str, List[str], float]]:
+        """(resposta, chunk_ids, similaridade) da entrada mais próxima acima do limiar."""
+        query = self._normalize(embedding)
+        with self._lock:
+            result = None
+            if self._matrix is not None:
+                similarities = self._matrix @ query
+                candidates = [int(p) for p in np.flatnonzero(similarities >= self.threshold)]
+                candidates.sort(key=lambda p: similarities[p], reverse=True)
+                ids = [self._ids[p] for p in candidates]
+                placeholders = ",".join("?" * len(ids))
+                rows = {
+                    row[0]: row[1:]
+                    for row in self._conn.execute(
+                        f"SELECT id, answer, chunk_ids, created_at FROM answers WHERE id IN ({placeholders})", ids
+                    )
+                } if ids else {}
+
+                expired = [entry_id for entry_id in ids if self._expired(rows[entry_id][2])]
+                for position, entry_id in zip(candidates, ids):
+                    if entry_id not in expired:
+                        answer, chunk_ids, _ = rows[entry_id]
+                        result = answer, json.loads(chunk_ids), float(similarities[position])
+                        self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), entry_id))
+                        break
+                self._delete(expired)
+                self._conn.commit()
+
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def store(self, question: str, embedding: List[float], answer: str, chunk_ids: List[str]):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO answers (question, vector, answer, chunk_ids, index_version, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    question,
+                    np.asarray(embedding, dtype=np.float32).tobytes(),
+                    answer,
+                    json.dumps(chunk_ids),
+                    self.index_version,
+                    now,
+                    now,
+                )
+            )
+            excess = len(self._ids) + 1 - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_used ASC LIMIT ?)",
+                    (excess,)
+                )
+            self._conn.commit()
+            if excess > 0:
+                self._load()
+            else:
+                vector = self._normalize(embedding)[None, :]
+                self._ids.append(cursor.lastrowid)
+                self._matrix = vector if self._matrix is None else np.vstack([self._matrix, vector])
+
+    def set_index_version(self, index_version: str):
+        """Troca a versão do índice (ex: shard reconstruído), descartando respostas antigas."""
+        with self._lock:
+            if index_version == self.index_version:
+                return
+            self.index_version = index_version
+            self._conn.execute("DELETE FROM answers WHERE index_version != ?", (index_version,))
+            self._conn.commit()
+            self._load()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+            self._load()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._ids)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,366 @@
+"""
+Checkpointer das conversas em SQLite, com memória limitada.
+
+O MemorySaver guarda todos os checkpoints de todas as sessões na RAM do
+processo, para sempre, e os perde ao reiniciar. Aqui cada checkpoint vai para
+o disco já com os valores dos canais (sem blobs versionados à parte). Só os
+`keep_latest` mais recentes de cada thread são mantidos, e threads sem
+atividade há mais de `ttl_seconds` são apagadas. Uma thread em segundo plano
+faz a expiração e devolve ao sistema as páginas livres do arquivo
+(auto_vacuum incremental).
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+from src.config import settings
+from src.utils.logging import get_logger
+
+logger = get_logger()
+
+
+def _write_sort_key(channel: str, task_id: str, idx: int) -> Tuple[int, str, int]:
+    """Ordem das escritas pendentes: canais especiais primeiro, depois tarefa e índice."""
+    return WRITES_IDX_MAP.get(channel, 0), task_id, idx
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[int]):
+    """Checkpoints e escritas pendentes por (thread, namespace) num arquivo SQLite."""
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600.0,
+        keep_latest: int = 4,
+        vacuum_interval_seconds: Optional[float] = 600.0,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        # O checkpoint atual e o pai precisam sobreviver à compactação durante a execução
+        self.keep_latest = max(2, keep_latest)
+        self.expired_threads = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # auto_vacuum só vale se definido antes das tabelas existirem
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                parent_id TEXT,
+                checkpoint_type TEXT NOT NULL,
+                checkpoint BLOB NOT NULL,
+                metadata_type TEXT NOT NULL,
+                metadata BLOB NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                value_type TEXT NOT NULL,
+                value BLOB NOT NULL,
+                task_path TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            CREATE TABLE IF NOT EXISTS threads (
+                thread_id TEXT PRIMARY KEY,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_threads_last_used ON threads(last_used);
+            """
+        )
+        self._conn.commit()
+
+        self._stop = threading.Event()
+        self._maintenance = None
+        if vacuum_interval_seconds:
+            self._maintenance = threading.Thread(
+                target=self._maintenance_loop,
+                args=(vacuum_interval_seconds,),
+                name="checkpoint-maintenance",
+                daemon=True
+            )
+            self._maintenance.start()
+
+    # --- leitura -------------------------------------------------------------
+
+    @staticmethod
+    def _config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row) -> CheckpointTuple:
+        checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata = row
+        writes = self._conn.execute(
+            "SELECT task_id, idx, channel, value_type, value, task_path FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        writes.sort(key=lambda w: _write_sort_key(w[2], w[0], w[1]))
+        return CheckpointTuple(
+            config=self._config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint=self.serde.loads_typed((checkpoint_type, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, _, channel, value_type, value, _ in writes
+            ],
+            parent_config=self._config(thread_id, checkpoint_ns, parent_id) if parent_id else None,
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata"
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+            return self._tuple(thread_id, checkpoint_ns, row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata FROM checkpoints"
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            results = []
+            for thread_id, checkpoint_ns, *row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                item = self._tuple(thread_id, checkpoint_ns, row)
+                # Filtro de metadados em Python: os metadados são serializados
+                if filter and not all(item.metadata.get(key) == value for key, value in filter.items()):
+                    continue
+                results.append(item)
+        yield from results
+
+    # --- escrita -------------------------------------------------------------
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 checkpoint_type, checkpoint_blob, metadata_type, metadata_blob)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO threads (thread_id, last_used) VALUES (?, ?)",
+                (thread_id, time.time())
+            )
+            self._compact(thread_id, checkpoint_ns)
+            self._conn.commit()
+        return self._config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def _compact(self, thread_id: str, checkpoint_ns: str):
+        """Mantém só os `keep_latest` checkpoints mais recentes da thread (e suas escritas)."""
+        stale = self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_latest)
+        ).fetchall()
+        if not stale:
+            return
+        params = [(thread_id, checkpoint_ns, checkpoint_id) for (checkpoint_id,) in stale]
+        self._conn.executemany(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", params
+        )
+        self._conn.executemany(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", params
+        )
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        replace, keep = [], []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_blob = self.serde.dumps_typed(value)
+            row = (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                   channel, value_type, value_blob, task_path)
+            # Escritas especiais (erro, interrupção...) substituem; as normais não se repetem
+            (replace if channel in WRITES_IDX_MAP else keep).append(row)
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", replace)
+            self._conn.executemany("INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", keep)
+            self._conn.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._delete_threads([thread_id])
+            self._conn.commit()
+
+    def _delete_threads(self, thread_ids: Sequence[str]):
+        params = [(thread_id,) for thread_id in thread_ids]
+        for table in ("checkpoints", "writes", "threads"):
+            self._conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", params)
+
+    # --- manutenção ----------------------------------------------------------
+
+    def purge_expired(self) -> int:
+        """Apaga threads sem checkpoint novo há mais de `ttl_seconds`; devolve quantas."""
+        if self.ttl_seconds is None:
+            return 0
+        with self._lock:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT thread_id FROM threads WHERE last_used < ?", (time.time() - self.ttl_seconds,)
+            ).fetchall()]
+            if expired:
+                self._delete_threads(expired)
+                self._conn.commit()
+        self.expired_threads += len(expired)
+        return len(expired)
+
+    def vacuum(self):
+        """Devolve as páginas livres do arquivo (sem reescrever o banco inteiro)."""
+        with self._lock:
+            self._conn.execute("PRAGMA incremental_vacuum")
+            self._conn.commit()
+
+    def _maintenance_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                expired = self.purge_expired()
+                self.vacuum()
+                if expired:
+                    logger.info(f"Checkpointer: {expired} sessões expiradas removidas")
+            except Exception as e:
+                logger.warning(f"Erro na manutenção do checkpointer: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            threads = self._conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+            checkpoints = self._conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        return {"threads": threads, "checkpoints": checkpoints, "expired_threads": self.expired_threads}
+
+    def close(self):
+        self._stop.set()
+        if self._maintenance is not None:
+            self._maintenance.join(timeout=5)
+        with self._lock:
+            self._conn.close()
+
+    # --- versões assíncronas (SQLite fora do event loop) ---------------------
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def build_checkpointer():
+    """Checkpointer configurado em Settings: MemorySaver ou SQLite com expiração."""
+    if settings.checkpointer == "memory":
+        return MemorySaver()
+    return SQLiteCheckpointSaver(
+        settings.checkpoint_path,
+        ttl_seconds=settings.checkpoint_ttl_seconds,
+        keep_latest=settings.checkpoint_keep_latest,
+        vacuum_interval_seconds=settings.checkpoint_vacuum_interval_seconds
+    )
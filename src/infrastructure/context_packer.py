@@ -0,0 +1,157 @@
+"""
+Empacotamento do prompt de geração num orçamento de tokens.
+
+Os chunks entram na ordem em que chegam (já ranqueados pela busca, pelo
+reranker e pelo grader) até o orçamento acabar; o primeiro que não cabe é
+cortado, se sobrar espaço útil, e os demais ficam de fora. O histórico mantém
+as rodadas recentes na íntegra e encurta as antigas, descartando as mais velhas
+se ainda assim não couber. Os tokens são estimados por caracteres (sem chamada
+ao modelo), o que basta para manter o tamanho do prompt estável.
+"""
+import math
+import re
+from typing import List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+from pydantic import BaseModel
+
+from src.config import settings
+
+TRIM_MARK = " […]"
+SENTENCE_BREAK = re.compile(r"[.!?…][\"'»)]?\s")
+EMPTY_HISTORY = "(Nenhum histórico anterior)"
+
+
+def estimate_tokens(text: str, chars_per_token: Optional[float] = None) -> int:
+    """Tokens aproximados de um texto (português fica perto de 4 caracteres por token)."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / (chars_per_token or settings.token_chars_per_token))
+
+
+def trim_to_tokens(text: str, max_tokens: int, chars_per_token: Optional[float] = None) -> str:
+    """Corta o texto no orçamento, de preferência no fim de uma frase."""
+    max_chars = int(max_tokens * (chars_per_token or settings.token_chars_per_token)) - len(TRIM_MARK)
+    if len(text) <= max_chars + len(TRIM_MARK):
+        return text
+    if max_chars <= 0:
+        return ""
+    cut = text[:max_chars]
+    # Fim de frase no último quinto do trecho; senão, o último espaço
+    breaks = [m.end() for m in SENTENCE_BREAK.finditer(cut, int(max_chars * 0.8))]
+    if breaks:
+        return cut[:breaks[-1]].rstrip() + TRIM_MARK
+    space = cut.rfind(" ")
+    return (cut[:space] if space > 0 else cut).rstrip() + TRIM_MARK
+
+
+class PackedPrompt(BaseModel):
+    """Contexto e histórico já dentro do orçamento, com as contagens estimadas."""
+
+    context: str
+    history: str
+    context_tokens: int
+    history_tokens: int
+    fixed_tokens: int
+    documents_used: int
+    documents_trimmed: int
+    documents_total: int
+
+    @property
+    def input_tokens(self) -> int:
+        return self.context_tokens + self.history_tokens + self.fixed_tokens
+
+
+class ContextPacker:
+    def __init__(
+        self,
+        token_budget: int = 6000,
+        answer_reserve_tokens: int = 1024,
+        history_budget_tokens: int = 800,
+        recent_turns: int = 2,
+        old_message_tokens: int = 60,
+        min_chunk_tokens: int = 50,
+    ):
+        self.token_budget = token_budget
+        self.answer_reserve_tokens = answer_reserve_tokens
+        self.history_budget_tokens = history_budget_tokens
+        self.recent_turns = recent_turns
+        self.old_message_tokens = old_message_tokens
+        self.min_chunk_tokens = min_chunk_tokens
+
+    def pack_history(self, history: Sequence[Tuple[str, str]], budget: Optional[int] = None) -> Tuple[str, int]:
+        """Histórico formatado ("papel: mensagem" por linha) e seus tokens estimados."""
+        budget = self.history_budget_tokens if budget is None else budget
+        if not history:
+            return EMPTY_HISTORY, estimate_tokens(EMPTY_HISTORY)
+
+        # Uma rodada = pergunta + resposta
+        recent_from = max(0, len(history) - 2 * self.recent_turns)
+        lines = []
+        for i, (role, message) in enumerate(history):
+            if i < recent_from:
+                message = trim_to_tokens(message, self.old_message_tokens)
+            lines.append(f"{role}: {message}")
+
+        tokens = [estimate_tokens(line) + 1 for line in lines]
+        # Descarta as mensagens mais antigas até caber (mantendo ao menos a última)
+        while len(lines) > 1 and sum(tokens) > budget:
+            lines.pop(0)
+            tokens.pop(0)
+        if sum(tokens) > budget:
+            lines[0] = trim_to_tokens(lines[0], budget)
+        text = "\n".join(lines)
+        return text, estimate_tokens(text)
+
+    def pack_documents(self, documents: Sequence[Document], budget: int) -> Tuple[str, int, int, int]:
+        """(contexto, tokens, chunks usados, chunks cortados) dentro de `budget` tokens."""
+        parts: List[str] = []
+        used_tokens = 0
+        trimmed = 0
+        for doc in documents:
+            # O separador entre chunks ("\n\n") também conta
+            remaining = budget - used_tokens - (1 if parts else 0)
+            tokens = estimate_tokens(doc.page_content)
+            if tokens <= remaining:
+                parts.append(doc.page_content)
+                used_tokens += tokens + (1 if len(parts) > 1 else 0)
+                continue
+            if remaining >= self.min_chunk_tokens:
+                parts.append(trim_to_tokens(doc.page_content, remaining))
+                trimmed += 1
+            break
+        context = "\n\n".join(parts)
+        return context, estimate_tokens(context), len(parts), trimmed
+
+    def pack(self, documents: Sequence[Document], history: Sequence[Tuple[str, str]], fixed_tokens: int) -> PackedPrompt:
+        """
+        Empacota histórico e contexto: `fixed_tokens` é o que o prompt gasta sem
+        eles (instruções e pergunta). O contexto fica com o que sobra do orçamento
+        depois da reserva para a resposta e do histórico, que nunca passa da
+        metade do espaço disponível.
+        """
+        available = max(0, self.token_budget - self.answer_reserve_tokens - fixed_tokens)
+        history_text, history_tokens = self.pack_history(history, min(self.history_budget_tokens, available // 2))
+        context, context_tokens, used, trimmed = self.pack_documents(documents, max(0, available - history_tokens))
+        return PackedPrompt(
+            context=context,
+            history=history_text,
+            context_tokens=context_tokens,
+            history_tokens=history_tokens,
+            fixed_tokens=fixed_tokens,
+            documents_used=used,
+            documents_trimmed=trimmed,
+            documents_total=len(documents),
+        )
+
+
+def build_context_packer() -> ContextPacker:
+    """Packer do prompt de geração configurado em Settings."""
+    return ContextPacker(
+        token_budget=settings.generation_token_budget,
+        answer_reserve_tokens=settings.generation_answer_reserve_tokens,
+        history_budget_tokens=settings.history_token_budget,
+        recent_turns=settings.history_recent_turns,
+        old_message_tokens=settings.history_old_message_tokens,
+        min_chunk_tokens=settings.context_min_chunk_tokens,
+    )
@@ -0,0 +1,284 @@
+"""Download em streaming do corpus e fatiamento incremental em chunks."""
+import hashlib
+import json
+import mmap
+import os
+import re
+from typing import Iterator, List, Optional, Tuple
+
+import requests
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.config import settings
+from src.domain.catalog import Book, Catalog
+
+DOWNLOAD_BLOCK_BYTES = 1 << 16
+READ_BLOCK_CHARS = 1 << 16
+# Separadores para quebrar parágrafos maiores que o chunk (frases antes de palavras)
+SENTENCE_SEPARATORS = [". ", "! ", "? ", "; ", ": ", ", ", " "]
+BOM = "\ufeff".encode("utf-8")
+
+
+def load_catalog() -> Catalog:
+    """Catálogo configurado em `catalog_path`, ou só Dom Casmurro (book_url/storage_path)."""
+    if settings.catalog_path:
+        return Catalog.from_file(settings.catalog_path)
+    return Catalog(books=[
+        Book(
+            book_id="dom_casmurro",
+            title="Dom Casmurro",
+            url=settings.book_url,
+            storage_path=settings.storage_path,
+            year=1899,
+        )
+    ])
+
+
+class CorpusSource:
+    """
+    Mantém uma cópia local de um texto remoto.
+
+    Metadados do download (ETag, Last-Modified, SHA-256, tamanho e mtime) ficam
+    em `<storage_path>.meta.json`, permitindo revalidar com requisição
+    condicional e reaproveitar o hash sem reler o arquivo.
+    """
+
+    def __init__(self, url: str, storage_path: str, timeout: float = 60.0):
+        self.url = url
+        self.storage_path = storage_path
+        self.meta_path = f"{storage_path}.meta.json"
+        self.timeout = timeout
+
+    def _read_meta(self) -> dict:
+        if not os.path.exists(self.meta_path):
+            return {}
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _write_meta(self, meta: dict):
+        stat = os.stat(self.storage_path)
+        meta.update({"url": self.url, "size": stat.st_size, "mtime": stat.st_mtime})
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+    def _meta_matches_file(self, meta: dict) -> bool:
+        if not meta or not os.path.exists(self.storage_path):
+            return False
+        stat = os.stat(self.storage_path)
+        return meta.get("size") == stat.st_size and meta.get("mtime") == stat.st_mtime
+
+    def ensure(self, refresh: bool = False) -> bool:
+        """
+        Garante o arquivo local. Com `refresh`, revalida contra o servidor.
+
+        Retorna True se o conteúdo local mudou.
+        """
+        exists = os.path.exists(self.storage_path)
+        if exists and not refresh:
+            return False
+
+        meta = self._read_meta() if exists else {}
+        directory = os.path.dirname(self.storage_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        headers = {}
+        if self._meta_matches_file(meta) and meta.get("url") == self.url:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        print(f"📥 Baixando corpus de {self.url}...")
+        with requests.get(self.url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304:
+                print("✅ Corpus local já está atualizado (304 Not Modified)")
+                return False
+            response.raise_for_status()
+
+            # Grava em arquivo temporário: um download interrompido nunca substitui o corpus
+            digest = hashlib.sha256()
+            tmp_path = f"{self.storage_path}.part"
+            with open(tmp_path, "wb") as f:
+                for block in response.iter_content(chunk_size=DOWNLOAD_BLOCK_BYTES):
+                    digest.update(block)
+                    f.write(block)
+
+            sha256 = digest.hexdigest()
+            if exists and sha256 == meta.get("sha256"):
+                os.remove(tmp_path)
+                print("✅ Corpus local já está atualizado (checksum idêntico)")
+                return False
+
+            os.replace(tmp_path, self.storage_path)
+            self._write_meta({
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "sha256": sha256,
+            })
+        return True
+
+    def sha256(self) -> str:
+        """Hash do arquivo local, lido dos metadados quando o arquivo não mudou."""
+        meta = self._read_meta()
+        if self._meta_matches_file(meta) and meta.get("sha256"):
+            return meta["sha256"]
+
+        digest = hashlib.sha256()
+        with open(self.storage_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        meta["sha256"] = digest.hexdigest()
+        self._write_meta(meta)
+        return meta["sha256"]
+
+
+def iter_chunks(
+    path: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    window_chars: Optional[int] = None,
+) -> Iterator[Document]:
+    """
+    Lê o arquivo em blocos e gera chunks sem carregar o texto inteiro.
+
+    Cada janela é fatiada pelo RecursiveCharacterTextSplitter; o último chunk de
+    cada janela volta para o buffer, pois pode ter sido cortado no limite do
+    bloco. `start_index` é o deslocamento (em caracteres) do chunk no arquivo.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    window_chars = max(window_chars or READ_BLOCK_CHARS, chunk_size * 4)
+
+    buffer = ""
+    buffer_start = 0  # Deslocamento do início do buffer no arquivo
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            block = f.read(window_chars)
+            eof = not block
+            buffer += block
+
+            chunks = splitter.split_text(buffer) if buffer else []
+            emit = chunks if eof else chunks[:-1]
+
+            index = 0
+            previous_len = 0
+            starts = []
+            for chunk in chunks:
+                offset = index + previous_len - chunk_overlap
+                index = buffer.find(chunk, max(0, offset))
+                starts.append(index)
+                previous_len = len(chunk)
+
+            for chunk, start in zip(emit, starts):
+                yield Document(page_content=chunk, metadata={"start_index": buffer_start + start})
+
+            if eof:
+                break
+            if len(chunks) > 1:
+                carry_from = starts[-1]
+                buffer = buffer[carry_from:]
+                buffer_start += carry_from
+
+
+def _split_paragraph(data, start: int, end: int, chunk_size: int) -> List[Tuple[int, int]]:
+    """Intervalos (em bytes) de um parágrafo, quebrado em frases se passar de chunk_size."""
+    text = data[start:end].decode("utf-8")
+    if len(text) <= chunk_size:
+        return [(start, end)]
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=0, separators=SENTENCE_SEPARATORS, keep_separator="end"
+    )
+    spans = []
+    position = 0
+    for piece in splitter.split_text(text):
+        index = text.find(piece, position)
+        piece_start = start + len(text[:index].encode("utf-8"))
+        spans.append((piece_start, piece_start + len(piece.encode("utf-8"))))
+        position = index + len(piece)
+    return spans
+
+
+def iter_chapter_chunks(
+    path: str,
+    chunk_size: int,
+    chapter_pattern: Optional[str] = None,
+) -> Iterator[Document]:
+    """
+    Gera chunks que respeitam capítulos e parágrafos, sem sobreposição.
+
+    Parágrafos consecutivos do mesmo capítulo são agrupados até `chunk_size`
+    bytes (~caracteres); um chunk nunca atravessa o título de um capítulo. `start` e
+    `end` são deslocamentos em bytes no arquivo, de modo que o texto de cada
+    chunk pode ser relido do corpus mapeado em memória (ver MmapDocstore).
+    """
+    heading = re.compile(chapter_pattern or settings.chapter_pattern)
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    chapter = ""
+    chapter_index = 0
+    spans: List[Tuple[int, int]] = []
+
+    def flush():
+        """Agrupa os parágrafos do capítulo atual em chunks de até chunk_size."""
+        chunk_start = chunk_end = None
+        for start, end in spans:
+            if chunk_start is not None and end - chunk_start > chunk_size:
+                yield chunk_start, chunk_end
+                chunk_start = None
+            if chunk_start is None:
+                chunk_start = start
+            chunk_end = end
+        if chunk_start is not None:
+            yield chunk_start, chunk_end
+
+    def documents():
+        for start, end in flush():
+            yield Document(
+                page_content=data[start:end].decode("utf-8"),
+                metadata={"chapter": chapter, "chapter_index": chapter_index, "start": start, "end": end}
+            )
+
+    try:
+        paragraph_start = paragraph_end = None
+        position = 0
+        while True:
+            line = data.readline()
+            if not line:
+                break
+            line_start = position
+            position += len(line)
+            stripped = line.strip()
+
+            if stripped and not heading.match(stripped.decode("utf-8", errors="ignore").lstrip("\ufeff")):
+                if paragraph_start is None:
+                    paragraph_start = line_start + (len(line) - len(line.lstrip()))
+                paragraph_end = line_start + len(line.rstrip())
+                continue
+
+            # Linha em branco ou título de capítulo: fecha o parágrafo corrente
+            if paragraph_start is not None:
+                spans.extend(_split_paragraph(data, paragraph_start, paragraph_end, chunk_size))
+                paragraph_start = None
+
+            if stripped:
+                yield from documents()
+                spans = []
+                chapter = stripped.decode("utf-8").lstrip("\ufeff")
+                chapter_index += 1
+                # O título abre o primeiro chunk do capítulo (sem o BOM do início do arquivo)
+                title = line.rstrip()
+                spans.append((line_start + len(title) - len(title.lstrip().removeprefix(BOM).lstrip()), line_start + len(title)))
+
+        if paragraph_start is not None:
+            spans.extend(_split_paragraph(data, paragraph_start, paragraph_end, chunk_size))
+        yield from documents()
+    finally:
+        data.close()
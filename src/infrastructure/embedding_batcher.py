@@ -0,0 +1,136 @@
+"""
+Micro-batching dos embeddings de pergunta entre requisições concorrentes.
+
+Cada `retrieve` pede o embedding de uma única pergunta. Com várias sessões
+ativas, o `QueryEmbeddingBatcher` junta os pedidos que chegam numa janela curta
+(ou até `max_batch` itens) numa só chamada em lote e devolve a cada chamador o
+seu vetor. A primeira thread a chegar conduz o lote ("líder"); as demais só
+esperam. Sem concorrência, a pergunta sai na hora: a janela só é aplicada
+quando há outros pedidos na fila ou um lote acabou de sair.
+"""
+import threading
+import time
+from typing import Callable, List, Optional
+
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+from src.utils.logging import get_logger
+
+logger = get_logger()
+
+# Mesmo task type usado pelo embed_query do Gemini
+QUERY_TASK_TYPE = "RETRIEVAL_QUERY"
+
+
+def embed_queries(embeddings, texts: List[str]) -> List[List[float]]:
+    """Embeddings de pergunta em lote (task type de consulta, não o de documento)."""
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    if isinstance(embeddings, GoogleGenerativeAIEmbeddings):
+        return embeddings.embed_documents(texts, task_type=QUERY_TASK_TYPE)
+    # Modelos sem lote de consultas: mesmo resultado, uma chamada por texto
+    return [embeddings.embed_query(text) for text in texts]
+
+
+class _PendingQuery:
+    __slots__ = ("text", "done", "vector", "error")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.done = False
+        self.vector: Optional[List[float]] = None
+        self.error: Optional[BaseException] = None
+
+
+class QueryEmbeddingBatcher:
+    """Junta pedidos de `embed_query` de threads concorrentes em chamadas em lote."""
+
+    def __init__(
+        self,
+        embeddings,
+        window_ms: float = 5.0,
+        max_batch: int = 32,
+        embed_batch: Optional[Callable[[List[str]], List[List[float]]]] = None,
+    ):
+        self.embeddings = embeddings
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.embed_batch = embed_batch or (lambda texts: embed_queries(embeddings, texts))
+        self.calls = 0
+        self.queries = 0
+        self.largest_batch = 0
+        self._pending: List[_PendingQuery] = []
+        self._leader_active = False
+        self._last_flush = float("-inf")
+        self._cond = threading.Condition()
+
+    def embed_query(self, text: str) -> List[float]:
+        item = _PendingQuery(text)
+        with self._cond:
+            self._pending.append(item)
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+
+            while not item.done:
+                if self._leader_active:
+                    self._cond.wait()
+                    continue
+                # Ninguém conduzindo um lote: esta thread assume (o lote pode não incluir
+                # o próprio item, se a fila passou de max_batch; nesse caso, repete)
+                self._leader_active = True
+                batch = self._collect()
+                self._cond.release()
+                try:
+                    self._run(batch)
+                finally:
+                    self._cond.acquire()
+                    self._leader_active = False
+                    self._last_flush = time.monotonic()
+                    self._cond.notify_all()
+
+        if item.error is not None:
+            raise item.error
+        return item.vector
+
+    def _collect(self) -> List[_PendingQuery]:
+        """Espera a janela (com o lock) e retira até max_batch pedidos da fila."""
+        busy = len(self._pending) > 1 or time.monotonic() - self._last_flush <= self.window
+        if busy:
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        batch = self._pending[:self.max_batch]
+        del self._pending[:self.max_batch]
+        return batch
+
+    def _run(self, batch: List[_PendingQuery]):
+        # Perguntas idênticas no mesmo lote viram um único texto
+        texts = list(dict.fromkeys(item.text for item in batch))
+        try:
+            vectors = dict(zip(texts, self.embed_batch(texts)))
+            for item in batch:
+                item.vector = vectors[item.text]
+        except BaseException as e:
+            logger.warning(f"Erro no lote de {len(texts)} embeddings de pergunta: {e}")
+            for item in batch:
+                item.error = e
+        finally:
+            for item in batch:
+                item.done = True
+
+        self.calls += 1
+        self.queries += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        if len(batch) > 1:
+            logger.debug(f"Lote de embeddings de pergunta: {len(batch)} pedidos, {len(texts)} textos")
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "queries": self.queries,
+            "avg_batch": self.queries / self.calls if self.calls else 0.0,
+            "largest_batch": self.largest_batch,
+        }
@@ -0,0 +1,137 @@
+"""Cache em disco de embeddings endereçado por conteúdo (modelo + hash do texto)."""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.infrastructure.embedding_batcher import embed_queries
+from src.utils.logging import get_logger
+
+logger = get_logger()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Envolve um modelo de embeddings e guarda cada vetor em SQLite como float32.
+
+    A chave inclui o tipo de embedding ("document" ou "query"), pois o Gemini usa
+    task types diferentes para indexação e busca. Quando o cache excede
+    `max_entries`, os vetores menos usados recentemente são descartados.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, path: str, max_entries: int = 200_000):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _key(self, kind: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{kind}:{digest}"
+
+    def _lookup(self, keys: List[str]) -> dict:
+        found = {}
+        with self._lock:
+            # SQLite limita o número de parâmetros por consulta
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, items: List[tuple]):
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items]
+            )
+            self._size += self._conn.total_changes - before
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        excess = self._size - self.max_entries
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,)
+        )
+        self._size -= excess
+        logger.debug(f"Cache de embeddings: {excess} vetores antigos removidos")
+
+    def _embed_cached(self, kind: str, texts: List[str], embed_fn) -> List[List[float]]:
+        keys = [self._key(kind, text) for text in texts]
+        found = self._lookup(list(set(keys)))
+
+        # Textos repetidos na mesma chamada são embedados uma única vez
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = embed_fn(list(missing.values()))
+            new_items = list(zip(missing.keys(), vectors))
+            self._store(new_items)
+            found.update({key: list(vector) for key, vector in new_items})
+
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_cached("document", texts, self.underlying.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_cached("query", [text], lambda items: [self.underlying.embed_query(items[0])])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Várias perguntas numa chamada (ver QueryEmbeddingBatcher); mesma chave de `embed_query`."""
+        return self._embed_cached("query", texts, lambda items: embed_queries(self.underlying, items))
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": self._size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
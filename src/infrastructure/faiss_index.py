@@ -0,0 +1,111 @@
+"""Construção de índices FAISS exatos ou aproximados (IVF, HNSW, IVF-PQ)."""
+from typing import Literal
+
+import faiss
+import numpy as np
+from pydantic import BaseModel
+
+IndexType = Literal["flat", "ivf", "hnsw", "ivfpq"]
+
+# O k-means do FAISS recomenda ~39 pontos de treino por centróide
+POINTS_PER_CENTROID = 39
+
+
+class IndexConfig(BaseModel):
+    """Tipo de índice e seus parâmetros de construção e de busca."""
+
+    index_type: IndexType = "flat"
+    nlist: int = 1024
+    nprobe: int = 16
+    hnsw_m: int = 32
+    hnsw_ef_construction: int = 80
+    hnsw_ef_search: int = 64
+    pq_m: int = 16
+    pq_nbits: int = 8
+    train_size: int = 10_000
+
+    @classmethod
+    def from_settings(cls, settings) -> "IndexConfig":
+        return cls(
+            index_type=settings.faiss_index_type,
+            nlist=settings.faiss_nlist,
+            nprobe=settings.faiss_nprobe,
+            hnsw_m=settings.faiss_hnsw_m,
+            hnsw_ef_construction=settings.faiss_hnsw_ef_construction,
+            hnsw_ef_search=settings.faiss_hnsw_ef_search,
+            pq_m=settings.faiss_pq_m,
+            pq_nbits=settings.faiss_pq_nbits,
+            train_size=settings.faiss_train_size,
+        )
+
+    @property
+    def needs_training(self) -> bool:
+        return self.index_type in ("ivf", "ivfpq")
+
+    def build_params(self) -> dict:
+        """Parâmetros que alteram o índice gravado (entram no manifesto)."""
+        params = {"index_type": self.index_type}
+        if self.needs_training:
+            params.update(nlist=self.nlist, train_size=self.train_size)
+        if self.index_type == "hnsw":
+            params.update(hnsw_m=self.hnsw_m, hnsw_ef_construction=self.hnsw_ef_construction)
+        if self.index_type == "ivfpq":
+            params.update(pq_m=self.pq_m, pq_nbits=self.pq_nbits)
+        return params
+
+    def describe(self) -> str:
+        if self.index_type == "ivf":
+            return f"ivf(nlist={self.nlist}, nprobe={self.nprobe})"
+        if self.index_type == "hnsw":
+            return f"hnsw(M={self.hnsw_m}, efSearch={self.hnsw_ef_search})"
+        if self.index_type == "ivfpq":
+            return f"ivfpq(nlist={self.nlist}, nprobe={self.nprobe}, m={self.pq_m}, nbits={self.pq_nbits})"
+        return "flat"
+
+
+def _largest_divisor_at_most(dim: int, limit: int) -> int:
+    for m in range(min(limit, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def build_index(config: IndexConfig, train_vectors: np.ndarray) -> faiss.Index:
+    """
+    Cria (e treina, se preciso) um índice vazio para vetores como `train_vectors`.
+
+    Para corpora pequenos, nlist e nbits são reduzidos ao que os dados de
+    treino suportam, evitando centróides vazios.
+    """
+    train_vectors = np.ascontiguousarray(train_vectors, dtype=np.float32)
+    n, dim = train_vectors.shape
+
+    if config.index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, config.hnsw_m)
+        index.hnsw.efConstruction = config.hnsw_ef_construction
+    elif config.needs_training:
+        nlist = max(1, min(config.nlist, n // POINTS_PER_CENTROID))
+        if config.index_type == "ivf":
+            description = f"IVF{nlist},Flat"
+        else:
+            pq_m = _largest_divisor_at_most(dim, config.pq_m)
+            nbits = config.pq_nbits
+            while nbits > 1 and 2 ** nbits * POINTS_PER_CENTROID > n:
+                nbits -= 1
+            description = f"IVF{nlist},PQ{pq_m}x{nbits}"
+        index = faiss.index_factory(dim, description)
+        index.train(train_vectors)
+    else:
+        index = faiss.IndexFlatL2(dim)
+
+    configure_search(index, config)
+    return index
+
+
+def configure_search(index: faiss.Index, config: IndexConfig):
+    """Aplica os parâmetros de busca (podem mudar sem reconstruir o índice)."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(config.nprobe, ivf.nlist)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = config.hnsw_ef_search
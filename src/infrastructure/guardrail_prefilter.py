@@ -0,0 +1,209 @@
+"""
+Pré-filtro local do guardrail de entrada: decide os casos óbvios sem o LLM.
+
+Na ingestão, cada shard grava um perfil do corpus com um gazetteer (nomes
+próprios recorrentes: personagens, lugares próprios da obra, e o título
+completo) e o centróide dos embeddings dos chunks. Na consulta, a pergunta é
+aceita só se estiver muito próxima do centróide e rejeitada se estiver muito
+distante sem citar nenhum termo do gazetteer. Um termo do corpus sozinho não
+aprova: a pergunta pode citar outra obra ou partir de uma premissa falsa, o
+que só o guardrail LLM verifica. Os demais casos seguem para o LLM.
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import settings
+from src.utils.text import STOPWORDS, fold_accents
+
+PROFILE_FILE = "profile.json"
+PROFILE_VERSION = 2
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+(?:-[^\W\d_]+)*")
+# Pontuação que inicia frase: a palavra seguinte é maiúscula por posição, não por ser nome
+SENTENCE_END = re.compile(r"[.!?:;—\-\"'«»()\[\]]\s*$")
+
+# Nomes próprios comuns a qualquer texto em português (tratamentos, religião,
+# datas, lugares conhecidos): grafados com maiúscula, mas não identificam a obra
+GENERIC_PROPER_NOUNS = frozenset("""
+dom dona don senhor senhora sr sra doutor padre frei santo santa sao nossa deus cristo jesus virgem
+janeiro fevereiro marco abril maio junho julho agosto setembro outubro novembro dezembro
+domingo segunda terca quarta quinta sexta sabado natal pascoa
+rio brasil portugal lisboa europa america paris franca inglaterra londres italia roma espanha
+""".split())
+
+
+class CorpusProfile:
+    """Gazetteer e centróide de um shard, acumulados chunk a chunk na ingestão."""
+
+    def __init__(self):
+        self.capitalized: Counter = Counter()
+        self.lowercase: Counter = Counter()
+        self.vector_sum: Optional[np.ndarray] = None
+        self.vector_count = 0
+        self.terms: Dict[str, int] = {}
+        self.centroid: Optional[np.ndarray] = None
+
+    def add_text(self, text: str):
+        for match in WORD_PATTERN.finditer(text):
+            word = match.group()
+            folded = fold_accents(word)
+            if len(folded) < 3 or folded in STOPWORDS:
+                continue
+            if word[0].isupper():
+                # Só conta como nome próprio se não estiver em início de frase
+                before = text[max(0, match.start() - 3):match.start()]
+                if match.start() > 0 and before.strip() and not SENTENCE_END.search(before):
+                    self.capitalized[folded] += 1
+            else:
+                self.lowercase[folded] += 1
+
+    def add_vectors(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        total = (vectors / norms).sum(axis=0)
+        self.vector_sum = total if self.vector_sum is None else self.vector_sum + total
+        self.vector_count += len(vectors)
+
+    def finalize(self, min_count: int, extra_terms: Iterable[str] = ()):
+        """Fecha o gazetteer: termos quase sempre grafados com maiúscula e recorrentes."""
+        self.terms = {
+            term: count
+            for term, count in self.capitalized.items()
+            if count >= min_count and count >= 4 * self.lowercase.get(term, 0) and term not in GENERIC_PROPER_NOUNS
+        }
+        for term in extra_terms:
+            # Termos extras (o título) entram como frase inteira: "dom casmurro", não "dom"
+            phrase = " ".join(fold_accents(word) for word in WORD_PATTERN.findall(term))
+            if len(phrase) >= 3 and phrase not in STOPWORDS and phrase not in GENERIC_PROPER_NOUNS:
+                self.terms.setdefault(phrase, min_count)
+        if self.vector_sum is not None and self.vector_count:
+            self.centroid = self.vector_sum / self.vector_count
+        return self
+
+    def save(self, folder: str):
+        path = os.path.join(folder, PROFILE_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "version": PROFILE_VERSION,
+                "terms": self.terms,
+                "centroid": self.centroid.tolist() if self.centroid is not None else None,
+            }, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, folder: str) -> Optional["CorpusProfile"]:
+        path = os.path.join(folder, PROFILE_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if data.get("version") != PROFILE_VERSION:
+            return None
+        profile = cls()
+        profile.terms = data["terms"]
+        if data.get("centroid") is not None:
+            profile.centroid = np.asarray(data["centroid"], dtype=np.float32)
+        return profile
+
+
+class GuardrailPrefilter:
+    """Classifica a pergunta em "accept", "reject" ou "escalate" (vai para o LLM)."""
+
+    def __init__(
+        self,
+        profiles: List[CorpusProfile],
+        embed_query: Optional[Callable[[str], List[float]]] = None,
+        accept_similarity: float = 0.8,
+        reject_similarity: float = 0.35,
+    ):
+        self.terms = set()
+        self.phrases = set()
+        for profile in profiles:
+            for term in profile.terms:
+                (self.phrases if " " in term else self.terms).add(term)
+        centroids = [p.centroid for p in profiles if p.centroid is not None]
+        self.centroids = None
+        if centroids and embed_query is not None:
+            matrix = np.vstack(centroids)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.centroids = matrix / norms
+        self.embed_query = embed_query
+        self.accept_similarity = accept_similarity
+        self.reject_similarity = reject_similarity
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def matched_terms(self, question: str) -> List[str]:
+        words = [fold_accents(w) for w in WORD_PATTERN.findall(question)]
+        padded = f" {' '.join(words)} "
+        phrases = [phrase for phrase in self.phrases if f" {phrase} " in padded]
+        return phrases + [word for word in words if word in self.terms]
+
+    def similarity(self, question: str) -> Optional[float]:
+        """Maior cosseno entre a pergunta e os centróides dos shards."""
+        if self.centroids is None:
+            return None
+        query = np.asarray(self.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm:
+            return None
+        return float((self.centroids @ (query / norm)).max())
+
+    def _decide(self, question: str) -> Tuple[str, str]:
+        terms = self.matched_terms(question)
+        similarity = self.similarity(question)
+
+        if similarity is not None and similarity >= self.accept_similarity:
+            return "accept", f"similaridade {similarity:.2f} com o corpus"
+        if terms:
+            # Cita o corpus, mas outra obra ou premissa falsa só o LLM verifica
+            return "escalate", f"termos do corpus: {', '.join(terms[:3])}"
+        if similarity is not None and similarity <= self.reject_similarity:
+            return "reject", "A pergunta não parece tratar das obras indexadas."
+        return "escalate", "caso ambíguo"
+
+    def classify(self, question: str) -> Tuple[str, str]:
+        """(decisão, motivo); erros locais sempre escalam para o LLM."""
+        try:
+            decision, reason = self._decide(question)
+        except Exception as e:
+            decision, reason = "escalate", f"erro no pré-filtro: {e}"
+        with self._lock:
+            self.counters[decision] += 1
+        return decision, reason
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self.counters.values())
+            return {
+                "accept": self.counters["accept"],
+                "reject": self.counters["reject"],
+                "escalate": self.counters["escalate"],
+                "local_rate": (self.counters["accept"] + self.counters["reject"]) / total if total else 0.0,
+            }
+
+
+def build_guardrail_prefilter(
+    profiles: List[CorpusProfile],
+    embed_query: Optional[Callable[[str], List[float]]] = None,
+) -> Optional[GuardrailPrefilter]:
+    """Pré-filtro configurado em Settings; None se desligado ou sem perfis de corpus."""
+    if not settings.guardrail_prefilter_enabled or not profiles:
+        return None
+    return GuardrailPrefilter(
+        profiles,
+        embed_query=embed_query,
+        accept_similarity=settings.guardrail_accept_similarity,
+        reject_similarity=settings.guardrail_reject_similarity
+    )
@@ -0,0 +1,92 @@
+"""Índice invertido BM25 em memória, persistido ao lado de cada shard FAISS."""
+import json
+import math
+import os
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.text import ANALYZER_VERSION, analyze
+
+LEXICAL_FILE = "lexical.json"
+
+
+class BM25Index:
+    """
+    Índice invertido com ranqueamento BM25.
+
+    Cada posting guarda (posição do documento, frequência do termo); os
+    documentos são identificados pelo mesmo `chunk_id` usado no docstore FAISS.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids: List[str] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, List[List[int]]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def add(self, doc_id: str, text: str):
+        position = len(self.doc_ids)
+        tokens = analyze(text)
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(len(tokens))
+        self._total_length += len(tokens)
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, []).append([position, tf])
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        n_docs = len(self.doc_ids)
+        if n_docs == 0:
+            return []
+
+        avg_length = self._total_length / n_docs or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(analyze(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[position] / avg_length)
+                scores[position] = scores.get(position, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.doc_ids[position], score) for position, score in ranked]
+
+    def save(self, folder: str):
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, LEXICAL_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "analyzer_version": ANALYZER_VERSION,
+                "doc_ids": self.doc_ids,
+                "doc_lengths": self.doc_lengths,
+                "postings": self.postings,
+            }, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, folder: str, k1: float = 1.5, b: float = 0.75) -> Optional["BM25Index"]:
+        """Carrega o índice; None se não existir ou tiver sido gerado por outro analisador."""
+        path = os.path.join(folder, LEXICAL_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if data.get("analyzer_version") != ANALYZER_VERSION:
+            return None
+
+        index = cls(k1=k1, b=b)
+        index.doc_ids = data["doc_ids"]
+        index.doc_lengths = data["doc_lengths"]
+        index.postings = data["postings"]
+        index._total_length = sum(index.doc_lengths)
+        return index
@@ -0,0 +1,127 @@
+"""Memoização em disco das chamadas ao LLM (BaseCache do LangChain sobre SQLite)."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+from src.utils.logging import get_logger
+
+logger = get_logger()
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    Respostas do LLM indexadas por hash do prompt e da configuração do modelo.
+
+    O `llm_string` do LangChain já inclui o nome do modelo, a temperatura e as
+    ferramentas vinculadas (o schema do structured output), então prompts iguais
+    com schemas diferentes nunca colidem. Acima de `max_entries`, as entradas
+    menos usadas recentemente são descartadas.
+    """
+
+    def __init__(self, path: str, max_entries: int = 50_000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_calls (
+                key TEXT PRIMARY KEY,
+                generations TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_calls_last_used ON llm_calls(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM llm_calls").fetchone()[0]
+
+    @staticmethod
+    def _dumps(generations: Sequence[Generation]) -> str:
+        records = []
+        for generation in generations:
+            if isinstance(generation, ChatGeneration):
+                records.append({"message": message_to_dict(generation.message)})
+            else:
+                records.append({"text": generation.text})
+        return json.dumps(records, ensure_ascii=False)
+
+    @staticmethod
+    def _loads(payload: str) -> list:
+        generations = []
+        for record in json.loads(payload):
+            if "message" in record:
+                generations.append(ChatGeneration(message=messages_from_dict([record["message"]])[0]))
+            else:
+                generations.append(Generation(text=record["text"]))
+        return generations
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT generations FROM llm_calls WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_calls SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        try:
+            generations = self._loads(row[0])
+        except Exception as e:
+            logger.warning(f"Cache do LLM: entrada ilegível descartada ({e})")
+            with self._lock:
+                self.misses += 1
+                self._conn.execute("DELETE FROM llm_calls WHERE key = ?", (key,))
+                self._size -= 1
+                self._conn.commit()
+            return None
+        self.hits += 1
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        key = self._key(prompt, llm_string)
+        payload = self._dumps(return_val)
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM llm_calls WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_calls (key, generations, last_used) VALUES (?, ?, ?)",
+                (key, payload, time.time())
+            )
+            if not exists:
+                self._size += 1
+            excess = self._size - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_calls WHERE key IN "
+                    "(SELECT key FROM llm_calls ORDER BY last_used ASC LIMIT ?)",
+                    (excess,)
+                )
+                self._size -= excess
+                logger.debug(f"Cache do LLM: {excess} respostas antigas removidas")
+            self._conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_calls")
+            self._conn.commit()
+            self._size = 0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": self._size}
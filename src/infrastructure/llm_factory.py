@@ -1,17 +1,53 @@
+from typing import Optional
+
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from src.config import settings
+from src.infrastructure.embedding_cache import CachedEmbeddings
+from src.infrastructure.llm_cache import SQLiteLLMCache
+
+# Chains com memoização configurável (flags llm_cache_<chain> em Settings)
+CACHEABLE_CHAINS = ("guardrail", "grader", "rewriter", "generation", "hallucination")
+
 
 class LLMFactory:
-    @staticmethod
-    def get_llm():
+    _llm_cache: Optional[SQLiteLLMCache] = None
+
+    @classmethod
+    def get_llm_cache(cls) -> SQLiteLLMCache:
+        """Cache de chamadas ao LLM compartilhado por todas as chains do processo."""
+        if cls._llm_cache is None:
+            cls._llm_cache = SQLiteLLMCache(settings.llm_cache_path, max_entries=settings.llm_cache_max_entries)
+        return cls._llm_cache
+
+    @classmethod
+    def _cache_for(cls, chain: Optional[str]):
+        # Só é seguro memoizar saídas determinísticas (temperature=0)
+        if chain is None or not settings.llm_cache_enabled or settings.temperature > 0:
+            return False
+        if chain not in CACHEABLE_CHAINS:
+            raise ValueError(f"Chain desconhecida para o cache do LLM: {chain}")
+        return cls.get_llm_cache() if getattr(settings, f"llm_cache_{chain}") else False
+
+    @classmethod
+    def get_llm(cls, chain: Optional[str] = None):
+        """Modelo de chat; com `chain`, as chamadas passam pelo cache em disco, se habilitado."""
         return ChatGoogleGenerativeAI(
-            model=settings.model_name, 
+            model=settings.model_name,
             temperature=settings.temperature,
-            api_key=settings.gemini_api_key
+            api_key=settings.gemini_api_key,
+            cache=cls._cache_for(chain)
         )
 
     @staticmethod
     def get_embeddings():
-        return GoogleGenerativeAIEmbeddings(model="models/gemini-embedding-001",
+        embeddings = GoogleGenerativeAIEmbeddings(model=settings.embedding_model,
             google_api_key=settings.gemini_api_key # pyright: ignore[reportArgumentType]
-        )
\ No newline at end of file
+        )
+        if not settings.embedding_cache_enabled:
+            return embeddings
+        return CachedEmbeddings(
+            embeddings,
+            model_name=settings.embedding_model,
+            path=settings.embedding_cache_path,
+            max_entries=settings.embedding_cache_max_entries
+        )
@@ -0,0 +1,161 @@
+"""
+Shard somente-leitura mapeado em memória (mmap), compartilhável entre workers.
+
+Os vetores são lidos com os flags de mmap do FAISS e os chunks ficam num único
+arquivo binário com uma tabela de deslocamentos; nada é desserializado na
+carga, e o page cache do sistema operacional é compartilhado entre processos.
+Chunks fatiados por capítulo guardam só os metadados: o texto é relido do
+próprio arquivo do corpus, também mapeado em memória.
+"""
+import json
+import mmap
+import os
+from collections.abc import Mapping
+from typing import Iterable, Optional, Union
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+CHUNKS_FILE = "chunks.bin"
+OFFSETS_FILE = "chunks.offsets.npy"
+INDEX_FILE = "index.faiss"
+FP16_INDEX_FILE = "index.fp16.faiss"
+
+MMAP_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+def write_chunk_store(folder: str, documents: Iterable[Document], offsets_only: bool = False):
+    """
+    Grava os chunks (texto + metadados em JSON) na ordem das posições do índice.
+
+    Com `offsets_only`, chunks com `start`/`end` (bytes no corpus) não guardam o texto.
+    """
+    offsets = [0]
+    chunks_path = os.path.join(folder, CHUNKS_FILE)
+    with open(f"{chunks_path}.tmp", "wb") as f:
+        for doc in documents:
+            record = {"metadata": doc.metadata}
+            if not (offsets_only and "start" in doc.metadata and "end" in doc.metadata):
+                record["page_content"] = doc.page_content
+            record = json.dumps(record, ensure_ascii=False).encode("utf-8")
+            f.write(record)
+            offsets.append(offsets[-1] + len(record))
+
+    offsets_path = os.path.join(folder, OFFSETS_FILE)
+    with open(f"{offsets_path}.tmp", "wb") as f:
+        np.save(f, np.asarray(offsets, dtype=np.int64))
+    os.replace(f"{chunks_path}.tmp", chunks_path)
+    os.replace(f"{offsets_path}.tmp", offsets_path)
+
+
+def write_fp16_index(folder: str, index: faiss.Index) -> bool:
+    """Cópia float16 de um índice flat (metade da memória). False se o tipo não suportar."""
+    if not isinstance(index, faiss.IndexFlat):
+        return False
+    fp16 = faiss.IndexScalarQuantizer(index.d, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    fp16.add(index.reconstruct_n(0, index.ntotal))
+    path = os.path.join(folder, FP16_INDEX_FILE)
+    faiss.write_index(fp16, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    return True
+
+
+def write_index(folder: str, index: faiss.Index):
+    """Grava só os vetores (sem o pickle do docstore do LangChain)."""
+    path = os.path.join(folder, INDEX_FILE)
+    faiss.write_index(index, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+
+
+def _map_file(path: str):
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+
+def has_chunk_store(folder: str) -> bool:
+    return os.path.exists(os.path.join(folder, CHUNKS_FILE)) and os.path.exists(os.path.join(folder, OFFSETS_FILE))
+
+
+class PositionalIds(Mapping):
+    """index_to_docstore_id implícito: a posição i no índice é o chunk "<book_id>:<i>"."""
+
+    def __init__(self, prefix: str, size: int):
+        self.prefix = prefix
+        self.size = size
+
+    def __getitem__(self, position) -> str:
+        position = int(position)
+        if not 0 <= position < self.size:
+            raise KeyError(position)
+        return f"{self.prefix}{position}"
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self):
+        return iter(range(self.size))
+
+
+class MmapDocstore(Docstore):
+    """
+    Docstore somente-leitura: decodifica cada chunk sob demanda a partir do mmap.
+
+    Registros sem `page_content` têm o texto lido de `corpus_path[start:end]`.
+    """
+
+    def __init__(self, folder: str, prefix: str, corpus_path: Optional[str] = None):
+        self.prefix = prefix
+        self.offsets = np.load(os.path.join(folder, OFFSETS_FILE), mmap_mode="r")
+        self._data = _map_file(os.path.join(folder, CHUNKS_FILE))
+        self._corpus = _map_file(corpus_path) if corpus_path else None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def get(self, position: int) -> Document:
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        record = json.loads(self._data[start:end].decode("utf-8"))
+        if "page_content" not in record:
+            if self._corpus is None:
+                raise ValueError("Chunk store guarda deslocamentos, mas nenhum corpus foi informado")
+            metadata = record["metadata"]
+            record["page_content"] = self._corpus[metadata["start"]:metadata["end"]].decode("utf-8")
+        return Document(id=record["metadata"].get("chunk_id"), **record)
+
+    def search(self, search: str) -> Union[str, Document]:
+        if not search.startswith(self.prefix):
+            return f"ID {search} not found."
+        try:
+            position = int(search[len(self.prefix):])
+        except ValueError:
+            return f"ID {search} not found."
+        if not 0 <= position < len(self):
+            return f"ID {search} not found."
+        return self.get(position)
+
+
+def load_mmap_vectorstore(
+    folder: str,
+    embeddings: Embeddings,
+    prefix: str,
+    fp16: bool = False,
+    corpus_path: Optional[str] = None,
+    mmap_vectors: bool = True,
+) -> FAISS:
+    """
+    FAISS do LangChain sobre índice e docstore mapeados em memória (somente leitura).
+
+    Com `mmap_vectors=False` os vetores são copiados para a memória do processo
+    (o docstore continua mapeado).
+    """
+    index_file = FP16_INDEX_FILE if fp16 and os.path.exists(os.path.join(folder, FP16_INDEX_FILE)) else INDEX_FILE
+    index = faiss.read_index(os.path.join(folder, index_file), MMAP_FLAGS if mmap_vectors else 0)
+    docstore = MmapDocstore(folder, prefix, corpus_path=corpus_path)
+    if len(docstore) != index.ntotal:
+        raise ValueError(f"Chunk store com {len(docstore)} registros para {index.ntotal} vetores em {folder}")
+    return FAISS(embeddings, index, docstore, PositionalIds(prefix, index.ntotal))
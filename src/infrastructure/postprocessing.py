@@ -0,0 +1,138 @@
+"""
+Pós-processamento dos chunks recuperados: fusão de trechos sobrepostos ou
+adjacentes (pelo deslocamento no corpus) e diversificação por MMR.
+"""
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_core.documents import Document
+
+from src.config import settings
+
+
+def chunk_span(doc: Document) -> Optional[Tuple[int, int]]:
+    """
+    Intervalo [início, fim) do chunk no arquivo do livro, ou None se desconhecido.
+
+    Chunks por capítulo trazem `start`/`end` em bytes; os do splitter recursivo,
+    `start_index` em caracteres. Os dois nunca se misturam num mesmo shard.
+    """
+    metadata = doc.metadata
+    if "start" in metadata and "end" in metadata:
+        return metadata["start"], metadata["end"]
+    if "start_index" in metadata:
+        return metadata["start_index"], metadata["start_index"] + len(doc.page_content)
+    return None
+
+
+def _join(left: Document, right: Document) -> Document:
+    """Une dois chunks do mesmo livro (`right` começa depois de `left`)."""
+    left_start, left_end = chunk_span(left)
+    right_start, right_end = chunk_span(right)
+    metadata = dict(left.metadata)
+
+    if right_end <= left_end:
+        content = left.page_content
+    elif right_start < left_end and "start_index" in metadata:
+        # Sobreposição do splitter recursivo: o trecho repetido entra uma única vez
+        content = left.page_content + right.page_content[left_end - right_start:]
+    else:
+        content = f"{left.page_content}\n\n{right.page_content}"
+
+    if "end" in metadata:
+        metadata["end"] = max(left_end, right_end)
+    chunk_ids = (
+        left.metadata.get("merged_chunk_ids", [left.metadata.get("chunk_id")])
+        + right.metadata.get("merged_chunk_ids", [right.metadata.get("chunk_id")])
+    )
+    metadata["merged_chunk_ids"] = chunk_ids
+    metadata["chunk_id"] = "+".join(str(chunk_id) for chunk_id in chunk_ids)
+    return Document(page_content=content, metadata=metadata)
+
+
+def merge_adjacent(documents: Sequence[Document], max_gap: int = 0) -> List[Document]:
+    """
+    Funde chunks do mesmo livro (e capítulo) cujos intervalos se sobrepõem ou
+    distam até `max_gap`.
+
+    O documento resultante ocupa a posição do melhor colocado entre os que o
+    compõem; chunks sem deslocamento conhecido passam inalterados.
+    """
+    groups = {}  # (book_id, capítulo) -> lista de (rank, doc)
+    passthrough = []
+    for rank, doc in enumerate(documents):
+        if chunk_span(doc) is None:
+            passthrough.append((rank, doc))
+        else:
+            key = (doc.metadata.get("book_id"), doc.metadata.get("chapter_index"))
+            groups.setdefault(key, []).append((rank, doc))
+
+    merged = list(passthrough)
+    for items in groups.values():
+        items.sort(key=lambda item: chunk_span(item[1]))
+        rank, current = items[0]
+        for next_rank, doc in items[1:]:
+            if chunk_span(doc)[0] <= chunk_span(current)[1] + max_gap:
+                current = _join(current, doc)
+                rank = min(rank, next_rank)
+            else:
+                merged.append((rank, current))
+                rank, current = next_rank, doc
+        merged.append((rank, current))
+
+    return [doc for _, doc in sorted(merged, key=lambda item: item[0])]
+
+
+class ContextPostprocessor:
+    """Reduz o contexto enviado ao LLM sem perder cobertura: fusão de vizinhos e MMR."""
+
+    def __init__(
+        self,
+        retriever: Any = None,
+        merge: bool = True,
+        max_gap: int = 0,
+        mmr_k: Optional[int] = None,
+        mmr_lambda: float = 0.5,
+    ):
+        self.retriever = retriever
+        self.merge = merge
+        self.max_gap = max_gap
+        # O MMR usa os vetores gravados no índice (`stored_vectors` do retriever)
+        self.mmr_k = mmr_k if hasattr(retriever, "stored_vectors") else None
+        self.mmr_lambda = mmr_lambda
+
+    def mmr(self, question: str, documents: Sequence[Document], k: int) -> List[Document]:
+        """Seleciona `k` documentos equilibrando relevância e diversidade (MMR)."""
+        if len(documents) <= k:
+            return list(documents)
+        # Vetores já gravados no índice (média dos chunks nos fundidos): nenhum texto é embedado
+        vectors = self.retriever.stored_vectors(documents)
+        if vectors is None:
+            # Sem os vetores, mantém a ordem da busca
+            return list(documents[:k])
+        query = np.asarray(self.retriever.embed_query(question), dtype=np.float32)
+        selected = maximal_marginal_relevance(query, vectors, lambda_mult=self.mmr_lambda, k=k)
+        return [documents[i] for i in selected]
+
+    def process(self, question: str, documents: Sequence[Document]) -> List[Document]:
+        documents = list(documents)
+        if self.merge:
+            documents = merge_adjacent(documents, max_gap=self.max_gap)
+        if self.mmr_k:
+            documents = self.mmr(question, documents, self.mmr_k)
+        return documents
+
+
+def build_postprocessor(retriever: Any = None) -> Optional[ContextPostprocessor]:
+    """Pós-processador configurado em Settings; None se fusão e MMR estiverem desligados."""
+    mmr_k = settings.mmr_k if settings.mmr_enabled else None
+    if not settings.merge_adjacent_chunks and not mmr_k:
+        return None
+    return ContextPostprocessor(
+        retriever,
+        merge=settings.merge_adjacent_chunks,
+        max_gap=settings.merge_max_gap,
+        mmr_k=mmr_k,
+        mmr_lambda=settings.mmr_lambda
+    )
@@ -0,0 +1,118 @@
+"""Reranqueamento local (CPU) dos documentos recuperados, antes do grader LLM."""
+from abc import ABC, abstractmethod
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.config import settings
+from src.utils.text import analyze
+
+
+class Reranker(ABC):
+    """Atribui um score de relevância a cada documento; maior é melhor."""
+
+    @abstractmethod
+    def score(self, question: str, documents: Sequence[Document]) -> List[float]:
+        ...
+
+    def rerank(
+        self,
+        question: str,
+        documents: Sequence[Document],
+        top_n: Optional[int] = None,
+        threshold: Optional[float] = None,
+    ) -> List[Tuple[Document, float]]:
+        """Ordena por score e mantém os `top_n` acima de `threshold`."""
+        if not documents:
+            return []
+        scored = sorted(zip(documents, self.score(question, documents)), key=lambda item: item[1], reverse=True)
+        if threshold is not None:
+            scored = [(doc, score) for doc, score in scored if score >= threshold]
+        return scored[:top_n] if top_n else scored
+
+
+class LexicalOverlapReranker(Reranker):
+    """Fração dos termos da pergunta (normalizados e sem stopwords) presentes no documento."""
+
+    def score(self, question: str, documents: Sequence[Document]) -> List[float]:
+        query_terms = set(analyze(question))
+        if not query_terms:
+            return [0.0] * len(documents)
+        return [len(query_terms & set(analyze(doc.page_content))) / len(query_terms) for doc in documents]
+
+
+class EmbeddingSimilarityReranker(Reranker):
+    """
+    Similaridade de cosseno entre a pergunta e cada documento.
+
+    Os vetores dos documentos são os já gravados no índice (`stored_vectors` do
+    retriever), então nenhum texto é embedado de novo; a pergunta usa o embedding
+    em cache do retriever. Sem os vetores, o score cai para a sobreposição léxica.
+    """
+
+    def __init__(self, retriever: Any):
+        self.retriever = retriever
+        self.fallback = LexicalOverlapReranker()
+
+    def score(self, question: str, documents: Sequence[Document]) -> List[float]:
+        matrix = self.retriever.stored_vectors(documents)
+        if matrix is None:
+            return self.fallback.score(question, documents)
+        query = np.asarray(self.retriever.embed_query(question), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        norms[norms == 0] = 1.0
+        return (matrix @ query / norms).tolist()
+
+
+class CrossEncoderReranker(Reranker):
+    """Cross-encoder local (sentence-transformers), carregado sob demanda."""
+
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise ImportError(
+                "RERANK_METHOD=cross_encoder requer o pacote 'sentence-transformers' "
+                "(uv add sentence-transformers)"
+            ) from e
+        self.model = CrossEncoder(model_name, device="cpu")
+
+    def score(self, question: str, documents: Sequence[Document]) -> List[float]:
+        return [float(s) for s in self.model.predict([(question, d.page_content) for d in documents])]
+
+
+class CompositeReranker(Reranker):
+    """Soma ponderada dos scores de vários rerankers."""
+
+    def __init__(self, components: List[Tuple[Reranker, float]]):
+        self.components = components
+
+    def score(self, question: str, documents: Sequence[Document]) -> List[float]:
+        total = np.zeros(len(documents), dtype=np.float32)
+        for reranker, weight in self.components:
+            total += weight * np.asarray(reranker.score(question, documents), dtype=np.float32)
+        return total.tolist()
+
+
+def build_reranker(retriever: Any = None) -> Optional[Reranker]:
+    """
+    Reranker configurado em `rerank_method`; None se o reranqueamento estiver desligado.
+
+    Os métodos por embedding precisam de um retriever com `stored_vectors`;
+    sem ele, cai para o reranker léxico.
+    """
+    if not settings.rerank_enabled:
+        return None
+
+    method = settings.rerank_method
+    if method == "cross_encoder":
+        return CrossEncoderReranker(settings.rerank_cross_encoder_model)
+    if method == "lexical" or not hasattr(retriever, "stored_vectors"):
+        return LexicalOverlapReranker()
+    if method == "embedding":
+        return EmbeddingSimilarityReranker(retriever)
+    return CompositeReranker([
+        (LexicalOverlapReranker(), settings.rerank_lexical_weight),
+        (EmbeddingSimilarityReranker(retriever), 1.0 - settings.rerank_lexical_weight),
+    ])
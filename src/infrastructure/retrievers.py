@@ -0,0 +1,172 @@
+"""Retrievers sobre os shards FAISS (um por livro do catálogo)."""
+from concurrent.futures import Executor
+from itertools import chain
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, Field, SkipValidation
+
+from src.utils.cache import MISSING, LRUCache
+from src.utils.text import normalize_query
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """Combina listas ranqueadas de ids: score = soma de 1 / (k + posição)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
+
+
+class ShardedRetriever(BaseRetriever):
+    """
+    Busca a pergunta em vários shards e junta o top-k global.
+
+    O embedding da pergunta é calculado uma única vez e os shards são
+    consultados em paralelo; como todos usam o mesmo modelo e a mesma métrica
+    (L2), as distâncias são diretamente comparáveis. No modo "hybrid", os
+    candidatos densos e os do BM25 são combinados por reciprocal rank fusion.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    # Sem validação para não copiar os dicionários: o repositório os atualiza ao reconstruir um shard
+    shards: SkipValidation[Dict[str, Any]]
+    embeddings: Any
+    lexical: SkipValidation[Dict[str, Any]] = Field(default_factory=dict)
+    k: int = 3
+    book_ids: Optional[List[str]] = None
+    executor: Optional[Executor] = None
+    mode: str = "dense"
+    fetch_k: int = 20
+    rrf_k: int = 60
+    # Caches compartilhados entre retrievers do mesmo repositório (ver VectorStoreRepository)
+    query_embedding_cache: Optional[LRUCache] = None
+    result_cache: Optional[LRUCache] = None
+    # Agrupa embeddings de pergunta de requisições concorrentes (QueryEmbeddingBatcher)
+    query_batcher: Optional[Any] = None
+
+    def _selected_ids(self) -> List[str]:
+        if self.book_ids is None:
+            return list(self.shards)
+        return [book_id for book_id in self.book_ids if book_id in self.shards]
+
+    def _map_shards(self, fn) -> List[Any]:
+        book_ids = self._selected_ids()
+        if self.executor is None or len(book_ids) <= 1:
+            return [fn(book_id) for book_id in book_ids]
+        return list(self.executor.map(fn, book_ids))
+
+    def search_with_scores(self, embedding: List[float], k: Optional[int] = None) -> List[tuple]:
+        k = k or self.k
+
+        def search(book_id):
+            return self.shards[book_id].similarity_search_with_score_by_vector(embedding, k=k)
+
+        return sorted(chain.from_iterable(self._map_shards(search)), key=lambda item: item[1])[:k]
+
+    def lexical_search(self, query: str, k: Optional[int] = None) -> List[tuple]:
+        k = k or self.k
+
+        def search(book_id):
+            index = self.lexical.get(book_id)
+            return [(book_id, doc_id, score) for doc_id, score in index.search(query, k)] if index else []
+
+        return sorted(chain.from_iterable(self._map_shards(search)), key=lambda item: item[2], reverse=True)[:k]
+
+    def _hybrid(self, query: str, embedding: List[float]) -> List[Document]:
+        dense = self.search_with_scores(embedding, k=self.fetch_k)
+        lexical = self.lexical_search(query, k=self.fetch_k)
+
+        docs = {doc.metadata["chunk_id"]: doc for doc, _ in dense}
+        for book_id, doc_id, _ in lexical:
+            if doc_id not in docs:
+                docs[doc_id] = self.shards[book_id].docstore.search(doc_id)
+
+        fused = reciprocal_rank_fusion(
+            [[doc.metadata["chunk_id"] for doc, _ in dense], [doc_id for _, doc_id, _ in lexical]],
+            k=self.rrf_k
+        )
+        return [docs[doc_id] for doc_id in fused[:self.k]]
+
+    def get_by_ids(self, chunk_ids: List[str]) -> List[Document]:
+        """Documentos pelos ids "<book_id>:<posição>"; ids de shards ausentes são ignorados."""
+        documents = []
+        for chunk_id in chunk_ids:
+            shard = self.shards.get(chunk_id.rsplit(":", 1)[0])
+            doc = shard.docstore.search(chunk_id) if shard is not None else None
+            if isinstance(doc, Document):
+                documents.append(doc)
+        return documents
+
+    def _stored_vector(self, chunk_id: Optional[str]) -> Optional[np.ndarray]:
+        book_id, _, position = (chunk_id or "").rpartition(":")
+        shard = self.shards.get(book_id)
+        if shard is None or not position.isdigit():
+            return None
+        # Ids "<book_id>:<posição>": a posição do chunk é a linha do vetor no índice
+        position = int(position)
+        if position >= shard.index.ntotal or shard.index_to_docstore_id.get(position) != chunk_id:
+            return None
+        try:
+            return shard.index.reconstruct(position)
+        except RuntimeError:
+            # Índices que não guardam os vetores (ex.: IVF sem mapa direto)
+            return None
+
+    def stored_vectors(self, documents: Sequence[Document]) -> Optional[np.ndarray]:
+        """
+        Vetores já gravados no índice para os documentos, sem chamar a API de embeddings.
+
+        Documentos fundidos no pós-processamento recebem a média dos vetores dos
+        chunks que os compõem. None se algum vetor não puder ser reconstruído.
+        """
+        rows = []
+        for doc in documents:
+            chunk_ids = doc.metadata.get("merged_chunk_ids") or [doc.metadata.get("chunk_id")]
+            vectors = [self._stored_vector(chunk_id) for chunk_id in chunk_ids]
+            if any(vector is None for vector in vectors):
+                return None
+            rows.append(np.mean(vectors, axis=0))
+        return np.asarray(rows, dtype=np.float32)
+
+    def _embed_uncached(self, query: str) -> List[float]:
+        if self.query_batcher is not None:
+            return self.query_batcher.embed_query(query)
+        return self.embeddings.embed_query(query)
+
+    def embed_query(self, query: str) -> List[float]:
+        if self.query_embedding_cache is None:
+            return self._embed_uncached(query)
+        key = normalize_query(query)
+        embedding = self.query_embedding_cache.get(key)
+        if embedding is MISSING:
+            embedding = self._embed_uncached(query)
+            self.query_embedding_cache.set(key, embedding)
+        return embedding
+
+    def _search(self, query: str) -> List[Document]:
+        embedding = self.embed_query(query)
+        if self.mode == "hybrid" and self.lexical:
+            return self._hybrid(query, embedding)
+        return [doc for doc, _ in self.search_with_scores(embedding)]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.result_cache is None:
+            return self._search(query)
+
+        # A mesma pergunta com outra configuração de busca é outra entrada
+        key = (normalize_query(query), self.k, self.mode, tuple(self.book_ids or ()))
+        cached = self.result_cache.get(key)
+        if cached is not MISSING:
+            return [self.shards[book_id].docstore.search(chunk_id) for book_id, chunk_id in cached]
+
+        documents = self._search(query)
+        self.result_cache.set(key, [(doc.metadata["book_id"], doc.metadata["chunk_id"]) for doc in documents])
+        return documents
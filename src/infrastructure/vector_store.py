@@ -1,38 +1,514 @@
+import hashlib
+import json
 import os
-import requests
+import random
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from src.config import settings
+from src.domain.catalog import Book, Catalog
+from src.infrastructure.corpus import CorpusSource, iter_chapter_chunks, iter_chunks, load_catalog
+from src.infrastructure.embedding_batcher import QueryEmbeddingBatcher
+from src.infrastructure.faiss_index import IndexConfig, build_index, configure_search
+from src.infrastructure.guardrail_prefilter import CorpusProfile
+from src.infrastructure.lexical_index import BM25Index
+from src.infrastructure.mmap_store import (
+    FP16_INDEX_FILE,
+    has_chunk_store,
+    load_mmap_vectorstore,
+    write_chunk_store,
+    write_fp16_index,
+    write_index,
+)
+from src.infrastructure.answer_cache import SemanticAnswerCache
 from src.infrastructure.llm_factory import LLMFactory
+from src.infrastructure.retrievers import ShardedRetriever
+from src.utils.cache import LRUCache
 
-class VectorStoreRepository:
-    def __init__(self):
-        self.embeddings = LLMFactory.get_embeddings()
+MANIFEST_FILE = "manifest.json"
+CHECKPOINT_DIR = "checkpoints"
+
+RATE_LIMIT_MARKERS = ("429", "resourceexhausted", "resource_exhausted", "rate limit", "quota")
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in RATE_LIMIT_MARKERS)
+
+
+class EmbeddingIngestor:
+    """
+    Embeda chunks em lotes, com um número limitado de requisições simultâneas.
+
+    Cada lote concluído é gravado em `checkpoint_dir`; se a ingestão for
+    interrompida, a próxima execução reaproveita os lotes já salvos.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        checkpoint_dir: str,
+        batch_size: int = 100,
+        max_concurrency: int = 4,
+        max_retries: int = 6,
+        backoff_seconds: float = 2.0,
+    ):
+        self.embeddings = embeddings
+        self.checkpoint_dir = checkpoint_dir
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def _checkpoint_path(self, batch_index: int) -> str:
+        return os.path.join(self.checkpoint_dir, f"batch_{batch_index:06d}.npy")
+
+    def _load_checkpoint(self, batch_index: int, expected: int):
+        path = self._checkpoint_path(batch_index)
+        if not os.path.exists(path):
+            return None
+        try:
+            vectors = np.load(path)
+        except (OSError, ValueError):
+            return None
+        return vectors if len(vectors) == expected else None
+
+    def _save_checkpoint(self, batch_index: int, vectors: np.ndarray):
+        path = self._checkpoint_path(batch_index)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, vectors)
+        os.replace(tmp_path, path)
+
+    def _embed_with_backoff(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries or not is_rate_limit_error(e):
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt) + random.uniform(0, self.backoff_seconds)
+                print(f"⏳ Rate limit na API de embeddings, aguardando {delay:.1f}s...")
+                time.sleep(delay)
+
+    def _process_batch(self, batch_index: int, batch: List[Document]) -> np.ndarray:
+        vectors = self._load_checkpoint(batch_index, len(batch))
+        if vectors is not None:
+            return vectors
+        vectors = np.asarray(self._embed_with_backoff([d.page_content for d in batch]), dtype=np.float32)
+        self._save_checkpoint(batch_index, vectors)
+        return vectors
+
+    def _batches(self, documents: Iterable[Document]) -> Iterator[List[Document]]:
+        batch = []
+        for doc in documents:
+            batch.append(doc)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def embed_batches(self, documents: Iterable[Document]) -> Iterator[Tuple[List[Document], np.ndarray]]:
+        """Gera (lote, vetores) na ordem original dos documentos."""
+        started = time.perf_counter()
+        done = 0
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for batch_index, batch in enumerate(self._batches(documents)):
+                pending.append((batch, executor.submit(self._process_batch, batch_index, batch)))
+                # Limita lotes em voo para não acumular chunks na memória
+                if len(pending) >= self.max_concurrency:
+                    batch_docs, future = pending.popleft()
+                    done += len(batch_docs)
+                    yield batch_docs, future.result()
+                    self._report(done, started)
+
+            while pending:
+                batch_docs, future = pending.popleft()
+                done += len(batch_docs)
+                yield batch_docs, future.result()
+                self._report(done, started)
+
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed > 0 else float("inf")
+        print(f"✅ {done} chunks embedados em {elapsed:.1f}s ({rate:.1f} chunks/s)")
+
+    def _report(self, done: int, started: float):
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed > 0 else float("inf")
+        print(f"   📈 {done} chunks processados ({rate:.1f} chunks/s)")
+
+    def clear_checkpoints(self):
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+
+class BookShard:
+    """Índice FAISS de um único livro, com manifesto e checkpoints próprios."""
+
+    def __init__(self, book: Book, embeddings: Embeddings, index_root: str):
+        self.book = book
+        self.embeddings = embeddings
+        self.index_path = os.path.join(index_root, book.book_id)
+        self.corpus = CorpusSource(book.url, book.storage_path)
+        self.index_config = IndexConfig.from_settings(settings)
         self.vectorstore = None
-        self._initialize_db()
-
-    def _download_content(self):
-        if not os.path.exists(settings.storage_path):
-            print(f"📥 Baixando corpus de {settings.book_url}...")
-            response = requests.get(settings.book_url)
-            response.encoding = 'utf-8'
-            with open(settings.storage_path, "w", encoding='utf-8') as f:
-                f.write(response.text)
-        
-        with open(settings.storage_path, "r", encoding='utf-8') as f:
-            return f.read()
-
-    def _initialize_db(self):
-        text_content = self._download_content()
-        
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.chunk_size, 
-            chunk_overlap=settings.chunk_overlap
+        self.lexical: Optional[BM25Index] = None
+        self.profile: Optional[CorpusProfile] = None
+        self.manifest: Optional[dict] = None
+
+    @property
+    def _offset_chunks(self) -> bool:
+        """No modo "chapter" o docstore guarda deslocamentos no corpus, não o texto."""
+        return settings.chunking_mode == "chapter"
+
+    def _iter_documents(self) -> Iterator[Document]:
+        if self._offset_chunks:
+            chunks = iter_chapter_chunks(self.book.storage_path, settings.chunk_size, settings.chapter_pattern)
+        else:
+            chunks = iter_chunks(self.book.storage_path, settings.chunk_size, settings.chunk_overlap)
+        for i, doc in enumerate(chunks):
+            doc.metadata.update({
+                "chunk_id": f"{self.book.book_id}:{i}",
+                "book_id": self.book.book_id,
+                "title": self.book.title,
+            })
+            yield doc
+
+    def _build_manifest(self) -> dict:
+        """Identifica o índice: qualquer mudança no corpus ou na ingestão invalida o cache em disco."""
+        manifest = {
+            "book_id": self.book.book_id,
+            "corpus_sha256": self.corpus.sha256(),
+            "splitter": settings.chunking_mode,
+            "chunk_size": settings.chunk_size,
+            "chunk_overlap": settings.chunk_overlap,
+            "embedding_model": settings.embedding_model,
+            "index": self.index_config.build_params(),
+        }
+        if self._offset_chunks:
+            # Sem sobreposição; o que define os limites é o padrão de título de capítulo
+            del manifest["chunk_overlap"]
+            manifest["chapter_pattern"] = settings.chapter_pattern
+        return manifest
+
+    def _read_manifest(self):
+        manifest_path = os.path.join(self.index_path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+        try:
+            with open(manifest_path, "r", encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    @property
+    def _id_prefix(self) -> str:
+        return f"{self.book.book_id}:"
+
+    def _load_pickled_index(self) -> FAISS:
+        # O índice foi gravado por este próprio processo de ingestão (pickle local confiável)
+        return FAISS.load_local(
+            self.index_path,
+            self.embeddings,
+            allow_dangerous_deserialization=True
+        )
+
+    def _write_mmap_files(self, vectorstore: FAISS):
+        """Arquivos para carga via mmap: chunk store compacto e, se pedido, vetores float16."""
+        ids = vectorstore.index_to_docstore_id
+        if any(ids[i] != f"{self._id_prefix}{i}" for i in range(len(ids))):
+            raise ValueError(f"Ids do shard '{self.book.book_id}' não seguem a posição no índice")
+        write_chunk_store(
+            self.index_path,
+            (vectorstore.docstore.search(ids[i]) for i in range(len(ids))),
+            offsets_only=self._offset_chunks
+        )
+        if settings.mmap_vectors_fp16 and not write_fp16_index(self.index_path, vectorstore.index):
+            print(f"⚠️ Vetores float16 só valem para índices flat; '{self.book.book_id}' usa {self.index_config.index_type}")
+
+    def _load_index(self):
+        if self._offset_chunks:
+            # Chunks por deslocamento: o texto vem do corpus mapeado, nunca de um pickle
+            vectorstore = load_mmap_vectorstore(
+                self.index_path,
+                self.embeddings,
+                prefix=self._id_prefix,
+                fp16=settings.mmap_index and settings.mmap_vectors_fp16,
+                corpus_path=self.book.storage_path,
+                mmap_vectors=settings.mmap_index
+            )
+        elif not settings.mmap_index:
+            vectorstore = self._load_pickled_index()
+        else:
+            fp16_missing = (
+                settings.mmap_vectors_fp16
+                and self.index_config.index_type == "flat"
+                and not os.path.exists(os.path.join(self.index_path, FP16_INDEX_FILE))
+            )
+            if not has_chunk_store(self.index_path) or fp16_missing:
+                # Shard gravado antes do modo mmap: deriva os arquivos uma única vez
+                self._write_mmap_files(self._load_pickled_index())
+            vectorstore = load_mmap_vectorstore(
+                self.index_path,
+                self.embeddings,
+                prefix=self._id_prefix,
+                fp16=settings.mmap_vectors_fp16
+            )
+        configure_search(vectorstore.index, self.index_config)
+        return vectorstore
+
+    def _new_vectorstore(self, train_vectors: np.ndarray) -> FAISS:
+        if self.index_config.needs_training:
+            print(f"🎯 Treinando índice {self.index_config.index_type} com {len(train_vectors)} vetores...")
+        index = build_index(self.index_config, train_vectors)
+        return FAISS(self.embeddings, index, InMemoryDocstore(), {})
+
+    def _add_batch(self, vectorstore: FAISS, batch: List[Document], vectors: np.ndarray):
+        text_embeddings = [(d.page_content, v.tolist()) for d, v in zip(batch, vectors)]
+        metadatas = [d.metadata for d in batch]
+        ids = [d.metadata["chunk_id"] for d in batch]
+        vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+
+    def _checkpoint_dir(self, manifest: dict) -> str:
+        # Checkpoints de outro manifesto (corpus/chunking diferentes) nunca são reaproveitados
+        manifest_id = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.index_path, CHECKPOINT_DIR, manifest_id)
+
+    def _load_lexical(self) -> BM25Index:
+        lexical = BM25Index.load(self.index_path, k1=settings.bm25_k1, b=settings.bm25_b)
+        if lexical is not None:
+            return lexical
+
+        # Índice léxico ausente ou de outra versão do analisador: refeito a partir do docstore, sem embeddings
+        print(f"🔤 Reconstruindo índice léxico de '{self.book.title}'...")
+        lexical = BM25Index(k1=settings.bm25_k1, b=settings.bm25_b)
+        for position in range(len(self.vectorstore.index_to_docstore_id)):
+            doc_id = self.vectorstore.index_to_docstore_id[position]
+            lexical.add(doc_id, self.vectorstore.docstore.search(doc_id).page_content)
+        lexical.save(self.index_path)
+        return lexical
+
+    def _finalize_profile(self, profile: CorpusProfile) -> CorpusProfile:
+        # O título do livro também conta como termo do corpus, como frase ("Dom Casmurro")
+        return profile.finalize(settings.guardrail_gazetteer_min_count, extra_terms=[self.book.title])
+
+    def _load_profile(self) -> CorpusProfile:
+        profile = CorpusProfile.load(self.index_path)
+        if profile is not None:
+            return profile
+
+        # Shard indexado antes do pré-filtro: perfil refeito do docstore e dos vetores gravados
+        print(f"🧭 Reconstruindo perfil do corpus de '{self.book.title}'...")
+        profile = CorpusProfile()
+        size = len(self.vectorstore.index_to_docstore_id)
+        for position in range(size):
+            profile.add_text(self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[position]).page_content)
+        try:
+            profile.add_vectors(self.vectorstore.index.reconstruct_n(0, size))
+        except RuntimeError:
+            # Índices IVF sem mapa direto não reconstroem vetores: fica só o gazetteer
+            pass
+        profile = self._finalize_profile(profile)
+        profile.save(self.index_path)
+        return profile
+
+    def _save_index(self, manifest: dict):
+        if self._offset_chunks:
+            write_index(self.index_path, self.vectorstore.index)
+        else:
+            self.vectorstore.save_local(self.index_path)
+        self._write_mmap_files(self.vectorstore)
+        self.lexical.save(self.index_path)
+        self.profile.save(self.index_path)
+        # O manifesto é gravado por último: um índice salvo pela metade nunca parece válido
+        manifest_path = os.path.join(self.index_path, MANIFEST_FILE)
+        with open(manifest_path, "w", encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+    def _build_index(self, ingestor: EmbeddingIngestor):
+        print(f"⚙️ Indexando vetores (FAISS) de '{self.book.title}'...")
+        vectorstore = None
+        self.lexical = BM25Index(k1=settings.bm25_k1, b=settings.bm25_b)
+        profile = CorpusProfile()
+        # Índices IVF/PQ precisam de treino antes do primeiro add: os lotes ficam
+        # retidos até juntar `train_size` vetores (índices flat/HNSW não esperam)
+        train_size = self.index_config.train_size if self.index_config.needs_training else 1
+        pending = []
+        pending_count = 0
+
+        # Os chunks fluem do arquivo para os lotes de embedding sem materializar o corpus
+        for batch, vectors in ingestor.embed_batches(self._iter_documents()):
+            for doc in batch:
+                self.lexical.add(doc.metadata["chunk_id"], doc.page_content)
+                profile.add_text(doc.page_content)
+            profile.add_vectors(vectors)
+
+            if vectorstore is not None:
+                self._add_batch(vectorstore, batch, vectors)
+                continue
+
+            pending.append((batch, vectors))
+            pending_count += len(batch)
+            if pending_count >= train_size:
+                vectorstore = self._new_vectorstore(np.vstack([v for _, v in pending]))
+                for pending_batch, pending_vectors in pending:
+                    self._add_batch(vectorstore, pending_batch, pending_vectors)
+                pending = []
+
+        if vectorstore is None and pending:
+            # Corpus menor que train_size: treina com tudo o que existe
+            vectorstore = self._new_vectorstore(np.vstack([v for _, v in pending]))
+            for pending_batch, pending_vectors in pending:
+                self._add_batch(vectorstore, pending_batch, pending_vectors)
+
+        if vectorstore is None:
+            raise ValueError(f"Corpus vazio: nenhum chunk gerado a partir de {self.book.storage_path}")
+        self.profile = self._finalize_profile(profile)
+        return vectorstore
+
+    def load_or_build(self, force_rebuild: bool = False, refresh_corpus: bool = False):
+        self.corpus.ensure(refresh=refresh_corpus)
+        manifest = self._build_manifest()
+        self.manifest = manifest
+
+        if not force_rebuild and self._read_manifest() == manifest:
+            try:
+                self.vectorstore = self._load_index()
+                self.lexical = self._load_lexical()
+                self.profile = self._load_profile()
+                print(f"📂 Índice FAISS carregado de {self.index_path}")
+                return
+            except Exception as e:
+                print(f"⚠️ Falha ao carregar índice salvo ({e}). Reconstruindo...")
+
+        ingestor = EmbeddingIngestor(
+            self.embeddings,
+            checkpoint_dir=self._checkpoint_dir(manifest),
+            batch_size=settings.ingest_batch_size,
+            max_concurrency=settings.ingest_max_concurrency,
+            max_retries=settings.ingest_max_retries,
+            backoff_seconds=settings.ingest_backoff_seconds
         )
-        docs = splitter.create_documents([text_content])
-        
-        print("⚙️ Indexando vetores (FAISS)...")
-        self.vectorstore = FAISS.from_documents(docs, self.embeddings)
+        self.vectorstore = self._build_index(ingestor)
+        self._save_index(manifest)
+        if self._offset_chunks:
+            # Descarta os textos acumulados no build: passa a servir do corpus mapeado
+            self.vectorstore = self._load_index()
+        ingestor.clear_checkpoints()
+        print(f"💾 Índice FAISS salvo em {self.index_path}")
+
+
+class VectorStoreRepository:
+    def __init__(
+        self,
+        force_rebuild: bool = False,
+        refresh_corpus: bool = False,
+        catalog: Optional[Catalog] = None,
+    ):
+        self.embeddings = LLMFactory.get_embeddings()
+        self.catalog = catalog or load_catalog()
+        self.shards: Dict[str, BookShard] = {}
+        # Compartilhados (por referência) com todos os retrievers: rebuild_shard os atualiza no lugar
+        self._vectorstores: Dict[str, Any] = {}
+        self._lexical: Dict[str, Any] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, settings.shard_search_workers))
+        self.query_embedding_cache = None
+        self.result_cache = None
+        if settings.query_cache_enabled:
+            self.query_embedding_cache = LRUCache(settings.query_cache_max_entries, settings.query_cache_ttl_seconds)
+            self.result_cache = LRUCache(settings.query_cache_max_entries, settings.query_cache_ttl_seconds)
+        self.query_batcher = None
+        if settings.query_batch_enabled:
+            self.query_batcher = QueryEmbeddingBatcher(
+                self.embeddings,
+                window_ms=settings.query_batch_window_ms,
+                max_batch=settings.query_batch_max_size
+            )
+        self._initialize_db(force_rebuild=force_rebuild, refresh_corpus=refresh_corpus)
+        self.answer_cache = None
+        if settings.answer_cache_enabled:
+            self.answer_cache = SemanticAnswerCache(
+                settings.answer_cache_path,
+                index_version=self.index_version(),
+                threshold=settings.answer_cache_threshold,
+                ttl_seconds=settings.answer_cache_ttl_seconds,
+                max_entries=settings.answer_cache_max_entries
+            )
+
+    def _initialize_db(self, force_rebuild: bool = False, refresh_corpus: bool = False):
+        for book in self.catalog.books:
+            shard = BookShard(book, self.embeddings, settings.faiss_index_path)
+            shard.load_or_build(force_rebuild=force_rebuild, refresh_corpus=refresh_corpus)
+            self._register(shard)
+
+    def _register(self, shard: BookShard):
+        book_id = shard.book.book_id
+        self.shards[book_id] = shard
+        self._vectorstores[book_id] = shard.vectorstore
+        self._lexical[book_id] = shard.lexical
+
+    def rebuild_shard(self, book_id: str, refresh_corpus: bool = False):
+        """Reconstrói apenas o shard de um livro; os demais continuam carregados."""
+        shard = BookShard(self.catalog.get(book_id), self.embeddings, settings.faiss_index_path)
+        shard.load_or_build(force_rebuild=True, refresh_corpus=refresh_corpus)
+        # Retrievers já entregues (ex.: o do grafo) passam a buscar no shard novo
+        self._register(shard)
+        # Ids de resultados antigos podem não existir mais no shard reconstruído
+        if self.result_cache is not None:
+            self.result_cache.clear()
+        if self.answer_cache is not None:
+            self.answer_cache.set_index_version(self.index_version())
 
-    def get_retriever(self, k: int = 3):
-        return self.vectorstore.as_retriever(search_kwargs={"k": k})
\ No newline at end of file
+    def corpus_profiles(self) -> List[CorpusProfile]:
+        """Perfis (gazetteer + centróide) dos shards carregados, para o pré-filtro do guardrail."""
+        return [shard.profile for shard in self.shards.values() if shard.profile is not None]
+
+    def index_version(self) -> str:
+        """Hash dos manifestos dos shards e do modelo de geração: muda quando as respostas podem mudar."""
+        manifests = {book_id: shard.manifest for book_id, shard in self.shards.items()}
+        payload = json.dumps({"shards": manifests, "model": settings.model_name}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def cache_stats(self) -> dict:
+        """Contadores dos caches (embedding de pergunta, ids de resultado e respostas) e dos lotes de pergunta."""
+        return {
+            "query_embeddings": self.query_embedding_cache.stats() if self.query_embedding_cache else None,
+            "query_batches": self.query_batcher.stats() if self.query_batcher else None,
+            "results": self.result_cache.stats() if self.result_cache else None,
+            "answers": self.answer_cache.stats() if self.answer_cache else None,
+        }
+
+    def get_retriever(
+        self,
+        k: int = 3,
+        book_ids: Optional[List[str]] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ):
+        selected = None
+        if book_ids or filter:
+            selected = [book.book_id for book in self.catalog.select(book_ids=book_ids, filter=filter)]
+        return ShardedRetriever(
+            shards=self._vectorstores,
+            lexical=self._lexical,
+            embeddings=self.embeddings,
+            k=k,
+            book_ids=selected,
+            executor=self._executor,
+            mode=settings.retrieval_mode,
+            fetch_k=max(k, settings.hybrid_fetch_k),
+            rrf_k=settings.rrf_k,
+            query_embedding_cache=self.query_embedding_cache,
+            result_cache=self.result_cache,
+            query_batcher=self.query_batcher
+        )
@@ -7,8 +7,11 @@ import uuid
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+from src.config import settings
+from src.infrastructure.guardrail_prefilter import build_guardrail_prefilter
 from src.infrastructure.vector_store import VectorStoreRepository
 from src.use_cases.graph import RAGGraphBuilder
+from src.use_cases.streaming import stream_answer
 from src.utils.logging import LoggingManager, get_logger  # ← ADICIONE ESTA LINHA
 
 
@@ -23,6 +26,8 @@ Exemplos de uso:
   uv run python -m src.main --debug            # DEBUG (muito detalhado)
   uv run python -m src.main --warning          # WARNING (apenas avisos+)
   uv run python -m src.main --debug --audit    # DEBUG com auditoria JSON
+  uv run python -m src.main --stream           # Resposta transmitida token a token
+  uv run python -m src.main --session <ID>     # Continua uma conversa anterior
         """
     )
     
@@ -56,6 +61,20 @@ Exemplos de uso:
         help="Ativar logging estruturado para auditoria (JSON)"
     )
     
+    # Retomar conversa (com o checkpointer "sqlite", sobrevive a reinícios)
+    parser.add_argument(
+        "--session",
+        default=None,
+        help="ID de uma sessão anterior para continuar a conversa"
+    )
+    
+    # Streaming da resposta
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Exibir a resposta token a token (provisória até a validação)"
+    )
+    
     return parser.parse_args()
 
 
@@ -73,6 +92,29 @@ def determine_log_level(args) -> str:
         return "INFO"  # Padrão
 
 
+def run_streaming(app, inputs: dict, config: dict) -> dict:
+    """Imprime a resposta à medida que é gerada e devolve o estado final do grafo."""
+    final_state = {}
+    streaming = False
+    for event in stream_answer(app, inputs, config):
+        if event.kind == "token":
+            if not streaming:
+                print("\n🤖 Resposta (provisória): ", end="", flush=True)
+                streaming = True
+            print(event.text, end="", flush=True)
+        elif event.kind == "retract":
+            print(f"\n↩️  {event.text}")
+            streaming = False
+        elif event.kind == "validated":
+            print("\n✅ Resposta validada" if event.validated else "\n⚠️ Resposta não validada")
+        elif event.kind == "done":
+            final_state = event.state or {}
+    if not streaming:
+        # Nada foi transmitido (ex: pergunta rejeitada pelo guardrail)
+        print(f"\n🤖 Resposta: {final_state.get('generation')}")
+    return final_state
+
+
 def main():
     """Função principal com suporte a logging estruturado."""
     # Processar argumentos
@@ -88,13 +130,14 @@ def main():
     logger.info(f"Inicializando Assistente Literário (Corrective RAG)")
     logger.info(f"Nível de logging: {log_level}")
     logger.info(f"Auditoria estruturada: {'ATIVA' if args.audit else 'INATIVA'}")
+    logger.info(f"Streaming: {'ATIVO' if args.stream else 'INATIVO'}")
     logger.info(f"{'='*60}")
     
     # 1. Setup da Infraestrutura
     try:
         logger.debug("Inicializando Vector Store...")
         repo = VectorStoreRepository()
-        retriever = repo.get_retriever()
+        retriever = repo.get_retriever(k=settings.retriever_k)
         logger.info("✅ Vector Store inicializado com sucesso")
     except Exception as e:
         logger.error(f"Erro ao inicializar banco de dados: {e}", exc_info=True)
@@ -104,7 +147,12 @@ def main():
     # 2. Construção do Grafo
     try:
         logger.debug("Construindo grafo RAG...")
-        graph_builder = RAGGraphBuilder(retriever)
+        graph_builder = RAGGraphBuilder(
+            retriever,
+            corpus_description=repo.catalog.describe(),
+            answer_cache=repo.answer_cache,
+            guardrail_prefilter=build_guardrail_prefilter(repo.corpus_profiles(), retriever.embed_query)
+        )
         app = graph_builder.build()
         logger.info("✅ Grafo RAG construído com sucesso")
     except Exception as e:
@@ -115,24 +163,23 @@ def main():
     logger.info("="*50)
 
     # Criar um ID para esta sessão de conversa
-    thread_id = str(uuid.uuid4())
+    thread_id = args.session or str(uuid.uuid4())
     config = {"configurable": {"thread_id": thread_id}}
     logger.info(f"Sessão iniciada ID: {thread_id}")
 
     # 3. Loop de Interação (CLI)
     query_count = 0
 
-    # Variável local para manter o histórico na memória da CLI
-    # (O LangGraph guarda internamente, mas precisamos reinjetar para o prompt formatado)
-    # CORRIGIDO: Implementado limite máximo de histórico para evitar crescimento infinito
-    local_history = []
-    MAX_HISTORY = 10  # Manter apenas as últimas 5 rodadas (10 mensagens alternando)
-
     while True:
         try:
             user_input = input("\n🗣️  Sua pergunta: ").strip()
             
             if user_input.lower() in ['sair', 'exit', 'quit']:
+                logger.debug(f"Caches: {repo.cache_stats()}")
+                if hasattr(graph_builder.checkpointer, "stats"):
+                    logger.debug(f"Checkpoints: {graph_builder.checkpointer.stats()}")
+                if graph_builder.nodes.guardrail_prefilter is not None:
+                    logger.debug(f"Pré-filtro do guardrail: {graph_builder.nodes.guardrail_prefilter.stats()}")
                 logger.info("👋 Até logo!")
                 break
             
@@ -143,36 +190,36 @@ def main():
             logger.info(f"[QUERY #{query_count}] \nPergunta: {user_input}")
             print("-" * 30)
             
-            # Executar grafo
+            # Executar grafo (o histórico da conversa vem do checkpoint da sessão)
             inputs = {
                 "question": user_input, 
-                "loop_count": 0,
-                "chat_history": local_history 
+                "loop_count": 0
             }
             
-            final_state = app.invoke(inputs, config=config)            
-            
-            response = final_state['generation']
+            if args.stream:
+                final_state = run_streaming(app, inputs, config)
+            else:
+                final_state = app.invoke(inputs, config=config)
             
-            # CORRIGIDO: Recuperar histórico atualizado do estado do grafo
-            # (O nó generate() agora retorna o histórico atualizado)
-            local_history = final_state.get('chat_history', [])
-            
-            # CORRIGIDO: Implementar limite de histórico para evitar crescimento infinito
-            if len(local_history) > MAX_HISTORY:
-                local_history = local_history[-MAX_HISTORY:]
-                logger.debug(f"Histórico truncado a {MAX_HISTORY} mensagens")
-
             # Log da resposta com estrutura
+            grade_stats = final_state.get('grade_stats') or {}
             logger.info(
                 f"[QUERY #{query_count}] Resposta gerada",
                 extra={
                     "docs_count": len(final_state.get('documents', [])),
-                    "iterations": final_state.get('loop_count', 0)
+                    "iterations": final_state.get('loop_count', 0),
+                    "grader_calls": grade_stats.get('llm_calls', 0),
+                    "grades_reused": grade_stats.get('reused', 0)
                 }
             )
+            if grade_stats.get('reused'):
+                logger.info(
+                    f"[QUERY #{query_count}] Grader: {grade_stats['reused']} veredito(s) reaproveitado(s) entre iterações, "
+                    f"{grade_stats.get('llm_calls', 0)} chamada(s) ao LLM"
+                )
             
-            print(f"\n🤖 Resposta: {final_state['generation']}")
+            if not args.stream:
+                print(f"\n🤖 Resposta: {final_state['generation']}")
             print("="*50)
 
         except KeyboardInterrupt:
@@ -182,6 +229,9 @@ def main():
         except Exception as e:
             logger.error(f"Erro durante execução: {e}", exc_info=True)
 
+    if hasattr(graph_builder.checkpointer, "close"):
+        graph_builder.checkpointer.close()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
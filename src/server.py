@@ -0,0 +1,310 @@
+"""
+Servidor HTTP (ASGI) do Machado Oráculo.
+
+O índice e o grafo assíncrono são carregados uma única vez, na inicialização,
+e compartilhados por todas as requisições; cada `session_id` é um `thread_id`
+do checkpointer. Não depende de framework web: qualquer servidor ASGI serve
+(`uvicorn src.server:app`, ou `python -m src.server` com o uvicorn instalado).
+
+Rotas:
+- GET  /health      processo no ar (liveness)
+- GET  /ready       índice e grafo carregados (readiness); 503 até lá
+- POST /ask         {"question": ..., "session_id": ...} -> resposta em JSON
+- POST /ask/stream  mesmo corpo; resposta em Server-Sent Events (StreamEvents)
+
+Requisições acima de `server_max_concurrency` esperam numa fila limitada a
+`server_max_queue` (depois disso, 503); cada pergunta tem até
+`server_request_timeout` segundos (504 ou evento "error" no stream).
+"""
+import asyncio
+import json
+import sys
+import uuid
+from contextlib import aclosing, asynccontextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+# Add the project root to sys.path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.config import settings
+from src.use_cases.cached_app import source_chunk_ids
+from src.use_cases.service import RAGService
+from src.utils.logging import LoggingManager, get_logger
+
+logger = get_logger()
+
+MAX_BODY_BYTES = 64 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def answer_payload(state: Dict[str, Any], session_id: str) -> Dict[str, Any]:
+    """Resposta da API a partir do estado final do grafo."""
+    return {
+        "session_id": session_id,
+        "answer": state.get("generation"),
+        "validated": bool(state.get("validated")),
+        "sources": source_chunk_ids(state.get("documents")),
+        "iterations": state.get("loop_count", 0),
+        "grader": state.get("grade_stats") or {},
+    }
+
+
+class RAGServer:
+    """
+    Aplicação ASGI sobre um RAGService.
+
+    `service_factory` é chamado uma vez (numa thread, para não travar o event
+    loop durante a carga do índice); em testes, basta passar um RAGService já
+    construído sobre um grafo com LLM e embeddings falsos.
+    """
+
+    def __init__(
+        self,
+        service_factory: Optional[Callable[[], RAGService]] = None,
+        service: Optional[RAGService] = None,
+        max_concurrency: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        request_timeout: Optional[float] = None,
+    ):
+        self.service_factory = service_factory or RAGService.from_settings
+        self.service = service
+        self.max_concurrency = max_concurrency or settings.server_max_concurrency
+        self.max_queue = settings.server_max_queue if max_queue is None else max_queue
+        self.request_timeout = request_timeout or settings.server_request_timeout
+        self.load_error: Optional[str] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._in_flight = 0
+        self._load_lock: Optional[asyncio.Lock] = None
+
+    # --- ciclo de vida -------------------------------------------------------
+
+    async def startup(self):
+        """Carrega índice e grafo (idempotente); falhas ficam visíveis em /ready."""
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._load_lock:
+            if self.service is not None:
+                return
+            try:
+                logger.info("Carregando índice e grafo RAG...")
+                self.service = await asyncio.to_thread(self.service_factory)
+                self.load_error = None
+                logger.info("✅ Servidor pronto")
+            except Exception as e:
+                self.load_error = str(e)
+                logger.error(f"Erro ao carregar o serviço RAG: {e}", exc_info=True)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self.startup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.service is not None:
+                    if self.service.stats() is not None:
+                        logger.info(f"Caches: {self.service.stats()}")
+                    self.service.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # --- ASGI ----------------------------------------------------------------
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        if self._semaphore is None:
+            # Servidor sem suporte a lifespan: carrega na primeira requisição
+            await self.startup()
+
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        try:
+            if path == "/health" and method == "GET":
+                await self._send_json(send, 200, {"status": "ok"})
+            elif path == "/ready" and method == "GET":
+                await self._ready(send)
+            elif path in ("/ask", "/ask/stream") and method == "POST":
+                body = await self._read_json(receive)
+                if path == "/ask":
+                    await self._ask(body, send)
+                else:
+                    await self._ask_stream(body, send)
+            elif path in ("/health", "/ready", "/ask", "/ask/stream"):
+                raise HTTPError(405, "Método não permitido")
+            else:
+                raise HTTPError(404, "Rota não encontrada")
+        except HTTPError as e:
+            await self._send_json(send, e.status, {"error": e.message})
+        except Exception as e:
+            logger.error(f"Erro ao atender {method} {path}: {e}", exc_info=True)
+            await self._send_json(send, 500, {"error": "Erro interno"})
+
+    async def _ready(self, send):
+        if self.service is None:
+            await self._send_json(send, 503, {"status": "loading" if self.load_error is None else "error", "error": self.load_error})
+            return
+        await self._send_json(send, 200, {
+            "status": "ready",
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+        })
+
+    # --- perguntas -----------------------------------------------------------
+
+    def _parse_question(self, body: Dict[str, Any]):
+        if self.service is None:
+            raise HTTPError(503, "Serviço ainda não está pronto")
+        question = body.get("question")
+        if not isinstance(question, str) or not question.strip():
+            raise HTTPError(400, "Campo 'question' obrigatório")
+        question = question.strip()
+        if len(question) > settings.server_max_question_chars:
+            raise HTTPError(413, f"Pergunta acima de {settings.server_max_question_chars} caracteres")
+        session_id = body.get("session_id") or str(uuid.uuid4())
+        if not isinstance(session_id, str):
+            raise HTTPError(400, "Campo 'session_id' deve ser texto")
+        return question, session_id
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Vaga de execução; com a fila cheia, recusa em vez de acumular requisições."""
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            raise HTTPError(503, "Servidor ocupado, tente novamente")
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    async def _ask(self, body: Dict[str, Any], send):
+        question, session_id = self._parse_question(body)
+        try:
+            async with asyncio.timeout(self.request_timeout), self._slot():
+                state = await self.service.ask(question, session_id)
+        except TimeoutError:
+            logger.warning(f"Tempo esgotado ({self.request_timeout:.1f}s) na sessão {session_id}")
+            raise HTTPError(504, "Tempo limite excedido")
+        await self._send_json(send, 200, answer_payload(state, session_id))
+
+    async def _ask_stream(self, body: Dict[str, Any], send):
+        question, session_id = self._parse_question(body)
+        started = False
+        try:
+            async with asyncio.timeout(self.request_timeout), self._slot():
+                # aclosing: no timeout, o gerador é fechado na hora e libera a sessão
+                async with aclosing(self.service.astream(question, session_id)) as events:
+                    async for event in events:
+                        if not started:
+                            await self._start_sse(send)
+                            started = True
+                        if event.kind == "done":
+                            data = {"kind": "done", **answer_payload(event.state or {}, session_id),
+                                    "ttft_seconds": event.ttft_seconds, "elapsed_seconds": event.elapsed_seconds}
+                        else:
+                            data = event.model_dump(exclude={"state", "ttft_seconds", "elapsed_seconds"}, exclude_none=True)
+                        await self._send_sse(send, event.kind, data)
+        except TimeoutError:
+            logger.warning(f"Tempo esgotado ({self.request_timeout:.1f}s) na sessão {session_id}")
+            if not started:
+                raise HTTPError(504, "Tempo limite excedido")
+            await self._send_sse(send, "error", {"kind": "error", "error": "Tempo limite excedido"})
+        except Exception as e:
+            if not started:
+                raise
+            logger.error(f"Erro durante o stream da sessão {session_id}: {e}", exc_info=True)
+            await self._send_sse(send, "error", {"kind": "error", "error": "Erro interno"})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    # --- HTTP ----------------------------------------------------------------
+
+    @staticmethod
+    async def _read_json(receive) -> Dict[str, Any]:
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise HTTPError(400, "Conexão encerrada pelo cliente")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise HTTPError(413, "Corpo da requisição muito grande")
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        try:
+            body = json.loads(b"".join(chunks) or b"{}")
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise HTTPError(400, "JSON inválido")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "O corpo deve ser um objeto JSON")
+        return body
+
+    @staticmethod
+    async def _send_json(send, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _start_sse(send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+            ],
+        })
+
+    @staticmethod
+    async def _send_sse(send, event: str, data: Dict[str, Any]):
+        message = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        await send({"type": "http.response.body", "body": message.encode("utf-8"), "more_body": True})
+
+
+def create_app(**kwargs) -> RAGServer:
+    """Aplicação ASGI; ver RAGServer para os parâmetros (todos opcionais)."""
+    return RAGServer(**kwargs)
+
+
+app = create_app()
+
+
+def main():
+    LoggingManager.setup(log_level="INFO")
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ uvicorn não encontrado. Instale-o (uv add uvicorn) ou use outro servidor ASGI com src.server:app")
+        sys.exit(1)
+    uvicorn.run(app, host=settings.server_host, port=settings.server_port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Grafo RAG compilado com o cache semântico de respostas na frente."""
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from src.config import settings
+from src.infrastructure.answer_cache import SemanticAnswerCache
+from src.use_cases.streaming import StreamEvent, astream_graph, stream_graph
+from src.utils.logging import get_logger
+
+logger = get_logger()
+
+
+def source_chunk_ids(documents) -> List[str]:
+    """Ids dos chunks usados na resposta (chunks fundidos contam cada parte)."""
+    chunk_ids = []
+    for doc in documents or []:
+        chunk_ids.extend(doc.metadata.get("merged_chunk_ids") or [doc.metadata.get("chunk_id")])
+    return [chunk_id for chunk_id in chunk_ids if chunk_id]
+
+
+class CachedRAGApp:
+    """
+    Consulta o cache antes de executar o grafo e guarda só respostas validadas.
+
+    Um acerto devolve a resposta e os chunks de origem sem nenhuma chamada ao
+    LLM (guardrails, grader, geração e validação) e é gravado no checkpoint da
+    sessão como um turno normal. O cache só é consultado e gravado em turnos
+    sem histórico: com histórico, a resposta pode depender da conversa.
+    Demais atributos (stream, get_state, ...) são delegados ao grafo compilado.
+    Com o grafo assíncrono, use `ainvoke`/`astream_answer`: o embedding e a
+    consulta ao cache (SQLite e numpy) rodam numa thread, fora do event loop.
+    """
+
+    def __init__(self, graph, cache: SemanticAnswerCache, retriever):
+        self.graph = graph
+        self.cache = cache
+        self.retriever = retriever
+
+    def __getattr__(self, name: str):
+        return getattr(self.graph, name)
+
+    def _history(self, inputs: Dict[str, Any], config: Optional[dict]) -> list:
+        """Histórico do turno: o dos inputs, se vier, ou o do checkpoint da sessão."""
+        if inputs.get("chat_history") is not None:
+            return list(inputs["chat_history"])
+        if not config:
+            return []
+        return list(self.graph.get_state(config).values.get("chat_history") or [])
+
+    def _lookup(self, question: str, history: list, embedding, config: Optional[dict]) -> Optional[Dict[str, Any]]:
+        """Estado final equivalente ao do grafo, se houver resposta em cache."""
+        if history:
+            # Mesma regra da gravação: com histórico, a pergunta pode depender da conversa
+            return None
+        hit = self.cache.lookup(embedding)
+        if hit is None:
+            return None
+        answer, chunk_ids, similarity = hit
+        logger.info(f"💾 Resposta reaproveitada do cache semântico (similaridade {similarity:.3f})")
+        state = {
+            "question": question,
+            "original_question": question,
+            "generation": answer,
+            "documents": self.retriever.get_by_ids(chunk_ids),
+            "loop_count": 0,
+            "hallucination": False,
+            "validated": True,
+            "chat_history": (history + [("Usuário", question), ("Assistente", answer)])[-settings.history_max_messages:],
+        }
+        if config:
+            # O turno entra no checkpoint como se o grafo tivesse terminado a validação
+            self.graph.update_state(config, state, as_node="validate_gen")
+        return state
+
+    def _maybe_store(self, question: str, history: list, embedding, final_state: Dict[str, Any]):
+        if final_state.get("validated") and final_state.get("generation") and not history:
+            self.cache.store(question, embedding, final_state["generation"], source_chunk_ids(final_state.get("documents")))
+
+    def invoke(self, inputs: Dict[str, Any], config: Optional[dict] = None, **kwargs) -> Dict[str, Any]:
+        question = inputs["question"]
+        history = self._history(inputs, config)
+        # O mesmo embedding é reaproveitado pelo retrieve (cache de embeddings de pergunta)
+        embedding = self.retriever.embed_query(question)
+
+        cached = self._lookup(question, history, embedding, config)
+        if cached is not None:
+            return cached
+
+        final_state = self.graph.invoke(inputs, config=config, **kwargs)
+        self._maybe_store(question, history, embedding, final_state)
+        return final_state
+
+    async def ainvoke(self, inputs: Dict[str, Any], config: Optional[dict] = None, **kwargs) -> Dict[str, Any]:
+        question = inputs["question"]
+        history = await asyncio.to_thread(self._history, inputs, config)
+        embedding = await asyncio.to_thread(self.retriever.embed_query, question)
+
+        cached = await asyncio.to_thread(self._lookup, question, history, embedding, config)
+        if cached is not None:
+            return cached
+
+        final_state = await self.graph.ainvoke(inputs, config=config, **kwargs)
+        await asyncio.to_thread(self._maybe_store, question, history, embedding, final_state)
+        return final_state
+
+    @staticmethod
+    def _cached_events(cached: Dict[str, Any], started: float) -> Iterator[StreamEvent]:
+        elapsed = time.perf_counter() - started
+        yield StreamEvent(kind="token", text=cached["generation"])
+        yield StreamEvent(kind="validated", validated=True)
+        yield StreamEvent(kind="done", state=cached, ttft_seconds=elapsed, elapsed_seconds=elapsed)
+
+    def stream_answer(self, inputs: Dict[str, Any], config: Optional[dict] = None) -> Iterator[StreamEvent]:
+        """Como `invoke`, mas em StreamEvents (ver src.use_cases.streaming)."""
+        started = time.perf_counter()
+        question = inputs["question"]
+        history = self._history(inputs, config)
+        embedding = self.retriever.embed_query(question)
+
+        cached = self._lookup(question, history, embedding, config)
+        if cached is not None:
+            yield from self._cached_events(cached, started)
+            return
+
+        for event in stream_graph(self.graph, inputs, config):
+            if event.kind == "done":
+                self._maybe_store(question, history, embedding, event.state)
+            yield event
+
+    async def astream_answer(self, inputs: Dict[str, Any], config: Optional[dict] = None) -> AsyncIterator[StreamEvent]:
+        """Versão assíncrona de `stream_answer`."""
+        started = time.perf_counter()
+        question = inputs["question"]
+        history = await asyncio.to_thread(self._history, inputs, config)
+        embedding = await asyncio.to_thread(self.retriever.embed_query, question)
+
+        cached = await asyncio.to_thread(self._lookup, question, history, embedding, config)
+        if cached is not None:
+            for event in self._cached_events(cached, started):
+                yield event
+            return
+
+        async for event in astream_graph(self.graph, inputs, config):
+            if event.kind == "done":
+                await asyncio.to_thread(self._maybe_store, question, history, embedding, event.state)
+            yield event
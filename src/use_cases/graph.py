@@ -1,11 +1,40 @@
+from typing import Optional
+
 from langgraph.graph import StateGraph, END
+from src.config import settings
 from src.domain.state import GraphState
+from src.infrastructure.answer_cache import SemanticAnswerCache
+from src.infrastructure.checkpointer import build_checkpointer
+from src.infrastructure.guardrail_prefilter import GuardrailPrefilter
+from src.infrastructure.postprocessing import ContextPostprocessor
+from src.infrastructure.reranker import Reranker
+from src.use_cases.cached_app import CachedRAGApp
 from src.use_cases.nodes import RAGNodes
-from langgraph.checkpoint.memory import MemorySaver  # <--- Importante para a Memória
 
 class RAGGraphBuilder:
-    def __init__(self, retriever):
-        self.nodes = RAGNodes(retriever)
+    def __init__(
+        self,
+        retriever,
+        corpus_description: Optional[str] = None,
+        reranker: Optional[Reranker] = None,
+        postprocessor: Optional[ContextPostprocessor] = None,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        guardrail_prefilter: Optional[GuardrailPrefilter] = None,
+        speculative: Optional[bool] = None,
+        checkpointer=None,
+    ):
+        self.answer_cache = answer_cache
+        # Memória das conversas (ver src.infrastructure.checkpointer); criado no primeiro build
+        self.checkpointer = checkpointer
+        # Guardrail e busca em paralelo (ver _speculative_retrieve)
+        self.speculative = settings.speculative_retrieval if speculative is None else speculative
+        self.nodes = RAGNodes(
+            retriever,
+            corpus_description=corpus_description,
+            reranker=reranker,
+            postprocessor=postprocessor,
+            guardrail_prefilter=guardrail_prefilter
+        )
 
 # NOVA Lógica Condicional para o Output Guardrail
     def _check_hallucination(self, state: GraphState):
@@ -33,10 +62,79 @@ class RAGGraphBuilder:
         return "retrieve" # Continua para a busca
 
     def _store_original_question(self, state: GraphState):
-        """Armazena a pergunta original no estado para referência durante reescrita."""
-        if "original_question" not in state:
-            return {"original_question": state["question"]}
-        return state
+        """
+        Início de cada turno: guarda a pergunta original (referência durante a
+        reescrita) e zera os campos do turno anterior que o checkpointer preserva.
+        """
+        update = {
+            "original_question": state["question"],
+            "documents": [],
+            "context": None,
+            "generation": None,
+            "hallucination": False,
+            "validated": False,
+            "approved_documents": [],
+            "grade_stats": {},
+        }
+        if settings.grade_cache_scope != "session":
+            update["grade_cache"] = {}
+        return update
+
+    def _retrieval_stages(self, async_mode: bool = False):
+        """Nós da busca até o grader: fusão/MMR e reranqueamento local são opcionais."""
+        nodes = self.nodes
+        stages = [("retrieve", nodes.aretrieve if async_mode else nodes.retrieve)]
+        if nodes.postprocessor is not None:
+            stages.append(("postprocess", nodes.apostprocess if async_mode else nodes.postprocess))
+        if nodes.reranker is not None:
+            stages.append(("rerank", nodes.arerank if async_mode else nodes.rerank))
+        return stages
+
+    def _speculative_guardrail(self, state: GraphState):
+        # Os dois ramos rodam no mesmo passo: cada um escreve só as próprias chaves
+        # ("question" é lida por ambos, mas não é reescrita por nenhum)
+        return {"generation": self.nodes.guardrails_check(state).get("generation")}
+
+    async def _aspeculative_guardrail(self, state: GraphState):
+        return {"generation": (await self.nodes.aguardrails_check(state)).get("generation")}
+
+    def _speculative_retrieve(self, state: GraphState):
+        """Busca (e, opcionalmente, avaliação) disparada junto com o guardrail."""
+        stages = [fn for _, fn in self._retrieval_stages()]
+        if settings.speculative_grading:
+            stages.append(self.nodes.grade_documents)
+        current = dict(state)
+        for stage in stages:
+            current.update(stage(current))
+        return self._speculative_update(current)
+
+    async def _aspeculative_retrieve(self, state: GraphState):
+        stages = [fn for _, fn in self._retrieval_stages(async_mode=True)]
+        if settings.speculative_grading:
+            stages.append(self.nodes.agrade_documents)
+        current = dict(state)
+        for stage in stages:
+            current.update(await stage(current))
+        return self._speculative_update(current)
+
+    @staticmethod
+    def _speculative_update(current: dict) -> dict:
+        # Só as chaves do ramo de busca (a avaliação especulativa também atualiza o cache de vereditos)
+        keys = ("documents", "approved_documents", "grade_cache", "grade_stats")
+        return {key: current[key] for key in keys if key in current}
+
+    def _join_speculation(self, state: GraphState):
+        if state.get("generation"):
+            # Pergunta rejeitada: o trabalho especulativo é descartado
+            return {"documents": []}
+        return {}
+
+    def _check_speculation_result(self, state: GraphState):
+        if state.get("generation"):
+            return "end"
+        if settings.speculative_grading:
+            return self._decide_next_step(state)
+        return "grade_documents"
 
     def _decide_next_step(self, state: GraphState):
         if not state["documents"]:
@@ -46,34 +144,64 @@ class RAGGraphBuilder:
             return "transform_query"
         return "generate"
 
-    def build(self):
-        
+    def build(self, async_mode: bool = False):
+        """
+        Compila o grafo. Com `async_mode`, os nós são corrotinas (ainvoke/abatch) e
+        o app deve ser executado com ainvoke/astream; o CLI usa a versão síncrona.
+        """
+        nodes = self.nodes
         workflow = StateGraph(GraphState)
 
         # Adiciona nós (Mantém os anteriores e adiciona o novo)
         workflow.add_node("store_question", self._store_original_question)
-        workflow.add_node("guardrails", self.nodes.guardrails_check)
-        workflow.add_node("retrieve", self.nodes.retrieve)
-        workflow.add_node("grade_documents", self.nodes.grade_documents)
-        workflow.add_node("generate", self.nodes.generate)
-        workflow.add_node("validate_gen", self.nodes.validate_generation) # <--- NOVO NÓ
-        workflow.add_node("transform_query", self.nodes.transform_query)
+        if self.speculative:
+            workflow.add_node("guardrails", self._aspeculative_guardrail if async_mode else self._speculative_guardrail)
+            workflow.add_node("speculative_retrieve", self._aspeculative_retrieve if async_mode else self._speculative_retrieve)
+            workflow.add_node("join_speculation", self._join_speculation)
+        else:
+            workflow.add_node("guardrails", nodes.aguardrails_check if async_mode else nodes.guardrails_check)
+        for name, fn in self._retrieval_stages(async_mode):
+            workflow.add_node(name, fn)
+        workflow.add_node("grade_documents", nodes.agrade_documents if async_mode else nodes.grade_documents)
+        workflow.add_node("generate", nodes.agenerate if async_mode else nodes.generate)
+        workflow.add_node("validate_gen", nodes.avalidate_generation if async_mode else nodes.validate_generation) # <--- NOVO NÓ
+        workflow.add_node("transform_query", nodes.atransform_query if async_mode else nodes.transform_query)
 
         # Fluxo
         workflow.set_entry_point("store_question")
         
         workflow.add_edge("store_question", "guardrails")
-        
-        workflow.add_conditional_edges(
-            "guardrails",
-            self._check_guardrail_result,
-            {
-                "end": END,
-                "retrieve": "retrieve"
-            }
-        )
 
-        workflow.add_edge("retrieve", "grade_documents")
+        if self.speculative:
+            # A busca não espera o guardrail: os dois ramos se juntam antes de seguir
+            workflow.add_edge("store_question", "speculative_retrieve")
+            workflow.add_edge(["guardrails", "speculative_retrieve"], "join_speculation")
+            workflow.add_conditional_edges(
+                "join_speculation",
+                self._check_speculation_result,
+                {
+                    "end": END,
+                    "grade_documents": "grade_documents",
+                    "transform_query": "transform_query",
+                    "generate": "generate"
+                }
+            )
+        else:
+            workflow.add_conditional_edges(
+                "guardrails",
+                self._check_guardrail_result,
+                {
+                    "end": END,
+                    "retrieve": "retrieve"
+                }
+            )
+
+        # Fusão de chunks vizinhos/MMR e reranqueamento local (CPU) reduzem
+        # quantos chunks (e quantos tokens) chegam ao grader e à geração.
+        # No modo especulativo, estes nós atendem as novas buscas após reescrita
+        stages = [name for name, _ in self._retrieval_stages()] + ["grade_documents"]
+        for source, target in zip(stages, stages[1:]):
+            workflow.add_edge(source, target)
         
         workflow.add_conditional_edges(
             "grade_documents",
@@ -98,5 +226,9 @@ class RAGGraphBuilder:
                 "end": END                            # Aceita ou desiste
             }
         )
-        memory = MemorySaver()
-        return workflow.compile(checkpointer=memory)
\ No newline at end of file
+        if self.checkpointer is None:
+            self.checkpointer = build_checkpointer()
+        app = workflow.compile(checkpointer=self.checkpointer)
+        if self.answer_cache is not None:
+            return CachedRAGApp(app, self.answer_cache, self.nodes.retriever)
+        return app
\ No newline at end of file
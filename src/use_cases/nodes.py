@@ -1,26 +1,70 @@
+import asyncio
+import time
+from typing import List, Optional, Tuple
+
 from pydantic import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+from src.config import settings
 from src.domain.state import GraphState
-from src.domain.guardrails_check import HallucinationGrade, InputGuardrail, RetrievalGrader
+from src.domain.guardrails_check import (
+    BatchRetrievalGrader,
+    HallucinationGrade,
+    InputGuardrail,
+    RetrievalGrader,
+)
+from src.infrastructure.context_packer import ContextPacker, build_context_packer, estimate_tokens
+from src.infrastructure.corpus import load_catalog
+from src.infrastructure.guardrail_prefilter import GuardrailPrefilter
 from src.infrastructure.llm_factory import LLMFactory
+from src.infrastructure.postprocessing import ContextPostprocessor, build_postprocessor
+from src.infrastructure.reranker import Reranker, build_reranker
 from src.utils.logging import get_logger
 
 logger = get_logger()
 
+
+def _structured(outcome):
+    """Saída de uma chain estruturada; erro se o modelo respondeu sem chamar a ferramenta."""
+    if outcome is None:
+        raise ValueError("o modelo não retornou a saída estruturada")
+    return outcome
+
+
 class RAGNodes:
-    def __init__(self, retriever):
+    def __init__(
+        self,
+        retriever,
+        corpus_description: Optional[str] = None,
+        reranker: Optional[Reranker] = None,
+        postprocessor: Optional[ContextPostprocessor] = None,
+        guardrail_prefilter: Optional[GuardrailPrefilter] = None,
+        context_packer: Optional[ContextPacker] = None,
+    ):
         self.retriever = retriever
-        self.llm = LLMFactory.get_llm()
+        self.context_packer = context_packer or build_context_packer()
+        self.guardrail_prefilter = guardrail_prefilter
+        # Ex: "o livro 'Dom Casmurro' de Machado de Assis" ou a lista de obras do catálogo
+        self.corpus_description = corpus_description or load_catalog().describe()
+        self.reranker = reranker or build_reranker(retriever)
+        self.postprocessor = postprocessor or build_postprocessor(retriever)
+        # Uma instância por chain: cada uma tem sua própria flag de memoização
+        self._llms = {}
         self.grader_chain = self._build_grader_chain()
+        self.batch_grader_chain = self._build_batch_grader_chain()
         self.rag_chain = self._build_rag_chain()
         self.rewriter_chain = self._build_rewriter_chain()
         self.guardrail_chain = self._build_guardrail_chain()
         self.hallucination_chain = self._build_hallucination_chain()
 
+    def _llm(self, chain: str):
+        if chain not in self._llms:
+            self._llms[chain] = LLMFactory.get_llm(chain=chain)
+        return self._llms[chain]
+
     def _build_hallucination_chain(self):
-        llm_structured = self.llm.with_structured_output(HallucinationGrade, method="function_calling")
+        llm_structured = self._llm("hallucination").with_structured_output(HallucinationGrade, method="function_calling")
         
         # MUDANÇA: Adicionamos instruções para ignorar estilo e focar em fatos
         prompt = ChatPromptTemplate.from_messages([
@@ -42,7 +86,7 @@ class RAGNodes:
         return prompt | llm_structured
 
     def _build_grader_chain(self):
-        llm_structured = self.llm.with_structured_output(RetrievalGrader, method="function_calling")
+        llm_structured = self._llm("grader").with_structured_output(RetrievalGrader, method="function_calling")
         prompt = ChatPromptTemplate.from_messages([
             ("system", """Você é um especialista em avaliar relevância de documentos. 
             Sua tarefa é determinar se um documento recuperado responde ou é relevante para a pergunta do usuário.
@@ -57,11 +101,29 @@ class RAGNodes:
         ])
         return prompt | llm_structured
 
+    def _build_batch_grader_chain(self):
+        llm_structured = self._llm("grader").with_structured_output(BatchRetrievalGrader, method="function_calling")
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", """Você é um especialista em avaliar relevância de documentos.
+            Você receberá uma pergunta e vários documentos numerados ([1], [2], ...).
+            Para CADA documento, determine se ele responde ou é relevante para a pergunta do usuário.
+
+            Critérios de relevância:
+            - O documento contém informações sobre o tópico?
+            - O documento pode ajudar a responder a pergunta?
+            - Existe qualquer conexão temática?
+
+            Responda 'sim' se houver qualquer relevância, 'nao' apenas se for completamente irrelevante.
+            Retorne exatamente um veredito por documento, com o número do documento em `index`."""),
+            ("human", "Pergunta: {question}\n\nDocumentos recuperados:\n{documents}")
+        ])
+        return prompt | llm_structured
+
     def _build_rag_chain(self):
         # MUDANÇA: Prompt mais rigoroso para evitar conversa fiada e conhecimento externo
         # CORRIGIDO: Adicionado {chat_history} ao template para usar o histórico de conversa
         prompt = PromptTemplate(
-            template="""Você é um assistente que responde perguntas sobre o livro 'Dom Casmurro' baseando-se EXCLUSIVAMENTE no contexto fornecido abaixo.
+            template="""Você é um assistente que responde perguntas sobre {corpus} baseando-se EXCLUSIVAMENTE no contexto fornecido abaixo.
             
             Regras:
             1. Use APENAS as informações do Contexto abaixo. Não use seu conhecimento prévio.
@@ -79,14 +141,17 @@ class RAGNodes:
             {question}
             
             Resposta:""",
-            input_variables=["context", "question", "chat_history"]
+            input_variables=["context", "question", "chat_history"],
+            partial_variables={"corpus": self.corpus_description}
         )
-        return prompt | self.llm | StrOutputParser()
+        # Tokens das instruções (sem contexto, histórico e pergunta), para o orçamento do packer
+        self._rag_prompt_tokens = estimate_tokens(prompt.format(context="", question="", chat_history=""))
+        return prompt | self._llm("generation") | StrOutputParser()
 
     def _build_rewriter_chain(self):
         prompt = ChatPromptTemplate.from_messages([
-            ("system", """Você é um especialista em reformular perguntas sobre "Dom Casmurro" de Machado de Assis.
-                Sua tarefa é reescrever a pergunta do usuário mantendo seu significado ORIGINAL, mas usando terminologia e contexto do livro.
+            ("system", """Você é um especialista em reformular perguntas sobre {corpus}.
+                Sua tarefa é reescrever a pergunta do usuário mantendo seu significado ORIGINAL, mas usando terminologia e contexto da obra.
 
                 Dicas:
                 - Mantenha o sentido original da pergunta
@@ -96,16 +161,16 @@ class RAGNodes:
 
                 Pergunta original: {original_question}
 
-                Reescreva de forma mais clara e específica para busca sobre o livro:"""),
+                Reescreva de forma mais clara e específica para busca sobre a obra:"""),
             ("human", "{question}")
-        ])
-        return prompt | self.llm | StrOutputParser()
+        ]).partial(corpus=self.corpus_description)
+        return prompt | self._llm("rewriter") | StrOutputParser()
 
     def _build_guardrail_chain(self):
-        llm_structured = self.llm.with_structured_output(InputGuardrail, method="function_calling")
+        llm_structured = self._llm("guardrail").with_structured_output(InputGuardrail, method="function_calling")
         
         prompt = ChatPromptTemplate.from_messages([
-            ("system", """Você é um guardião de conhecimento sobre o livro 'Dom Casmurro' de Machado de Assis.
+            ("system", """Você é um guardião de conhecimento sobre {corpus}.
             Sua função é filtrar perguntas que contenham premissas falsas, erros factuais graves ou que sejam sobre outros livros/assuntos.
             
             Exemplos de REJEIÇÃO:
@@ -128,35 +193,54 @@ class RAGNodes:
             
             """),
             ("human", "Pergunta: {question}")
-        ])
+        ]).partial(corpus=self.corpus_description)
         return prompt | llm_structured
 
+    def _hallucination_inputs(self, state: GraphState) -> dict:
+        # Mesmo contexto empacotado da geração: a resposta é julgada pelo que o modelo viu
+        context = state.get("context")
+        if context is None:
+            context = self.context_packer.pack_documents(state["documents"], self.context_packer.token_budget)[0]
+        generation = state["generation"]
+        logger.info(
+            f"Tokens estimados (hallucination): contexto {estimate_tokens(context)}, "
+            f"resposta {estimate_tokens(generation)}"
+        )
+        return {
+            "documents": context,
+            "generation": generation
+        }
+
+    def _hallucination_result(self, state: GraphState, score=None, error: Optional[Exception] = None):
+        generation = state["generation"]
+        if error is not None:
+            logger.error(f"Erro na validação de alucinação: {error}")
+            # A resposta segue para o usuário, mas sem validação não entra no cache
+            return {"generation": generation, "hallucination": False, "validated": False}
+
+        is_grounded = score.binary_score.lower() == "sim"
+        if is_grounded:
+            logger.info("✅ Resposta validada: Fiel ao contexto.")
+            return {"generation": generation, "hallucination": False, "validated": True}
+        else:
+            logger.warning(f"⚠️ Alucinação detectada: {score.reason}")
+            return {"generation": generation, "hallucination": True, "validated": False}
+
     def validate_generation(self, state: GraphState):
         logger.debug("🔍 Verificando alucinações (Output Guardrail)...")
-        question = state["question"]
-        documents = state["documents"]
-        generation = state["generation"]
+        try:
+            score = _structured(self.hallucination_chain.invoke(self._hallucination_inputs(state)))
+        except Exception as e:
+            return self._hallucination_result(state, error=e)
+        return self._hallucination_result(state, score)
 
+    async def avalidate_generation(self, state: GraphState):
+        logger.debug("🔍 Verificando alucinações (Output Guardrail)...")
         try:
-            context_text = "\n\n".join([d.page_content for d in documents])
-            
-            score = self.hallucination_chain.invoke({
-                "documents": context_text,
-                "generation": generation
-            })
-            
-            is_grounded = score.binary_score.lower() == "sim"
-            
-            if is_grounded:
-                logger.info("✅ Resposta validada: Fiel ao contexto.")
-                return {"generation": generation, "hallucination": False}
-            else:
-                logger.warning(f"⚠️ Alucinação detectada: {score.reason}")
-                return {"generation": generation, "hallucination": True}
-                
+            score = _structured(await self.hallucination_chain.ainvoke(self._hallucination_inputs(state)))
         except Exception as e:
-            logger.error(f"Erro na validação de alucinação: {e}")
-            return {"generation": generation, "hallucination": False}
+            return self._hallucination_result(state, error=e)
+        return self._hallucination_result(state, score)
   
     def retrieve(self, state: GraphState):
         logger.debug(f"Buscando documentos para: {state['question'][:500]}...")
@@ -164,89 +248,364 @@ class RAGNodes:
         logger.info(f"Recuperados {len(documents)} documentos")
         return {"documents": documents, "question": state["question"]}
 
-    def grade_documents(self, state: GraphState):
-        logger.debug("Avaliando relevância dos documentos...")
+    async def aretrieve(self, state: GraphState):
+        logger.debug(f"Buscando documentos para: {state['question'][:500]}...")
+        documents = await self.retriever.ainvoke(state["question"])
+        logger.info(f"Recuperados {len(documents)} documentos")
+        return {"documents": documents, "question": state["question"]}
+
+    def postprocess(self, state: GraphState):
+        documents = state["documents"]
+        try:
+            processed = self.postprocessor.process(state["question"], documents)
+        except Exception as e:
+            logger.warning(f"Erro no pós-processamento da busca: {e}")
+            return {"documents": documents}
+
+        before = sum(len(d.page_content) for d in documents)
+        after = sum(len(d.page_content) for d in processed)
+        logger.info(f"Pós-processamento: {len(documents)} -> {len(processed)} chunks ({before} -> {after} caracteres)")
+        return {"documents": processed}
+
+    async def apostprocess(self, state: GraphState):
+        # Trabalho de CPU (e, no MMR, o embedding da pergunta): fora do event loop
+        return await asyncio.to_thread(self.postprocess, state)
+
+    def rerank(self, state: GraphState):
+        documents = state["documents"]
+        try:
+            ranked = self.reranker.rerank(
+                state["question"],
+                documents,
+                top_n=settings.rerank_top_n,
+                threshold=settings.rerank_threshold
+            )
+        except Exception as e:
+            # Sem reranqueamento o grader ainda funciona, só fica mais caro
+            logger.warning(f"Erro no reranqueamento local: {e}")
+            return {"documents": documents[:settings.rerank_top_n]}
+
+        logger.debug(f"Scores do reranker: {[round(score, 3) for _, score in ranked]}")
+        logger.info(f"Reranqueamento local: {len(ranked)}/{len(documents)} documentos seguem para o grader")
+        return {"documents": [doc for doc, _ in ranked]}
+
+    async def arerank(self, state: GraphState):
+        return await asyncio.to_thread(self.rerank, state)
+
+    @staticmethod
+    def _grader_inputs(question: str, documents) -> List[dict]:
+        return [{"question": question, "document": doc.page_content} for doc in documents]
+
+    @staticmethod
+    def _verdicts_from_scores(scores) -> List[Optional[bool]]:
+        verdicts = []
+        for i, score in enumerate(scores):
+            if isinstance(score, RetrievalGrader):
+                verdicts.append(score.binary_score.lower() == "sim")
+            else:
+                # Exceção da API ou resposta sem chamada da ferramenta (None)
+                logger.warning(f"Erro ao avaliar documento {i+1}: {score or 'sem saída estruturada'}")
+                verdicts.append(None)
+        return verdicts
+
+    def _grade_each(self, question: str, documents) -> List[Optional[bool]]:
+        """Uma chamada ao grader por documento; None onde a avaliação falhou."""
+        # As chamadas são independentes: rodam em paralelo (até o limite configurado),
+        # e o erro de um documento não derruba a avaliação dos outros
+        scores = self.grader_chain.batch(
+            self._grader_inputs(question, documents),
+            config={"max_concurrency": settings.grading_max_concurrency},
+            return_exceptions=True
+        )
+        return self._verdicts_from_scores(scores)
+
+    async def _agrade_each(self, question: str, documents) -> List[Optional[bool]]:
+        scores = await self.grader_chain.abatch(
+            self._grader_inputs(question, documents),
+            config={"max_concurrency": settings.grading_max_concurrency},
+            return_exceptions=True
+        )
+        return self._verdicts_from_scores(scores)
+
+    @staticmethod
+    def _batch_grader_inputs(question: str, documents) -> dict:
+        numbered = "\n\n".join(f"[{i}] {doc.page_content}" for i, doc in enumerate(documents, start=1))
+        return {"question": question, "documents": numbered}
+
+    @staticmethod
+    def _verdicts_from_batch(outcome, size: int) -> List[Optional[bool]]:
+        verdicts: List[Optional[bool]] = [None] * size
+        if outcome is None or len(outcome.verdicts) != size:
+            # Sem saída estruturada ou com vereditos faltando/sobrando: nada da resposta é confiável
+            found = "sem saída estruturada" if outcome is None else f"{len(outcome.verdicts)} vereditos"
+            logger.warning(f"Avaliação em lote inválida ({found} para {size} documentos)")
+            return verdicts
+        for verdict in outcome.verdicts:
+            if 1 <= verdict.index <= size:
+                verdicts[verdict.index - 1] = verdict.binary_score.lower() == "sim"
+        return verdicts
+
+    def _grade_batch(self, question: str, documents) -> List[Optional[bool]]:
+        """Todos os documentos numa única chamada; None onde não veio veredito válido."""
+        try:
+            outcome = self.batch_grader_chain.invoke(self._batch_grader_inputs(question, documents))
+        except Exception as e:
+            logger.warning(f"Erro na avaliação em lote: {e}")
+            return [None] * len(documents)
+        return self._verdicts_from_batch(outcome, len(documents))
+
+    async def _agrade_batch(self, question: str, documents) -> List[Optional[bool]]:
+        try:
+            outcome = await self.batch_grader_chain.ainvoke(self._batch_grader_inputs(question, documents))
+        except Exception as e:
+            logger.warning(f"Erro na avaliação em lote: {e}")
+            return [None] * len(documents)
+        return self._verdicts_from_batch(outcome, len(documents))
+
+    @staticmethod
+    def _use_batch_grading(documents) -> bool:
+        return settings.grading_mode == "batch" and len(documents) > 1
+
+    @staticmethod
+    def _missing_verdicts(verdicts) -> List[int]:
+        missing = [i for i, verdict in enumerate(verdicts) if verdict is None]
+        if missing:
+            # Resposta em lote incompleta ou inválida: reavalia só os que faltaram
+            logger.warning(f"Avaliação em lote sem veredito para {len(missing)} documento(s); avaliando um a um")
+        return missing
+
+    @staticmethod
+    def _grade_key(original_question: str, doc) -> Optional[str]:
+        chunk_id = doc.metadata.get("chunk_id")
+        return f"{original_question}\x00{chunk_id}" if chunk_id else None
+
+    def _grade_plan(self, state: GraphState):
+        """Vereditos já conhecidos (mesma pergunta original e chunk) e índices a avaliar."""
+        original_question = state.get("original_question") or state["question"]
+        cache = dict(state.get("grade_cache") or {}) if settings.grade_cache_scope != "off" else {}
+        verdicts: List[Optional[bool]] = []
+        pending = []
+        for i, doc in enumerate(state["documents"]):
+            key = self._grade_key(original_question, doc)
+            if key is not None and key in cache:
+                verdicts.append(cache[key])
+            else:
+                verdicts.append(None)
+                pending.append(i)
+        return original_question, cache, verdicts, pending
+
+    def _graded_result(self, state: GraphState, plan, computed: List[Optional[bool]], llm_calls: int, started: float):
         question = state["question"]
         documents = state["documents"]
-        
+        original_question, cache, verdicts, pending = plan
+        for i, verdict in zip(pending, computed):
+            verdicts[i] = verdict
+            key = self._grade_key(original_question, documents[i])
+            if key is not None and verdict is not None and settings.grade_cache_scope != "off":
+                cache[key] = verdict
+        if settings.grade_cache_scope == "session" and len(cache) > settings.grade_cache_max_entries:
+            # Dicionário em ordem de inserção: descarta os vereditos mais antigos
+            cache = dict(list(cache.items())[-settings.grade_cache_max_entries:])
+
         relevant_docs = []
-        for i, doc in enumerate(documents):
-            logger.debug(f"Avaliando documento {i+1}/{len(documents)}")
-            try:
-                score = self.grader_chain.invoke({
-                    "question": question, 
-                    "document": doc.page_content
-                })
-                is_relevant = score.binary_score.lower() == "sim"
-                logger.debug(f"Documento {i+1}: {'RELEVANTE' if is_relevant else 'NÃO RELEVANTE'}")
-                
-                if is_relevant:
-                    relevant_docs.append(doc)
-            except Exception as e:
-                logger.warning(f"Erro ao avaliar documento {i+1}: {e}")
-        
-        logger.info(f"Documentos relevantes: {len(relevant_docs)}/{len(documents)}")
-        return {"documents": relevant_docs, "question": question}
+        for i, (doc, is_relevant) in enumerate(zip(documents, verdicts)):
+            if is_relevant is None:
+                continue
+            logger.debug(f"Documento {i+1}: {'RELEVANTE' if is_relevant else 'NÃO RELEVANTE'}{' (cache)' if i not in pending else ''}")
+            if is_relevant:
+                relevant_docs.append(doc)
 
-    def generate(self, state: GraphState):
-        logger.debug("Gerando resposta...")
-        context_text = "\n\n".join([d.page_content for d in state["documents"]])
+        # Chunks aprovados em iterações anteriores continuam valendo para a mesma pergunta original
+        seen = {doc.metadata.get("chunk_id") for doc in relevant_docs}
+        approved = relevant_docs + [
+            doc for doc in state.get("approved_documents") or []
+            if doc.metadata.get("chunk_id") not in seen
+        ]
 
-        # Recupera o histórico do estado, ou lista vazia se não existir
-        history = state.get("chat_history", [])
+        reused = len(documents) - len(pending)
+        stats = dict(state.get("grade_stats") or {})
+        stats["graded"] = stats.get("graded", 0) + len(pending)
+        stats["reused"] = stats.get("reused", 0) + reused
+        stats["llm_calls"] = stats.get("llm_calls", 0) + llm_calls
 
-        # Formata o histórico para string (simples)
-        history_str = "\n".join([f"{role}: {msg}" for role, msg in history]) if history else "(Nenhum histórico anterior)"
-        
-        generation = self.rag_chain.invoke({
-            "context": context_text, 
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Documentos relevantes: {len(relevant_docs)}/{len(documents)} (avaliados em {elapsed:.2f}s; "
+            f"{reused} veredito(s) reaproveitado(s)); contexto acumulado: {len(approved)} chunk(s)"
+        )
+        return {
+            "documents": approved,
+            "question": question,
+            "approved_documents": approved,
+            "grade_cache": cache,
+            "grade_stats": stats,
+        }
+
+    def _compute_verdicts(self, question: str, documents) -> Tuple[List[Optional[bool]], int]:
+        """Vereditos do grader LLM e quantas chamadas custaram."""
+        if not documents:
+            return [], 0
+        if self._use_batch_grading(documents):
+            verdicts = self._grade_batch(question, documents)
+            missing = self._missing_verdicts(verdicts)
+            if missing:
+                for i, verdict in zip(missing, self._grade_each(question, [documents[i] for i in missing])):
+                    verdicts[i] = verdict
+            return verdicts, 1 + len(missing)
+        return self._grade_each(question, documents), len(documents)
+
+    async def _acompute_verdicts(self, question: str, documents) -> Tuple[List[Optional[bool]], int]:
+        if not documents:
+            return [], 0
+        if self._use_batch_grading(documents):
+            verdicts = await self._agrade_batch(question, documents)
+            missing = self._missing_verdicts(verdicts)
+            if missing:
+                for i, verdict in zip(missing, await self._agrade_each(question, [documents[i] for i in missing])):
+                    verdicts[i] = verdict
+            return verdicts, 1 + len(missing)
+        return await self._agrade_each(question, documents), len(documents)
+
+    def grade_documents(self, state: GraphState):
+        logger.debug("Avaliando relevância dos documentos...")
+        started = time.perf_counter()
+        plan = self._grade_plan(state)
+        pending = [state["documents"][i] for i in plan[3]]
+        computed, llm_calls = self._compute_verdicts(state["question"], pending)
+        return self._graded_result(state, plan, computed, llm_calls, started)
+
+    async def agrade_documents(self, state: GraphState):
+        logger.debug("Avaliando relevância dos documentos...")
+        started = time.perf_counter()
+        plan = self._grade_plan(state)
+        pending = [state["documents"][i] for i in plan[3]]
+        computed, llm_calls = await self._acompute_verdicts(state["question"], pending)
+        return self._graded_result(state, plan, computed, llm_calls, started)
+
+    def _pack_generation(self, state: GraphState):
+        packed = self.context_packer.pack(
+            state["documents"],
+            state.get("chat_history", []),
+            fixed_tokens=self._rag_prompt_tokens + estimate_tokens(state["question"])
+        )
+        logger.info(
+            f"Tokens estimados (generation): contexto {packed.context_tokens} "
+            f"({packed.documents_used}/{packed.documents_total} chunks, {packed.documents_trimmed} cortado(s)), "
+            f"histórico {packed.history_tokens}, instruções+pergunta {packed.fixed_tokens}, "
+            f"total {packed.input_tokens} (orçamento {self.context_packer.token_budget - self.context_packer.answer_reserve_tokens})"
+        )
+        return packed
+
+    @staticmethod
+    def _generation_inputs(state: GraphState, packed) -> dict:
+        return {
+            "context": packed.context, 
             "question": state["question"],
-            "chat_history": history_str # Passa o histórico
-        })
-        
+            "chat_history": packed.history # Histórico recente na íntegra, antigo resumido
+        }
+
+    def _generation_result(self, state: GraphState, generation: str, packed):
         logger.info("Resposta gerada com sucesso")
-        
-        
-        
+
+        history = state.get("chat_history", [])
         user_msg = state.get("original_question") or state["question"]
 
         updated_history = list(history) if history else []
-#        updated_history.append(("Usuário", state["question"]))
-        updated_history.append(("Usuário", user_msg)) # <--- Alterado aqui
+        updated_history.append(("Usuário", user_msg))
         updated_history.append(("Assistente", generation))
+        # O histórico vive no checkpoint da sessão: limitado para não crescer sem fim
+        updated_history = updated_history[-settings.history_max_messages:]
         
         return {
             "generation": generation,
+            "context": packed.context,
             "chat_history": updated_history
         }
 
-    def transform_query(self, state: GraphState):
+    def generate(self, state: GraphState):
+        logger.debug("Gerando resposta...")
+        packed = self._pack_generation(state)
+        generation = self.rag_chain.invoke(self._generation_inputs(state, packed))
+        return self._generation_result(state, generation, packed)
+
+    async def agenerate(self, state: GraphState):
+        logger.debug("Gerando resposta...")
+        packed = self._pack_generation(state)
+        generation = await self.rag_chain.ainvoke(self._generation_inputs(state, packed))
+        return self._generation_result(state, generation, packed)
+
+    def _rewrite_inputs(self, state: GraphState) -> dict:
         logger.debug(f"Reescrevendo pergunta (tentativa {state.get('loop_count', 0) + 1})")
         original_question = state.get("original_question", state["question"])
-        new_q = self.rewriter_chain.invoke({
+        return {
             "original_question": original_question,
             "question": state["question"]
-        })
+        }
+
+    def _rewrite_result(self, state: GraphState, new_q: str):
         logger.info(f"Pergunta reescrita: \n {new_q[:500]}...")
         return {"question": new_q, "loop_count": state.get("loop_count", 0) + 1}
 
+    def transform_query(self, state: GraphState):
+        return self._rewrite_result(state, self.rewriter_chain.invoke(self._rewrite_inputs(state)))
+
+    async def atransform_query(self, state: GraphState):
+        return self._rewrite_result(state, await self.rewriter_chain.ainvoke(self._rewrite_inputs(state)))
+
+    def _prefilter_result(self, question: str, decision: str, reason: str) -> Optional[dict]:
+        """Atualização do estado se o pré-filtro decidiu localmente; None se escalou."""
+        if decision == "accept":
+            logger.info(f"✅ Pergunta aprovada pelo pré-filtro local ({reason}).")
+            return {"question": question, "generation": None}
+        if decision == "reject":
+            logger.warning(f"⛔ Pergunta bloqueada pelo pré-filtro local: {reason}")
+            return {"question": question, "generation": f"Não posso responder a isso. {reason}"}
+        logger.debug(f"Pré-filtro local: {reason}; consultando o guardrail LLM")
+        return None
+
+    def _guardrail_result(self, question: str, outcome=None, error: Optional[Exception] = None):
+        if error is not None:
+            logger.error(f"Erro no guardrail: {error}")
+            return {"question": question}
+
+        if outcome.is_valid:
+            logger.info("✅ Pergunta aprovada pelo Guardrail.")
+            return {"question": question, "generation": None}
+        else:
+            logger.warning(f"⛔ Pergunta bloqueada: {outcome.reason}")
+            return {
+                "question": question, 
+                "generation": f"Não posso responder a isso. {outcome.reason}"
+            }
+
     def guardrails_check(self, state: GraphState):
         logger.debug("🛡️ Verificando Guardrails da pergunta...")
         question = state["question"]
+
+        if self.guardrail_prefilter is not None:
+            local = self._prefilter_result(question, *self.guardrail_prefilter.classify(question))
+            if local is not None:
+                return local
         
         try:
-            outcome = self.guardrail_chain.invoke({"question": question})
-            
-            if outcome.is_valid:
-                logger.info("✅ Pergunta aprovada pelo Guardrail.")
-                return {"question": question, "generation": None}
-            else:
-                logger.warning(f"⛔ Pergunta bloqueada: {outcome.reason}")
-                return {
-                    "question": question, 
-                    "generation": f"Não posso responder a isso. {outcome.reason}"
-                }
-                
+            outcome = _structured(self.guardrail_chain.invoke({"question": question}))
+        except Exception as e:
+            return self._guardrail_result(question, error=e)
+        return self._guardrail_result(question, outcome)
+
+    async def aguardrails_check(self, state: GraphState):
+        logger.debug("🛡️ Verificando Guardrails da pergunta...")
+        question = state["question"]
+
+        if self.guardrail_prefilter is not None:
+            # O pré-filtro pode calcular o embedding da pergunta (chamada de rede síncrona)
+            decision, reason = await asyncio.to_thread(self.guardrail_prefilter.classify, question)
+            local = self._prefilter_result(question, decision, reason)
+            if local is not None:
+                return local
+
+        try:
+            outcome = _structured(await self.guardrail_chain.ainvoke({"question": question}))
         except Exception as e:
-            logger.error(f"Erro no guardrail: {e}")
-            return {"question": question}
\ No newline at end of file
+            return self._guardrail_result(question, error=e)
+        return self._guardrail_result(question, outcome)
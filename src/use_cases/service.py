@@ -0,0 +1,95 @@
+"""
+Ponto de entrada assíncrono: várias sessões de conversa num único event loop.
+
+O grafo é compilado uma vez com `build(async_mode=True)`; cada sessão é um
+`thread_id` do checkpointer, que guarda o histórico da conversa. Como os nós
+passam a maior parte do tempo esperando a rede (embeddings e LLM), centenas de
+sessões podem ser atendidas concorrentemente por um só processo. Perguntas da mesma sessão são serializadas,
+pois cada turno depende do histórico gravado pelo anterior.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from src.config import settings
+from src.use_cases.streaming import StreamEvent, astream_answer
+
+
+class RAGService:
+    """Executa perguntas no app assíncrono (grafo compilado ou CachedRAGApp)."""
+
+    def __init__(self, app, repo=None):
+        self.app = app
+        self.repo = repo
+        # Lock por sessão ativa; sai do dicionário quando ninguém o usa nem espera por ele
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self._session_users: Dict[str, int] = {}
+
+    @classmethod
+    def from_settings(cls) -> "RAGService":
+        """Carrega o índice e compila o grafo assíncrono (uma vez por processo)."""
+        # Imports locais: evitam carregar FAISS/LLMs quando o app é injetado
+        from src.infrastructure.guardrail_prefilter import build_guardrail_prefilter
+        from src.infrastructure.vector_store import VectorStoreRepository
+        from src.use_cases.graph import RAGGraphBuilder
+
+        repo = VectorStoreRepository()
+        retriever = repo.get_retriever(k=settings.retriever_k)
+        builder = RAGGraphBuilder(
+            retriever,
+            corpus_description=repo.catalog.describe(),
+            answer_cache=repo.answer_cache,
+            guardrail_prefilter=build_guardrail_prefilter(repo.corpus_profiles(), retriever.embed_query)
+        )
+        return cls(builder.build(async_mode=True), repo=repo)
+
+    @staticmethod
+    def config_for(session_id: str) -> Dict[str, Any]:
+        return {"configurable": {"thread_id": session_id}}
+
+    @asynccontextmanager
+    async def _session(self, session_id: str):
+        """Serializa os turnos da sessão e descarta o lock quando fica ocioso."""
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = self._session_locks[session_id] = asyncio.Lock()
+        self._session_users[session_id] = self._session_users.get(session_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._session_users[session_id] -= 1
+            if not self._session_users[session_id]:
+                del self._session_users[session_id]
+                del self._session_locks[session_id]
+
+    @staticmethod
+    def _inputs(question: str) -> Dict[str, Any]:
+        # O histórico vem do checkpoint da sessão (e é limitado pelo nó generate)
+        return {"question": question, "loop_count": 0}
+
+    async def ask(self, question: str, session_id: str) -> Dict[str, Any]:
+        """Estado final do grafo para a pergunta, no contexto da sessão."""
+        config = self.config_for(session_id)
+        async with self._session(session_id):
+            return await self.app.ainvoke(self._inputs(question), config=config)
+
+    async def astream(self, question: str, session_id: str) -> AsyncIterator[StreamEvent]:
+        """Como `ask`, mas em StreamEvents (ver src.use_cases.streaming)."""
+        config = self.config_for(session_id)
+        async with self._session(session_id):
+            async for event in astream_answer(self.app, self._inputs(question), config):
+                yield event
+
+    def stats(self) -> Optional[dict]:
+        stats = self.repo.cache_stats() if self.repo is not None else {}
+        checkpointer = getattr(self.app, "checkpointer", None)
+        if hasattr(checkpointer, "stats"):
+            stats["checkpoints"] = checkpointer.stats()
+        return stats or None
+
+    def close(self):
+        """Encerra o checkpointer (manutenção em segundo plano e conexão SQLite)."""
+        checkpointer = getattr(self.app, "checkpointer", None)
+        if hasattr(checkpointer, "close"):
+            checkpointer.close()
@@ -0,0 +1,114 @@
+"""
+Streaming da resposta: tokens do nó `generate` à medida que o LLM os produz.
+
+O texto transmitido é provisório até a validação de alucinação. Se a resposta
+for reprovada e o grafo reformular a pergunta, um evento "retract" avisa o
+cliente para descartar o que já exibiu; a nova tentativa volta a emitir tokens.
+"""
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Literal, Optional
+
+from pydantic import BaseModel
+
+from src.utils.logging import get_logger
+
+logger = get_logger()
+
+GENERATION_NODE = "generate"
+VALIDATION_NODE = "validate_gen"
+REWRITE_NODE = "transform_query"
+
+
+class StreamEvent(BaseModel):
+    """
+    Evento do stream de uma resposta.
+
+    - token: trecho da resposta (provisória até o evento "validated")
+    - retract: a resposta transmitida foi reprovada e será gerada de novo
+    - validated: resultado da validação de alucinação da resposta transmitida
+    - done: fim da execução, com o estado final e as métricas de latência
+    """
+
+    kind: Literal["token", "retract", "validated", "done"]
+    text: str = ""
+    validated: Optional[bool] = None
+    state: Optional[Dict[str, Any]] = None
+    ttft_seconds: Optional[float] = None
+    elapsed_seconds: Optional[float] = None
+
+
+def _chunk_text(chunk) -> str:
+    content = getattr(chunk, "content", "")
+    if isinstance(content, str):
+        return content
+    # Alguns modelos devolvem o conteúdo como lista de partes
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+class _StreamTracker:
+    """Converte os eventos do grafo em StreamEvents (comum aos streams síncrono e assíncrono)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ttft = None
+        self.streamed = False
+
+    def events(self, mode: str, payload) -> Iterator[StreamEvent]:
+        if mode == "messages":
+            chunk, metadata = payload
+            if metadata.get("langgraph_node") != GENERATION_NODE:
+                return
+            text = _chunk_text(chunk)
+            if not text:
+                return
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self.started
+                logger.info(f"⏱️ Primeiro token em {self.ttft:.2f}s")
+            self.streamed = True
+            yield StreamEvent(kind="token", text=text)
+            return
+
+        for node, update in payload.items():
+            if node == VALIDATION_NODE and self.streamed:
+                yield StreamEvent(kind="validated", validated=bool((update or {}).get("validated")))
+            elif node == REWRITE_NODE and self.streamed:
+                # A resposta já transmitida foi reprovada: o cliente deve descartá-la
+                self.streamed = False
+                yield StreamEvent(kind="retract", text="Resposta reprovada na validação; gerando novamente.")
+
+    def done(self, state: Dict[str, Any]) -> StreamEvent:
+        elapsed = time.perf_counter() - self.started
+        ttft = self.ttft
+        logger.info(f"Resposta transmitida em {elapsed:.2f}s (TTFT: {f'{ttft:.2f}s' if ttft is not None else '-'})")
+        return StreamEvent(kind="done", state=state, ttft_seconds=ttft, elapsed_seconds=elapsed)
+
+
+def stream_graph(graph, inputs: Dict[str, Any], config: Dict[str, Any]) -> Iterator[StreamEvent]:
+    """Executa o grafo compilado emitindo StreamEvents; o estado final vem no evento "done"."""
+    tracker = _StreamTracker()
+    for mode, payload in graph.stream(inputs, config=config, stream_mode=["messages", "updates"]):
+        yield from tracker.events(mode, payload)
+    yield tracker.done(dict(graph.get_state(config).values))
+
+
+async def astream_graph(graph, inputs: Dict[str, Any], config: Dict[str, Any]) -> AsyncIterator[StreamEvent]:
+    """Versão assíncrona de `stream_graph`, para o grafo compilado com `build(async_mode=True)`."""
+    tracker = _StreamTracker()
+    async for mode, payload in graph.astream(inputs, config=config, stream_mode=["messages", "updates"]):
+        for event in tracker.events(mode, payload):
+            yield event
+    yield tracker.done(dict((await graph.aget_state(config)).values))
+
+
+def stream_answer(app, inputs: Dict[str, Any], config: Dict[str, Any]) -> Iterator[StreamEvent]:
+    """Stream de `RAGGraphBuilder.build()`: o grafo compilado ou o CachedRAGApp."""
+    if hasattr(type(app), "stream_answer"):
+        return app.stream_answer(inputs, config)
+    return stream_graph(app, inputs, config)
+
+
+def astream_answer(app, inputs: Dict[str, Any], config: Dict[str, Any]) -> AsyncIterator[StreamEvent]:
+    """Como `stream_answer`, para o app compilado com `build(async_mode=True)`."""
+    if hasattr(type(app), "astream_answer"):
+        return app.astream_answer(inputs, config)
+    return astream_graph(app, inputs, config)
@@ -0,0 +1,56 @@
+"""Cache LRU em memória com expiração (TTL) e contadores de acerto."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+MISSING = object()
+
+
+class LRUCache:
+    """LRU thread-safe; entradas mais antigas que `ttl_seconds` contam como ausentes."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if self.ttl_seconds is None or time.monotonic() - stored_at <= self.ttl_seconds:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._data),
+        }
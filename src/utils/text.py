@@ -0,0 +1,67 @@
+"""
+Análise léxica de textos em português: normalização, stopwords e stemming leve.
+"""
+
+import re
+import unicodedata
+from typing import List
+
+# Versão do analisador: índices léxicos gravados com outra versão são reconstruídos
+ANALYZER_VERSION = 1
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Stopwords já sem acentos (a comparação é feita após fold_accents)
+STOPWORDS = frozenset("""
+a ao aos aquela aquelas aquele aqueles aquilo as ate com como da das de dela delas dele deles
+depois do dos e ela elas ele eles em entre era eram essa essas esse esses esta estas este estes
+eu foi fomos for foram fosse fossem fui ha isso isto ja lhe lhes mais mas me mesmo meu meus minha
+minhas muito na nao nas nem no nos nossa nossas nosso nossos num numa o os ou para pela pelas pelo
+pelos por qual quando que quem se sem ser seu seus so sua suas tambem te tem teu tinha tu tua
+um uma umas uns voce voces vos era sao esta estao estava foi sera seria
+""".split())
+
+# Plurais irregulares, aplicados antes da remoção simples do "s" final
+PLURAL_SUFFIXES = (
+    ("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"),
+    ("ois", "ol"), ("ns", "m"), ("res", "r"), ("zes", "z"), ("les", "l"),
+)
+
+
+def fold_accents(text: str) -> str:
+    """Remove acentos e converte para minúsculas ('Capitú' -> 'capitu')."""
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in normalized if not unicodedata.combining(ch))
+
+
+def normalize_query(text: str) -> str:
+    """Chave de cache para perguntas: sem diferença de caixa ou de espaços."""
+    return " ".join(text.casefold().split())
+
+
+def stem(token: str) -> str:
+    """Stemmer leve para português: plural, advérbios em -mente e vogal temática."""
+    if len(token) <= 3:
+        return token
+
+    if token.endswith("mente") and len(token) > 7:
+        token = token[:-5]
+
+    for suffix, replacement in PLURAL_SUFFIXES:
+        if token.endswith(suffix) and len(token) > len(suffix) + 2:
+            token = token[:-len(suffix)] + replacement
+            break
+    else:
+        if token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+
+    # Unifica gênero/número residual: "menino"/"menina"/"menine" -> "menin"
+    if len(token) > 4 and token[-1] in "aeo":
+        token = token[:-1]
+    return token
+
+
+def analyze(text: str) -> List[str]:
+    """Tokens normalizados para indexação e busca léxica."""
+    tokens = TOKEN_PATTERN.findall(fold_accents(text))
+    return [stem(token) for token in tokens if token not in STOPWORDS]
@@ -5,6 +5,7 @@ Script de teste para validar o pipeline RAG completo
 import sys
 from pathlib import Path
 
+from src.config import settings
 from src.infrastructure.vector_store import VectorStoreRepository
 from src.use_cases.graph import RAGGraphBuilder
 
@@ -22,7 +23,7 @@ def test_rag_pipeline():
     print("\n1️⃣ Inicializando VectorStore...")
     try:
         repo = VectorStoreRepository()
-        retriever = repo.get_retriever()
+        retriever = repo.get_retriever(k=settings.retriever_k)
         print("   ✅ VectorStore inicializado")
     except Exception as e:
         print(f"   ❌ Erro ao inicializar: {e}")
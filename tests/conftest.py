@@ -0,0 +1,36 @@
+"""
+Fixtures dos testes offline: nenhum teste chama o Gemini nem grava em .cache/.
+
+As variáveis de ambiente precisam existir antes do primeiro import de
+src.config (Settings é instanciado no import).
+"""
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("CHECKPOINTER", "memory")
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from fakes import FakeChatModel
+from src.infrastructure.llm_factory import LLMFactory
+
+
+@pytest.fixture
+def fake_llm(monkeypatch) -> FakeChatModel:
+    """Todas as chains passam a usar o mesmo FakeChatModel."""
+    llm = FakeChatModel(calls={})
+    monkeypatch.setattr(LLMFactory, "get_llm", classmethod(lambda cls, chain=None: llm))
+    return llm
+
+
+@pytest.fixture
+def fake_embeddings() -> DeterministicFakeEmbedding:
+    return DeterministicFakeEmbedding(size=16)
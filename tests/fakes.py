@@ -0,0 +1,119 @@
+"""Dublês sem rede usados pelos testes: chat model e documentos de chunk."""
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+ANSWER = "Bentinho é o narrador de Dom Casmurro."
+# Documentos com este marcador são avaliados como irrelevantes pelo grader falso
+IRRELEVANT = "[irrelevante]"
+# Prompts com este marcador fazem as chains estruturadas falharem (erro da API)
+FAILING = "[falha]"
+# Prompts com este marcador fazem o modelo responder em texto, sem chamar a ferramenta
+NO_TOOL_CALL = "[sem ferramenta]"
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model sem rede: texto fixo nas chains de texto e respostas estruturadas
+    positivas (pergunta válida, documento relevante salvo IRRELEVANT, sem
+    alucinação) nas demais.
+    `calls` conta as chamadas por schema ("text" para as chains de texto);
+    `batch_verdict_limit` corta os vereditos da avaliação em lote e
+    `valid_question=False` faz o guardrail de entrada rejeitar a pergunta.
+    """
+
+    answer: str = ANSWER
+    calls: Dict[str, int] = {}
+    batch_verdict_limit: Optional[int] = None
+    valid_question: bool = True
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        names = [convert_to_openai_tool(tool)["function"]["name"] for tool in tools]
+        return self.bind(tool_names=names, **kwargs)
+
+    def _structured_args(self, name: str, prompt: str) -> Dict[str, Any]:
+        if FAILING in prompt:
+            raise RuntimeError("erro simulado da API")
+        if name == "InputGuardrail":
+            return {"is_valid": self.valid_question, "reason": "" if self.valid_question else "Fora do escopo."}
+        if name == "BatchRetrievalGrader":
+            blocks = re.split(r"^\[(\d+)\] ", prompt, flags=re.MULTILINE)[1:]
+            verdicts = [
+                {"index": int(index), "binary_score": "nao" if IRRELEVANT in text else "sim"}
+                for index, text in zip(blocks[::2], blocks[1::2])
+            ]
+            return {"verdicts": verdicts[:self.batch_verdict_limit]}
+        if name == "HallucinationGrade":
+            return {"binary_score": "sim", "reason": "Apoiada pelos documentos."}
+        return {"binary_score": "nao" if IRRELEVANT in prompt else "sim"}
+
+    def _message(self, messages, tool_names: Optional[List[str]]) -> AIMessage:
+        if not tool_names:
+            self.calls["text"] = self.calls.get("text", 0) + 1
+            return AIMessage(content=self.answer)
+        name = tool_names[0]
+        self.calls[name] = self.calls.get(name, 0) + 1
+        prompt = "\n".join(str(message.content) for message in messages)
+        if NO_TOOL_CALL in prompt:
+            return AIMessage(content="Não sei avaliar.")
+        return AIMessage(content="", tool_calls=[{"name": name, "args": self._structured_args(name, prompt), "id": "call-1"}])
+
+    def _generate(self, messages, stop=None, run_manager=None, tool_names=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, tool_names))])
+
+    def _stream(self, messages, stop=None, run_manager=None, tool_names=None, **kwargs):
+        message = self._message(messages, tool_names)
+        if message.tool_calls:
+            chunk = AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}
+                for call in message.tool_calls
+            ])
+            yield ChatGenerationChunk(message=chunk)
+            return
+        for word in re.findall(r"\S+\s*", message.content):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word))
+            if run_manager:
+                run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
+
+
+class StaticRetriever(BaseRetriever):
+    """
+    Devolve sempre os mesmos chunks; expõe a interface usada pelo grafo e pelo cache.
+    `delay` segura cada busca (em segundos) e `calls` conta as buscas.
+    """
+
+    documents: List[Document]
+    embeddings: Any = None
+    delay: float = 0.0
+    calls: int = 0
+
+    def _get_relevant_documents(self, query: str, *, run_manager) -> List[Document]:
+        time.sleep(self.delay)
+        self.calls += 1
+        return list(self.documents)
+
+    def embed_query(self, query: str) -> List[float]:
+        return self.embeddings.embed_query(query)
+
+    def get_by_ids(self, chunk_ids: List[str]) -> List[Document]:
+        by_id = {doc.metadata["chunk_id"]: doc for doc in self.documents}
+        return [by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in by_id]
+
+
+def make_doc(chunk_id: str, text: str, **metadata) -> Document:
+    """Chunk com os metadados da ingestão (id "<book_id>:<posição>")."""
+    book_id = chunk_id.rsplit(":", 1)[0]
+    return Document(page_content=text, metadata={"chunk_id": chunk_id, "book_id": book_id, **metadata})
@@ -0,0 +1,107 @@
+"""Cache semântico de respostas: limiar, TTL, versão do índice e regra do histórico."""
+import pytest
+
+from src.infrastructure import answer_cache as answer_cache_module
+from src.infrastructure.answer_cache import SemanticAnswerCache
+from src.use_cases.cached_app import CachedRAGApp
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(answer_cache_module.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = SemanticAnswerCache(str(tmp_path / "answers.sqlite"), index_version="v1", threshold=0.95, ttl_seconds=60)
+    yield cache
+    cache.close()
+
+
+def test_hit_above_threshold_returns_answer_and_sources(cache):
+    cache.store("Quem é Capitu?", [1.0, 0.0], "A esposa de Bentinho.", ["livro:3"])
+    answer, chunk_ids, similarity = cache.lookup([0.99, 0.05])
+    assert answer == "A esposa de Bentinho."
+    assert chunk_ids == ["livro:3"]
+    assert similarity >= 0.95
+
+
+def test_miss_below_threshold(cache):
+    cache.store("Quem é Capitu?", [1.0, 0.0], "A esposa de Bentinho.", [])
+    # cosseno 0.8
+    assert cache.lookup([0.8, 0.6]) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_best_match_wins(cache):
+    cache.store("a", [1.0, 0.0], "resposta a", [])
+    cache.store("b", [0.98, 0.2], "resposta b", [])
+    assert cache.lookup([0.97, 0.25])[0] == "resposta b"
+
+
+def test_entries_expire_after_ttl(cache, clock):
+    cache.store("Quem é Capitu?", [1.0, 0.0], "A esposa de Bentinho.", [])
+    clock[0] += 61
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_other_index_version_is_discarded(tmp_path, clock):
+    path = str(tmp_path / "answers.sqlite")
+    first = SemanticAnswerCache(path, index_version="v1")
+    first.store("Quem é Capitu?", [1.0, 0.0], "A esposa de Bentinho.", [])
+    first.close()
+
+    same = SemanticAnswerCache(path, index_version="v1")
+    assert same.lookup([1.0, 0.0]) is not None
+    same.set_index_version("v2")
+    assert same.lookup([1.0, 0.0]) is None
+    same.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = SemanticAnswerCache(str(tmp_path / "answers.sqlite"), index_version="v1", max_entries=2)
+    cache.store("a", [1.0, 0.0], "resposta a", [])
+    clock[0] += 1
+    cache.store("b", [0.0, 1.0], "resposta b", [])
+    clock[0] += 1
+    cache.lookup([1.0, 0.0])
+    clock[0] += 1
+    cache.store("c", [-1.0, 0.0], "resposta c", [])
+    assert cache.lookup([0.0, 1.0]) is None
+    assert cache.lookup([1.0, 0.0])[0] == "resposta a"
+    cache.close()
+
+
+class StubGraph:
+    def __init__(self):
+        self.invocations = 0
+
+    def invoke(self, inputs, config=None, **kwargs):
+        self.invocations += 1
+        return {"question": inputs["question"], "generation": "resposta do grafo", "validated": True, "documents": []}
+
+
+class StubRetriever:
+    def embed_query(self, question):
+        return [1.0, 0.0]
+
+    def get_by_ids(self, chunk_ids):
+        return []
+
+
+def test_cached_app_skips_the_cache_when_there_is_history(cache):
+    graph = StubGraph()
+    app = CachedRAGApp(graph, cache, StubRetriever())
+
+    app.invoke({"question": "Quem é Capitu?", "chat_history": []})
+    assert cache.stats()["entries"] == 1
+
+    # Acerto sem histórico; com histórico, a pergunta vai sempre para o grafo
+    assert app.invoke({"question": "Quem é Capitu?", "chat_history": []})["generation"] == "resposta do grafo"
+    assert graph.invocations == 1
+    app.invoke({"question": "e depois?", "chat_history": [("Usuário", "Quem é Capitu?")]})
+    assert graph.invocations == 2
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,56 @@
+"""LRUCache: expiração por TTL, despejo do menos usado e contadores."""
+import pytest
+
+from src.utils import cache as cache_module
+from src.utils.cache import MISSING, LRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LRUCache(max_entries=4, ttl_seconds=10)
+    cache.set("a", 1)
+    clock[0] += 10
+    assert cache.get("a") == 1
+    clock[0] += 0.5
+    assert cache.get("a") is MISSING
+    assert len(cache) == 0
+
+
+def test_without_ttl_entries_never_expire(clock):
+    cache = LRUCache(max_entries=4)
+    cache.set("a", 1)
+    clock[0] += 1e9
+    assert cache.get("a") == 1
+
+
+def test_set_refreshes_the_timestamp(clock):
+    cache = LRUCache(max_entries=4, ttl_seconds=10)
+    cache.set("a", 1)
+    clock[0] += 8
+    cache.set("a", 2)
+    clock[0] += 8
+    assert cache.get("a") == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_stats_count_hits_and_misses():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", None)
+    assert cache.get("a") is None
+    assert cache.get("b", default="x") == "x"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
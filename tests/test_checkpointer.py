@@ -0,0 +1,89 @@
+"""Checkpointer SQLite: persistência das sessões, compactação, expiração e reset por turno."""
+import operator
+from typing import Annotated, List
+
+from langgraph.checkpoint.base import WRITES_IDX_MAP
+from langgraph.graph import END, StateGraph
+from typing_extensions import TypedDict
+
+from fakes import make_doc
+from src.infrastructure import checkpointer as checkpointer_module
+from src.infrastructure.checkpointer import SQLiteCheckpointSaver, _write_sort_key
+from src.use_cases.graph import RAGGraphBuilder
+
+
+class CounterState(TypedDict):
+    question: str
+    answers: Annotated[List[str], operator.add]
+
+
+def counter_app(saver):
+    workflow = StateGraph(CounterState)
+    workflow.add_node("answer", lambda state: {"answers": [state["question"].upper()]})
+    workflow.set_entry_point("answer")
+    workflow.add_edge("answer", END)
+    return workflow.compile(checkpointer=saver)
+
+
+def saver_at(tmp_path, **kwargs) -> SQLiteCheckpointSaver:
+    return SQLiteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"), vacuum_interval_seconds=None, **kwargs)
+
+
+def test_session_state_survives_a_restart(tmp_path):
+    config = {"configurable": {"thread_id": "s1"}}
+    saver = saver_at(tmp_path)
+    counter_app(saver).invoke({"question": "capitu"}, config)
+    saver.close()
+
+    saver = saver_at(tmp_path)
+    state = counter_app(saver).invoke({"question": "bentinho"}, config)
+    assert state["answers"] == ["CAPITU", "BENTINHO"]
+    saver.close()
+
+
+def test_only_the_latest_checkpoints_are_kept(tmp_path):
+    saver = saver_at(tmp_path, keep_latest=3)
+    app = counter_app(saver)
+    config = {"configurable": {"thread_id": "s1"}}
+    for question in ("a", "b", "c", "d"):
+        app.invoke({"question": question}, config)
+
+    assert saver.stats()["checkpoints"] == 3
+    assert app.get_state(config).values["answers"] == ["A", "B", "C", "D"]
+    saver.close()
+
+
+def test_idle_threads_expire(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(checkpointer_module.time, "time", lambda: now[0])
+    saver = saver_at(tmp_path, ttl_seconds=60)
+    app = counter_app(saver)
+    app.invoke({"question": "antiga"}, {"configurable": {"thread_id": "old"}})
+    now[0] += 120
+    app.invoke({"question": "nova"}, {"configurable": {"thread_id": "new"}})
+
+    assert saver.purge_expired() == 1
+    assert saver.get_tuple({"configurable": {"thread_id": "old"}}) is None
+    assert saver.get_tuple({"configurable": {"thread_id": "new"}}) is not None
+    saver.close()
+
+
+def test_pending_writes_sort_special_channels_first():
+    special = next(iter(WRITES_IDX_MAP))
+    writes = [("channel", "task-b", 0), ("channel", "task-a", 1), (special, "task-c", WRITES_IDX_MAP[special])]
+    ordered = sorted(writes, key=lambda w: _write_sort_key(*w))
+    assert ordered == [writes[2], writes[1], writes[0]]
+
+
+def test_each_turn_starts_without_the_previous_documents(fake_llm):
+    builder = RAGGraphBuilder(retriever=None, corpus_description="o livro 'Dom Casmurro'")
+    update = builder._store_original_question({
+        "question": "Quem é Escobar?",
+        "documents": [make_doc("livro:0", "turno anterior")],
+        "context": "contexto do turno anterior",
+        "generation": "resposta anterior",
+    })
+    assert update["documents"] == []
+    assert update["context"] is None
+    assert update["generation"] is None
+    assert update["original_question"] == "Quem é Escobar?"
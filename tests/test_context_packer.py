@@ -0,0 +1,75 @@
+"""Empacotamento do contexto e do histórico no orçamento de tokens."""
+from fakes import make_doc
+from src.infrastructure.context_packer import (
+    EMPTY_HISTORY,
+    TRIM_MARK,
+    ContextPacker,
+    estimate_tokens,
+    trim_to_tokens,
+)
+
+
+def chunk(n: int, tokens: int):
+    # 4 caracteres por token (o padrão de Settings)
+    return make_doc(f"livro:{n}", "abc " * tokens)
+
+
+def test_estimate_tokens_rounds_up():
+    assert estimate_tokens("", chars_per_token=4) == 0
+    assert estimate_tokens("abcde", chars_per_token=4) == 2
+
+
+def test_trim_prefers_sentence_end():
+    text = "Primeira frase curta. " + "palavra " * 30
+    trimmed = trim_to_tokens(text, 10, chars_per_token=4)
+    assert trimmed.endswith(TRIM_MARK)
+    assert len(trimmed) <= 40
+    assert trim_to_tokens("curto", 10, chars_per_token=4) == "curto"
+
+
+def test_documents_fill_the_budget_in_order():
+    packer = ContextPacker(min_chunk_tokens=5)
+    context, tokens, used, trimmed = packer.pack_documents([chunk(0, 40), chunk(1, 40), chunk(2, 40)], budget=100)
+    assert used == 3 and trimmed == 1
+    assert tokens <= 100
+    assert context.startswith(chunk(0, 40).page_content)
+    assert context.endswith(TRIM_MARK)
+
+
+def test_remainder_below_minimum_is_dropped():
+    packer = ContextPacker(min_chunk_tokens=50)
+    context, tokens, used, trimmed = packer.pack_documents([chunk(0, 60), chunk(1, 60)], budget=100)
+    assert (used, trimmed) == (1, 0)
+    assert context == chunk(0, 60).page_content
+
+
+def test_history_keeps_recent_turns_and_shortens_old_ones():
+    packer = ContextPacker(recent_turns=1, old_message_tokens=5, history_budget_tokens=1000)
+    history = [("Usuário", "pergunta antiga " * 20), ("Assistente", "resposta antiga " * 20),
+               ("Usuário", "pergunta nova"), ("Assistente", "resposta nova")]
+    text, _ = packer.pack_history(history)
+    lines = text.split("\n")
+    assert lines[-2:] == ["Usuário: pergunta nova", "Assistente: resposta nova"]
+    assert all(line.endswith(TRIM_MARK) for line in lines[:2])
+
+
+def test_history_drops_oldest_messages_to_fit():
+    packer = ContextPacker(recent_turns=5, history_budget_tokens=12)
+    history = [("Usuário", "a" * 40), ("Assistente", "b" * 40), ("Usuário", "c" * 10)]
+    text, tokens = packer.pack_history(history)
+    assert text == "Usuário: " + "c" * 10
+    assert tokens <= 12
+    assert packer.pack_history([])[0] == EMPTY_HISTORY
+
+
+def test_pack_respects_total_budget():
+    packer = ContextPacker(token_budget=400, answer_reserve_tokens=100, history_budget_tokens=200, min_chunk_tokens=5)
+    history = [("Usuário", "x" * 2000), ("Assistente", "y" * 2000)]
+    packed = packer.pack([chunk(n, 80) for n in range(5)], history, fixed_tokens=50)
+
+    available = 400 - 100 - 50
+    # O histórico nunca passa da metade do espaço disponível
+    assert packed.history_tokens <= available // 2
+    assert packed.input_tokens <= 400 - 100
+    assert packed.documents_total == 5
+    assert packed.documents_used < 5
@@ -0,0 +1,89 @@
+"""Fatiamento incremental do corpus: deslocamentos dos chunks no arquivo."""
+import random
+
+import pytest
+
+from src.infrastructure.corpus import iter_chapter_chunks, iter_chunks
+
+
+@pytest.fixture
+def corpus_text() -> str:
+    rng = random.Random(7)
+    words = "ação Capitu Bentinho olhos de ressaca Escobar José Dias seminário Matacavalos".split()
+    paragraphs = [
+        "\n".join(" ".join(rng.choice(words) for _ in range(rng.randint(5, 40))) for _ in range(rng.randint(1, 4)))
+        for _ in range(60)
+    ]
+    return "\n\n".join(paragraphs)
+
+
+CHAPTER_PATTERN = r"(?i)^cap[ií]tulo\s+[\w-]+\.?$"
+CHAPTERED = (
+    "\ufeffCAPÍTULO I\n\n"
+    "Primeiro parágrafo do capítulo, com acentuação.\nSegunda linha.\n\n"
+    "Outro parágrafo curto.\n\n"
+    "CAPÍTULO II\n\n"
+    "Texto do segundo capítulo é aqui.\n"
+)
+
+
+def write(tmp_path, text: str) -> str:
+    path = tmp_path / "livro.txt"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_start_index_points_at_the_chunk_text(tmp_path, corpus_text):
+    # Janela pequena: força vários blocos e o reaproveitamento do último chunk de cada um
+    docs = list(iter_chunks(write(tmp_path, corpus_text), chunk_size=200, chunk_overlap=40, window_chars=500))
+    assert len(docs) > 10
+    for doc in docs:
+        start = doc.metadata["start_index"]
+        assert corpus_text[start:start + len(doc.page_content)] == doc.page_content
+        assert len(doc.page_content) <= 200
+
+
+def test_chunks_cover_the_whole_text_in_order(tmp_path, corpus_text):
+    docs = list(iter_chunks(write(tmp_path, corpus_text), chunk_size=200, chunk_overlap=40, window_chars=500))
+    starts = [doc.metadata["start_index"] for doc in docs]
+    assert starts == sorted(starts)
+
+    covered = [False] * len(corpus_text)
+    for doc in docs:
+        start = doc.metadata["start_index"]
+        covered[start:start + len(doc.page_content)] = [True] * len(doc.page_content)
+    assert all(hit or corpus_text[i].isspace() for i, hit in enumerate(covered))
+
+
+def test_empty_file_yields_nothing(tmp_path):
+    assert list(iter_chunks(write(tmp_path, ""), chunk_size=200, chunk_overlap=40)) == []
+
+
+def test_chapter_offsets_are_bytes_in_the_file(tmp_path):
+    path = write(tmp_path, CHAPTERED)
+    data = CHAPTERED.encode("utf-8")
+    docs = list(iter_chapter_chunks(path, chunk_size=60, chapter_pattern=CHAPTER_PATTERN))
+    assert docs
+    for doc in docs:
+        assert data[doc.metadata["start"]:doc.metadata["end"]].decode("utf-8") == doc.page_content
+
+
+def test_chunks_never_cross_chapters(tmp_path):
+    docs = list(iter_chapter_chunks(write(tmp_path, CHAPTERED), chunk_size=60, chapter_pattern=CHAPTER_PATTERN))
+    assert [doc.metadata["chapter_index"] for doc in docs] == [1, 1, 2]
+    assert [doc.metadata["chapter"] for doc in docs] == ["CAPÍTULO I", "CAPÍTULO I", "CAPÍTULO II"]
+    # O título abre o primeiro chunk de cada capítulo
+    assert docs[0].page_content.startswith("CAPÍTULO I\n")
+    assert docs[2].page_content == "CAPÍTULO II\n\nTexto do segundo capítulo é aqui."
+
+
+def test_long_paragraph_is_split_at_sentences(tmp_path):
+    sentence = "Capitu olhava o mar com olhos de ressaca. "
+    text = "CAPÍTULO I\n\n" + sentence * 10 + "\n"
+    data = text.encode("utf-8")
+    docs = list(iter_chapter_chunks(write(tmp_path, text), chunk_size=100, chapter_pattern=CHAPTER_PATTERN))
+    assert len(docs) > 3
+    for doc in docs:
+        assert doc.metadata["end"] - doc.metadata["start"] <= 100 + len("CAPÍTULO I\n\n".encode("utf-8"))
+        assert data[doc.metadata["start"]:doc.metadata["end"]].decode("utf-8") == doc.page_content
+    assert all(doc.page_content.rstrip().endswith(".") for doc in docs[1:])
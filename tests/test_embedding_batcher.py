@@ -0,0 +1,96 @@
+"""Micro-batching de embeddings de pergunta entre threads concorrentes."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.infrastructure.embedding_batcher import QueryEmbeddingBatcher, embed_queries
+
+
+class RecordingEmbedder:
+    """Embedding em lote que registra os lotes e pode segurar a primeira chamada."""
+
+    def __init__(self, hold_first: bool = False):
+        self.batches = []
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.hold_first = hold_first
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        self.started.set()
+        if self.hold_first and len(self.batches) == 1:
+            self.release.wait(5)
+        return [[float(len(text)), float(i)] for i, text in enumerate(texts)]
+
+
+def run_queued(batcher, embedder, questions):
+    """Segura o líder numa primeira chamada até todas as `questions` estarem na fila."""
+    with ThreadPoolExecutor(max_workers=len(questions) + 1) as pool:
+        first = pool.submit(batcher.embed_query, "primeira")
+        assert embedder.started.wait(5)
+        futures = [pool.submit(batcher.embed_query, question) for question in questions]
+        deadline = time.monotonic() + 5
+        while len(batcher._pending) < len(questions) and time.monotonic() < deadline:
+            time.sleep(0.001)
+        embedder.release.set()
+        results = [future.result(5) for future in futures]
+        first.result(5)
+    return results
+
+
+def test_single_query_is_embedded_immediately():
+    embedder = RecordingEmbedder()
+    batcher = QueryEmbeddingBatcher(None, window_ms=1000, embed_batch=embedder)
+    assert batcher.embed_query("Quem é Capitu?") == [14.0, 0.0]
+    assert embedder.batches == [["Quem é Capitu?"]]
+
+
+def test_concurrent_queries_are_coalesced():
+    embedder = RecordingEmbedder(hold_first=True)
+    batcher = QueryEmbeddingBatcher(None, window_ms=50, max_batch=32, embed_batch=embedder)
+    questions = [f"pergunta {i}" for i in range(8)]
+    results = run_queued(batcher, embedder, questions)
+
+    # A primeira chamada ocupa o líder; as demais se acumulam e saem num só lote
+    assert embedder.batches[0] == ["primeira"]
+    assert sorted(embedder.batches[1]) == sorted(questions)
+    assert len(embedder.batches) == 2
+    # Cada chamador recebe o vetor da própria pergunta
+    for question, vector in zip(questions, results):
+        assert embedder.batches[1][int(vector[1])] == question
+    assert batcher.stats()["largest_batch"] == len(questions)
+
+
+def test_identical_questions_share_one_text():
+    embedder = RecordingEmbedder(hold_first=True)
+    batcher = QueryEmbeddingBatcher(None, window_ms=50, embed_batch=embedder)
+    vectors = run_queued(batcher, embedder, ["Quem é Capitu?"] * 3)
+    assert embedder.batches[1] == ["Quem é Capitu?"]
+    assert vectors[0] == vectors[1] == vectors[2]
+
+
+def test_batches_respect_max_batch():
+    embedder = RecordingEmbedder(hold_first=True)
+    batcher = QueryEmbeddingBatcher(None, window_ms=50, max_batch=3, embed_batch=embedder)
+    run_queued(batcher, embedder, [f"pergunta {i}" for i in range(7)])
+    assert all(len(batch) <= 3 for batch in embedder.batches)
+    assert sum(len(batch) for batch in embedder.batches) == 8
+
+
+def test_errors_reach_the_caller():
+    def failing(texts):
+        raise RuntimeError("quota excedida")
+
+    batcher = QueryEmbeddingBatcher(None, embed_batch=failing)
+    with pytest.raises(RuntimeError, match="quota"):
+        batcher.embed_query("Quem é Capitu?")
+
+
+def test_embed_queries_falls_back_to_one_call_per_text():
+    class Single:
+        def embed_query(self, text):
+            return [float(len(text))]
+
+    assert embed_queries(Single(), ["a", "bb"]) == [[1.0], [2.0]]
@@ -0,0 +1,103 @@
+"""Cache de embeddings em SQLite: chaves por modelo/tipo/conteúdo, acertos e descarte LRU."""
+import hashlib
+from typing import List
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+from src.infrastructure import embedding_cache as embedding_cache_module
+from src.infrastructure.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """Embeddings determinísticos que registram os textos enviados à "API"."""
+
+    def __init__(self):
+        self.inner = DeterministicFakeEmbedding(size=8)
+        self.documents: List[str] = []
+        self.queries: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.documents.extend(texts)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self.queries.append(text)
+        return self.inner.embed_query(text)
+
+
+@pytest.fixture
+def underlying() -> CountingEmbeddings:
+    return CountingEmbeddings()
+
+
+def cached(underlying, tmp_path, model_name="models/teste", **kwargs) -> CachedEmbeddings:
+    return CachedEmbeddings(underlying, model_name, str(tmp_path / "embeddings.sqlite"), **kwargs)
+
+
+def test_key_combines_model_kind_and_text_hash(underlying, tmp_path):
+    cache = cached(underlying, tmp_path)
+    digest = hashlib.sha256("Capitu".encode("utf-8")).hexdigest()
+    assert cache._key("document", "Capitu") == f"models/teste:document:{digest}"
+    assert cache._key("query", "Capitu") != cache._key("document", "Capitu")
+    cache.close()
+
+
+def test_repeated_texts_are_served_from_disk(underlying, tmp_path):
+    cache = cached(underlying, tmp_path)
+    first = cache.embed_documents(["Capitu", "Bentinho", "Capitu"])
+    assert underlying.documents == ["Capitu", "Bentinho"]
+    assert cache.stats() == {"hits": 1, "misses": 2, "entries": 2}
+    cache.close()
+
+    reopened = cached(underlying, tmp_path)
+    assert np.allclose(reopened.embed_documents(["Bentinho", "Capitu"]), [first[1], first[0]])
+    assert underlying.documents == ["Capitu", "Bentinho"]
+    assert reopened.stats()["hits"] == 2
+    reopened.close()
+
+
+def test_queries_and_documents_are_cached_separately(underlying, tmp_path):
+    cache = cached(underlying, tmp_path)
+    cache.embed_documents(["Quem é Capitu?"])
+    cache.embed_query("Quem é Capitu?")
+    cache.embed_query("Quem é Capitu?")
+    assert underlying.queries == ["Quem é Capitu?"]
+    assert cache.stats()["entries"] == 2
+    cache.close()
+
+
+def test_another_model_does_not_reuse_vectors(underlying, tmp_path):
+    cached(underlying, tmp_path).embed_documents(["Capitu"])
+    cached(underlying, tmp_path, model_name="models/outro").embed_documents(["Capitu"])
+    assert underlying.documents == ["Capitu", "Capitu"]
+
+
+def test_least_recently_used_vectors_are_evicted(underlying, tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache_module.time, "time", lambda: now[0])
+    cache = cached(underlying, tmp_path, max_entries=2)
+    cache.embed_documents(["a"])
+    now[0] += 1
+    cache.embed_documents(["b"])
+    now[0] += 1
+    cache.embed_documents(["a"])  # "a" volta a ser o mais recente
+    now[0] += 1
+    cache.embed_documents(["c"])
+    assert cache.stats()["entries"] == 2
+
+    cache.embed_documents(["a", "c"])
+    assert underlying.documents == ["a", "b", "c"]
+    cache.embed_documents(["b"])
+    assert underlying.documents == ["a", "b", "c", "b"]
+    cache.close()
+
+
+def test_batched_queries_share_keys_with_single_queries(underlying, tmp_path):
+    cache = cached(underlying, tmp_path)
+    single = cache.embed_query("Quem é Capitu?")
+    batched = cache.embed_queries(["Quem é Capitu?", "Quem é Escobar?"])
+    assert np.allclose(batched[0], single)
+    assert underlying.queries == ["Quem é Capitu?", "Quem é Escobar?"]
+    cache.close()
@@ -0,0 +1,43 @@
+"""Índices FAISS configuráveis: tipos, ajuste a corpora pequenos e parâmetros do manifesto."""
+import faiss
+import numpy as np
+import pytest
+
+from src.infrastructure.faiss_index import IndexConfig, build_index
+
+
+@pytest.fixture
+def vectors() -> np.ndarray:
+    return np.random.default_rng(3).standard_normal((400, 16)).astype(np.float32)
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw", "ivfpq"])
+def test_every_index_type_finds_an_exact_copy(vectors, index_type):
+    index = build_index(IndexConfig(index_type=index_type, nlist=8, nprobe=8, pq_m=4), vectors)
+    index.add(vectors)
+    _, ids = index.search(vectors[:10], 1)
+    if index_type == "ivfpq":
+        # Quantizado: o vizinho exato deve estar entre os primeiros
+        _, ids = index.search(vectors[:10], 10)
+        assert all(i in row for i, row in enumerate(ids))
+    else:
+        assert ids[:, 0].tolist() == list(range(10))
+
+
+def test_small_corpora_shrink_nlist_and_nbits(vectors):
+    config = IndexConfig(index_type="ivfpq", nlist=1024, nprobe=64, pq_m=5, pq_nbits=8)
+    index = build_index(config, vectors[:100])
+    ivf = faiss.extract_index_ivf(index)
+    # 100 pontos de treino comportam só 2 centróides (39 pontos cada)
+    assert ivf.nlist == 2
+    assert ivf.nprobe == 2
+    assert index.is_trained
+
+
+def test_build_params_only_include_what_changes_the_index():
+    assert IndexConfig(index_type="flat", nprobe=99).build_params() == {"index_type": "flat"}
+    assert IndexConfig(index_type="hnsw", hnsw_m=16, hnsw_ef_construction=40).build_params() == {
+        "index_type": "hnsw", "hnsw_m": 16, "hnsw_ef_construction": 40
+    }
+    # nprobe e efSearch são de busca: mudá-los não exige reconstruir o índice
+    assert "nprobe" not in IndexConfig(index_type="ivf").build_params()
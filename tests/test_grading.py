@@ -0,0 +1,127 @@
+"""Avaliação de relevância: por documento, em lote e reaproveitamento de vereditos."""
+import asyncio
+
+import pytest
+
+from fakes import FAILING, IRRELEVANT, NO_TOOL_CALL, make_doc
+from src.config import settings
+from src.use_cases.nodes import RAGNodes
+
+QUESTION = "Quem é Capitu?"
+
+
+@pytest.fixture
+def nodes(fake_llm):
+    return RAGNodes(retriever=None, corpus_description="o livro 'Dom Casmurro'")
+
+
+def docs(*numbers, irrelevant=(), failing=(), no_tool_call=()):
+    markers = (
+        {n: f" {IRRELEVANT}" for n in irrelevant}
+        | {n: f" {FAILING}" for n in failing}
+        | {n: f" {NO_TOOL_CALL}" for n in no_tool_call}
+    )
+    return [make_doc(f"livro:{n}", f"Trecho {n}{markers.get(n, '')}") for n in numbers]
+
+
+def state_for(documents, question=QUESTION, original_question=QUESTION, **extra):
+    return {"question": question, "original_question": original_question, "documents": documents, **extra}
+
+
+def ids(documents):
+    return [doc.metadata["chunk_id"] for doc in documents]
+
+
+def test_per_document_grading_keeps_relevant_chunks(nodes, fake_llm):
+    result = nodes.grade_documents(state_for(docs(0, 1, 2, irrelevant=(1,))))
+    assert ids(result["documents"]) == ["livro:0", "livro:2"]
+    assert fake_llm.calls == {"RetrievalGrader": 3}
+    assert result["grade_stats"] == {"graded": 3, "reused": 0, "llm_calls": 3}
+
+
+def test_async_grading_matches_sync(nodes):
+    result = asyncio.run(nodes.agrade_documents(state_for(docs(0, 1, irrelevant=(0,)))))
+    assert ids(result["documents"]) == ["livro:1"]
+
+
+def test_grader_errors_only_drop_their_own_document(nodes, fake_llm):
+    result = nodes.grade_documents(state_for(docs(0, 1, 2, failing=(1,))))
+    assert ids(result["documents"]) == ["livro:0", "livro:2"]
+    assert fake_llm.calls == {"RetrievalGrader": 3}
+
+
+def test_grades_without_tool_call_only_drop_their_own_document(nodes, fake_llm):
+    result = nodes.grade_documents(state_for(docs(0, 1, 2, no_tool_call=(0,))))
+    assert ids(result["documents"]) == ["livro:1", "livro:2"]
+    assert result["grade_cache"] == {f"{QUESTION}\x00livro:1": True, f"{QUESTION}\x00livro:2": True}
+    async_result = asyncio.run(nodes.agrade_documents(state_for(docs(0, 1, no_tool_call=(1,)))))
+    assert ids(async_result["documents"]) == ["livro:0"]
+
+
+def test_batch_grading_uses_one_call(nodes, fake_llm, monkeypatch):
+    monkeypatch.setattr(settings, "grading_mode", "batch")
+    result = nodes.grade_documents(state_for(docs(0, 1, 2, irrelevant=(2,))))
+    assert ids(result["documents"]) == ["livro:0", "livro:1"]
+    assert fake_llm.calls == {"BatchRetrievalGrader": 1}
+    assert result["grade_stats"]["llm_calls"] == 1
+
+
+def test_incomplete_batch_falls_back_per_document(nodes, fake_llm, monkeypatch):
+    monkeypatch.setattr(settings, "grading_mode", "batch")
+    fake_llm.batch_verdict_limit = 1
+    result = nodes.grade_documents(state_for(docs(0, 1, 2, irrelevant=(2,))))
+    # Lista de vereditos com tamanho errado: todos os documentos são reavaliados
+    assert ids(result["documents"]) == ["livro:0", "livro:1"]
+    assert fake_llm.calls == {"BatchRetrievalGrader": 1, "RetrievalGrader": 3}
+    assert result["grade_stats"]["llm_calls"] == 4
+
+
+def test_batch_without_tool_call_falls_back_per_document(nodes, fake_llm, monkeypatch):
+    monkeypatch.setattr(settings, "grading_mode", "batch")
+    result = asyncio.run(nodes.agrade_documents(state_for(docs(0, 1, no_tool_call=(1,)))))
+    assert ids(result["documents"]) == ["livro:0"]
+    assert fake_llm.calls == {"BatchRetrievalGrader": 1, "RetrievalGrader": 2}
+
+
+def test_failed_batch_call_falls_back_per_document(nodes, fake_llm, monkeypatch):
+    monkeypatch.setattr(settings, "grading_mode", "batch")
+    result = nodes.grade_documents(state_for(docs(0, 1, failing=(1,))))
+    assert ids(result["documents"]) == ["livro:0"]
+    assert fake_llm.calls == {"BatchRetrievalGrader": 1, "RetrievalGrader": 2}
+
+
+def test_retry_reuses_verdicts_and_approved_chunks(nodes, fake_llm):
+    first = nodes.grade_documents(state_for(docs(0, 1, irrelevant=(1,))))
+
+    # Pergunta reescrita: mesma pergunta original, chunks em parte repetidos
+    retry = nodes.grade_documents(state_for(
+        docs(1, 2), question="Quem é Capitolina?",
+        grade_cache=first["grade_cache"],
+        approved_documents=first["approved_documents"],
+        grade_stats=first["grade_stats"],
+    ))
+    assert fake_llm.calls == {"RetrievalGrader": 3}
+    assert ids(retry["documents"]) == ["livro:2", "livro:0"]
+    assert retry["grade_stats"] == {"graded": 3, "reused": 1, "llm_calls": 3}
+
+
+def test_verdicts_are_not_reused_for_another_original_question(nodes, fake_llm):
+    first = nodes.grade_documents(state_for(docs(0)))
+    nodes.grade_documents(state_for(docs(0), question="Quem é Escobar?", original_question="Quem é Escobar?",
+                                    grade_cache=first["grade_cache"]))
+    assert fake_llm.calls == {"RetrievalGrader": 2}
+
+
+def test_grade_cache_off_grades_everything_again(nodes, fake_llm, monkeypatch):
+    monkeypatch.setattr(settings, "grade_cache_scope", "off")
+    first = nodes.grade_documents(state_for(docs(0, 1)))
+    assert first["grade_cache"] == {}
+    nodes.grade_documents(state_for(docs(0, 1), grade_cache={f"{QUESTION}\x00livro:0": True}))
+    assert fake_llm.calls == {"RetrievalGrader": 4}
+
+
+def test_session_grade_cache_is_bounded(nodes, monkeypatch):
+    monkeypatch.setattr(settings, "grade_cache_scope", "session")
+    monkeypatch.setattr(settings, "grade_cache_max_entries", 2)
+    result = nodes.grade_documents(state_for(docs(0, 1, 2)))
+    assert list(result["grade_cache"]) == [f"{QUESTION}\x00livro:1", f"{QUESTION}\x00livro:2"]
@@ -0,0 +1,64 @@
+"""Grafo com guardrail e busca especulativos em paralelo (LLM e retriever falsos)."""
+import asyncio
+
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+
+from fakes import ANSWER, StaticRetriever, make_doc
+from src.config import settings
+from src.use_cases.graph import RAGGraphBuilder
+
+CONFIG = {"configurable": {"thread_id": "s1"}}
+
+
+@pytest.fixture
+def retriever() -> StaticRetriever:
+    # A busca demora mais que o guardrail: o join precisa esperar por ela
+    return StaticRetriever(documents=[make_doc("livro:0", "Bentinho narra a história.")], delay=0.2)
+
+
+def speculative_builder(retriever, joins) -> RAGGraphBuilder:
+    builder = RAGGraphBuilder(
+        retriever=retriever, corpus_description="o livro 'Dom Casmurro'",
+        speculative=True, checkpointer=MemorySaver()
+    )
+    join = builder._join_speculation
+
+    def recording_join(state):
+        joins.append({"searches": retriever.calls, "generation": state.get("generation")})
+        return join(state)
+
+    builder._join_speculation = recording_join
+    return builder
+
+
+def test_join_waits_for_guardrail_and_retrieval(fake_llm, retriever):
+    joins = []
+    state = speculative_builder(retriever, joins).build().invoke({"question": "Quem narra o livro?"}, CONFIG)
+
+    assert joins == [{"searches": 1, "generation": None}]
+    assert state["generation"] == ANSWER
+    assert [doc.metadata["chunk_id"] for doc in state["documents"]] == ["livro:0"]
+    assert fake_llm.calls["InputGuardrail"] == 1
+
+
+def test_rejected_question_discards_speculative_results(fake_llm, retriever, monkeypatch):
+    monkeypatch.setattr(settings, "speculative_grading", True)
+    fake_llm.valid_question = False
+    joins = []
+    state = speculative_builder(retriever, joins).build().invoke({"question": "Qual a capital da França?"}, CONFIG)
+
+    # A busca especulativa rodou, mas nada dela chega ao estado final nem à geração
+    assert joins[0]["searches"] == 1
+    assert state["generation"].startswith("Não posso responder a isso.")
+    assert state["documents"] == []
+    assert "text" not in fake_llm.calls
+
+
+def test_async_graph_speculates_too(fake_llm, retriever):
+    joins = []
+    app = speculative_builder(retriever, joins).build(async_mode=True)
+    state = asyncio.run(app.ainvoke({"question": "Quem narra o livro?"}, CONFIG))
+
+    assert joins == [{"searches": 1, "generation": None}]
+    assert state["generation"] == ANSWER
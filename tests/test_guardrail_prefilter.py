@@ -0,0 +1,94 @@
+"""Pré-filtro do guardrail: gazetteer do corpus e os caminhos aceitar/escalar/rejeitar."""
+import math
+
+import numpy as np
+import pytest
+
+from src.infrastructure.guardrail_prefilter import CorpusProfile, GuardrailPrefilter
+
+TEXT = (
+    "Naquele dia, Capitu olhou para mim. Eu disse a Capitu que José Dias viria. "
+    "Depois, Capitu e Escobar conversaram com José Dias em Matacavalos, onde Capitu morava. "
+    "Em maio, Dom Pedro passou no Rio com Escobar. A capitu do romance, disse eu a Escobar."
+)
+
+
+def vector_at(degrees: float):
+    """Vetor unitário cujo cosseno com o centróide [1, 0] é cos(degrees)."""
+    return [math.cos(math.radians(degrees)), math.sin(math.radians(degrees))]
+
+
+@pytest.fixture
+def profile() -> CorpusProfile:
+    profile = CorpusProfile()
+    profile.add_text(TEXT)
+    profile.add_vectors(np.array([[2.0, 0.0], [3.0, 0.0]]))
+    return profile.finalize(min_count=2, extra_terms=["Dom Casmurro"])
+
+
+def prefilter(profile, angles):
+    """Pré-filtro cuja "pergunta" é embedada no ângulo definido em `angles`."""
+    return GuardrailPrefilter(
+        [profile], embed_query=lambda question: vector_at(angles[question]),
+        accept_similarity=0.8, reject_similarity=0.35
+    )
+
+
+def test_gazetteer_keeps_recurrent_proper_nouns_and_the_title(profile):
+    assert {"capitu", "escobar", "dias", "dom casmurro"} <= set(profile.terms)
+    # Genéricos e nomes vistos uma vez só não identificam a obra
+    assert not {"dom", "pedro", "rio", "maio", "matacavalos"} & set(profile.terms)
+    assert profile.centroid.tolist() == [1.0, 0.0]
+
+
+def test_close_questions_are_accepted_locally(profile):
+    guard = prefilter(profile, {"Como termina o romance?": 10})
+    assert guard.classify("Como termina o romance?")[0] == "accept"
+    assert guard.stats()["accept"] == 1
+
+
+def test_corpus_terms_escalate_instead_of_accepting(profile):
+    # cos(50°) ≈ 0.64: termo do corpus + similaridade moderada não basta para aceitar
+    guard = prefilter(profile, {"Capitu traiu Bentinho em Guerra e Paz?": 50})
+    decision, reason = guard.classify("Capitu traiu Bentinho em Guerra e Paz?")
+    assert decision == "escalate"
+    assert "capitu" in reason
+
+
+def test_corpus_terms_override_a_distant_embedding(profile):
+    guard = prefilter(profile, {"Quem narra Dom Casmurro?": 85})
+    assert guard.matched_terms("Quem narra Dom Casmurro?") == ["dom casmurro"]
+    assert guard.classify("Quem narra Dom Casmurro?")[0] == "escalate"
+
+
+def test_distant_questions_without_terms_are_rejected(profile):
+    guard = prefilter(profile, {"Qual a capital da França?": 80})
+    assert guard.classify("Qual a capital da França?")[0] == "reject"
+
+
+def test_ambiguous_questions_escalate(profile):
+    guard = prefilter(profile, {"O que acontece no fim?": 50, "Dom Pedro aparece?": 85})
+    assert guard.classify("O que acontece no fim?")[0] == "escalate"
+    # "Dom" sozinho é genérico: sem termos e longe do corpus, rejeita
+    assert guard.classify("Dom Pedro aparece?")[0] == "reject"
+
+
+def test_errors_escalate_and_counters_add_up(profile):
+    def failing(question):
+        raise RuntimeError("sem rede")
+
+    guard = GuardrailPrefilter([profile], embed_query=failing)
+    assert guard.classify("Quem é Capitu?")[0] == "escalate"
+
+    angles = {"perto": 5, "longe": 89, "meio": 50}
+    guard = prefilter(profile, angles)
+    for question in ("perto", "longe", "meio", "perto"):
+        guard.classify(question)
+    assert guard.stats() == {"accept": 2, "reject": 1, "escalate": 1, "local_rate": 0.75}
+
+
+def test_profiles_round_trip(profile, tmp_path):
+    profile.save(str(tmp_path))
+    loaded = CorpusProfile.load(str(tmp_path))
+    assert loaded.terms == profile.terms
+    assert loaded.centroid.tolist() == profile.centroid.tolist()
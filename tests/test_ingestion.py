@@ -0,0 +1,111 @@
+"""Ingestão: lotes de embeddings com checkpoint e reaproveitamento do índice pelo manifesto."""
+from typing import List
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+from fakes import make_doc
+from src.config import settings
+from src.domain.catalog import Book
+from src.infrastructure import vector_store as vector_store_module
+from src.infrastructure.vector_store import BookShard, EmbeddingIngestor
+
+
+class CountingEmbeddings(Embeddings):
+    """Embeddings determinísticos que contam os textos embedados e podem falhar num lote."""
+
+    def __init__(self, fail_on_call=None, error=None):
+        self.inner = DeterministicFakeEmbedding(size=16)
+        self.calls = 0
+        self.texts = 0
+        self.fail_on_call = fail_on_call
+        self.error = error or RuntimeError("falha na API")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise self.error
+        self.texts += len(texts)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.inner.embed_query(text)
+
+
+def chunks(count: int):
+    return [make_doc(f"livro:{i}", f"Trecho número {i} de Dom Casmurro") for i in range(count)]
+
+
+def test_batches_come_back_in_document_order(tmp_path):
+    embeddings = CountingEmbeddings()
+    ingestor = EmbeddingIngestor(embeddings, str(tmp_path / "ckpt"), batch_size=3, max_concurrency=4)
+    docs = chunks(10)
+    batches = list(ingestor.embed_batches(docs))
+
+    assert [len(batch) for batch, _ in batches] == [3, 3, 3, 1]
+    assert [doc for batch, _ in batches for doc in batch] == docs
+    expected = embeddings.inner.embed_documents([doc.page_content for doc in docs])
+    got = np.concatenate([vectors for _, vectors in batches])
+    assert np.allclose(got, expected)
+
+
+def test_interrupted_ingestion_resumes_from_checkpoints(tmp_path):
+    checkpoint_dir = str(tmp_path / "ckpt")
+    failing = CountingEmbeddings(fail_on_call=3)
+    with pytest.raises(RuntimeError):
+        list(EmbeddingIngestor(failing, checkpoint_dir, batch_size=2, max_concurrency=1).embed_batches(chunks(8)))
+
+    resumed = CountingEmbeddings()
+    batches = list(EmbeddingIngestor(resumed, checkpoint_dir, batch_size=2, max_concurrency=1).embed_batches(chunks(8)))
+    assert sum(len(batch) for batch, _ in batches) == 8
+    # Os dois lotes gravados antes da falha não são embedados de novo
+    assert resumed.texts == 4
+
+
+def test_rate_limits_are_retried_with_backoff(tmp_path, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(vector_store_module.time, "sleep", sleeps.append)
+    embeddings = CountingEmbeddings(fail_on_call=1, error=RuntimeError("429 Resource exhausted"))
+    ingestor = EmbeddingIngestor(embeddings, str(tmp_path / "ckpt"), batch_size=5, backoff_seconds=0.5)
+    list(ingestor.embed_batches(chunks(3)))
+    assert embeddings.calls == 2
+    assert len(sleeps) == 1
+
+
+def test_other_errors_are_not_retried(tmp_path):
+    embeddings = CountingEmbeddings(fail_on_call=1, error=ValueError("texto inválido"))
+    ingestor = EmbeddingIngestor(embeddings, str(tmp_path / "ckpt"), batch_size=5)
+    with pytest.raises(ValueError):
+        list(ingestor.embed_batches(chunks(3)))
+    assert embeddings.calls == 1
+
+
+@pytest.fixture
+def book(tmp_path) -> Book:
+    path = tmp_path / "dom_casmurro.txt"
+    paragraphs = [f"Capítulo {i}. Bentinho lembra de Capitu e de Escobar na rua de Matacavalos." for i in range(80)]
+    path.write_text("\n\n".join(paragraphs), encoding="utf-8")
+    return Book(book_id="dom_casmurro", title="Dom Casmurro", url="https://example.invalid/dom.txt", storage_path=str(path))
+
+
+def test_saved_index_is_reused_while_the_manifest_matches(tmp_path, book, monkeypatch):
+    monkeypatch.setattr(settings, "chunk_size", 300)
+    monkeypatch.setattr(settings, "chunk_overlap", 50)
+    index_root = str(tmp_path / "vectorstore")
+
+    first = CountingEmbeddings()
+    BookShard(book, first, index_root).load_or_build()
+    assert first.texts > 0
+
+    reused = CountingEmbeddings()
+    shard = BookShard(book, reused, index_root)
+    shard.load_or_build()
+    assert reused.calls == 0
+    assert shard.vectorstore.index.ntotal == first.texts
+
+    # Outro tamanho de chunk muda o manifesto: o índice é refeito
+    monkeypatch.setattr(settings, "chunk_size", 200)
+    rebuilt = CountingEmbeddings()
+    BookShard(book, rebuilt, index_root).load_or_build()
+    assert rebuilt.texts > first.texts
@@ -0,0 +1,62 @@
+"""Índice BM25 por shard e o analisador léxico em português."""
+import json
+import os
+
+from src.infrastructure.lexical_index import LEXICAL_FILE, BM25Index
+from src.utils.text import analyze, fold_accents, stem
+
+
+def small_index() -> BM25Index:
+    index = BM25Index()
+    index.add("livro:0", "Capitu tinha olhos de cigana oblíqua e dissimulada.")
+    index.add("livro:1", "José Dias tratava Bentinho com superlativos.")
+    index.add("livro:2", "Escobar e Sancha moravam no Andaraí; Capitu visitava Sancha.")
+    return index
+
+
+def test_analyzer_folds_accents_and_drops_stopwords():
+    assert fold_accents("Capitú Ação") == "capitu acao"
+    assert analyze("Os olhos de Capitu não são de ressaca") == ["olho", "capitu", "ressac"]
+
+
+def test_stemmer_unifies_plural_and_gender():
+    assert stem("superlativos") == stem("superlativo") == "superlativ"
+    assert stem("menina") == stem("menino")
+    assert stem("cancoes") == stem("cancao") == "canca"
+    assert stem("finalmente") == "final"
+
+
+def test_bm25_prefers_documents_matching_more_rare_terms():
+    ids = [doc_id for doc_id, _ in small_index().search("Capitu e Sancha", k=3)]
+    assert ids == ["livro:2", "livro:0"]
+
+
+def test_bm25_matches_accent_and_inflection_variants():
+    ranked = small_index().search("superlativo de jose", k=3)
+    assert ranked[0][0] == "livro:1"
+    assert ranked[0][1] > 0
+
+
+def test_bm25_empty_index_and_unknown_terms():
+    assert BM25Index().search("Capitu") == []
+    assert small_index().search("Matacavalos") == []
+
+
+def test_save_and_load_keep_the_ranking(tmp_path):
+    index = small_index()
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert len(loaded) == 3
+    assert loaded.search("Capitu e Sancha") == index.search("Capitu e Sancha")
+
+
+def test_load_rejects_other_analyzer_versions(tmp_path):
+    small_index().save(str(tmp_path))
+    path = os.path.join(str(tmp_path), LEXICAL_FILE)
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    data["analyzer_version"] = -1
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    assert BM25Index.load(str(tmp_path)) is None
+    assert BM25Index.load(str(tmp_path / "inexistente")) is None
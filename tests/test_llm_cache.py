@@ -0,0 +1,86 @@
+"""Memoização das chamadas ao LLM: consulta, gravação, chave por chain/schema e descarte LRU."""
+import pytest
+from langchain_core.outputs import Generation
+from pydantic import BaseModel, Field
+
+from fakes import ANSWER, FakeChatModel
+from src.config import settings
+from src.infrastructure import llm_cache as llm_cache_module
+from src.infrastructure.llm_cache import SQLiteLLMCache
+from src.infrastructure.llm_factory import LLMFactory
+
+
+class Verdict(BaseModel):
+    binary_score: str = Field(description="'sim' ou 'nao'")
+
+
+class OtherVerdict(BaseModel):
+    binary_score: str = Field(description="'sim' ou 'nao'")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SQLiteLLMCache(str(tmp_path / "llm.sqlite"), max_entries=3)
+
+
+def test_repeated_prompt_is_answered_from_disk(cache, tmp_path):
+    llm = FakeChatModel(calls={}, cache=cache)
+    assert llm.invoke("Quem é Capitu?").content == ANSWER
+    assert llm.invoke("Quem é Capitu?").content == ANSWER
+    assert llm.calls == {"text": 1}
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+    reopened = FakeChatModel(calls={}, cache=SQLiteLLMCache(str(tmp_path / "llm.sqlite")))
+    assert reopened.invoke("Quem é Capitu?").content == ANSWER
+    assert reopened.calls == {}
+
+
+def test_structured_output_is_keyed_by_schema(cache):
+    llm = FakeChatModel(calls={}, cache=cache)
+    for schema in (Verdict, Verdict, OtherVerdict):
+        result = llm.with_structured_output(schema, method="function_calling").invoke("O trecho é relevante?")
+        assert result.binary_score == "sim"
+    # Mesmo prompt com outro schema vinculado não reaproveita a resposta
+    assert llm.calls == {"Verdict": 1, "OtherVerdict": 1}
+
+
+def test_unreadable_entries_are_dropped(cache):
+    cache.update("prompt", "llm", [Generation(text="ok")])
+    with cache._lock:
+        cache._conn.execute("UPDATE llm_calls SET generations = 'quebrado'")
+    assert cache.lookup("prompt", "llm") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_answers_are_evicted(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache_module.time, "time", lambda: now[0])
+    for prompt in ("a", "b", "c"):
+        now[0] += 1
+        cache.update(prompt, "llm", [Generation(text=prompt)])
+    now[0] += 1
+    assert cache.lookup("a", "llm")[0].text == "a"
+    now[0] += 1
+    cache.update("d", "llm", [Generation(text="d")])
+
+    assert cache.stats()["entries"] == 3
+    assert cache.lookup("b", "llm") is None
+    assert [cache.lookup(prompt, "llm")[0].text for prompt in ("a", "c", "d")] == ["a", "c", "d"]
+
+
+def test_cache_is_enabled_per_chain(monkeypatch, cache):
+    monkeypatch.setattr(LLMFactory, "_llm_cache", cache)
+    monkeypatch.setattr(settings, "llm_cache_enabled", True)
+    monkeypatch.setattr(settings, "temperature", 0.0)
+    monkeypatch.setattr(settings, "llm_cache_generation", False)
+    monkeypatch.setattr(settings, "llm_cache_grader", True)
+
+    assert LLMFactory._cache_for("grader") is cache
+    assert LLMFactory._cache_for("generation") is False
+    assert LLMFactory._cache_for(None) is False
+    with pytest.raises(ValueError):
+        LLMFactory._cache_for("desconhecida")
+
+    # Saídas não determinísticas nunca são memoizadas
+    monkeypatch.setattr(settings, "temperature", 0.7)
+    assert LLMFactory._cache_for("grader") is False
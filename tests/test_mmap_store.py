@@ -0,0 +1,127 @@
+"""Shards mapeados em memória: docstore por deslocamentos, ids posicionais e cópia float16."""
+import os
+
+import faiss
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from fakes import make_doc
+from src.infrastructure.mmap_store import (
+    INDEX_FILE,
+    MmapDocstore,
+    PositionalIds,
+    load_mmap_vectorstore,
+    write_chunk_store,
+    write_fp16_index,
+)
+
+PREFIX = "livro:"
+
+
+@pytest.fixture
+def embeddings() -> DeterministicFakeEmbedding:
+    return DeterministicFakeEmbedding(size=16)
+
+
+@pytest.fixture
+def documents():
+    # Textos com acentos e tamanhos diferentes para exercitar a tabela de deslocamentos em bytes
+    return [
+        make_doc(f"{PREFIX}{i}", f"Trecho {i}: " + "Capitu é ção " * (i % 7), capitulo=i // 10)
+        for i in range(60)
+    ]
+
+
+@pytest.fixture
+def shard(tmp_path, embeddings, documents):
+    """Mesmo shard em memória e gravado no formato mmap."""
+    ids = [doc.metadata["chunk_id"] for doc in documents]
+    in_memory = FAISS.from_documents(documents, embeddings, ids=ids)
+    folder = str(tmp_path)
+    faiss.write_index(in_memory.index, os.path.join(folder, INDEX_FILE))
+    write_chunk_store(folder, documents)
+    return in_memory, folder
+
+
+def test_positional_ids_map_index_positions_to_chunk_ids():
+    ids = PositionalIds(PREFIX, 3)
+    assert [ids[i] for i in ids] == ["livro:0", "livro:1", "livro:2"]
+    assert ids[np.int64(2)] == "livro:2"
+    assert len(ids) == 3
+    with pytest.raises(KeyError):
+        ids[3]
+
+
+def test_docstore_returns_the_same_documents(shard, documents):
+    _, folder = shard
+    docstore = MmapDocstore(folder, PREFIX)
+    assert len(docstore) == len(documents)
+    for doc in documents:
+        found = docstore.search(doc.metadata["chunk_id"])
+        assert found.page_content == doc.page_content
+        assert found.metadata == doc.metadata
+
+
+def test_docstore_reports_unknown_ids(shard):
+    _, folder = shard
+    docstore = MmapDocstore(folder, PREFIX)
+    for unknown in ("livro:60", "livro:-1", "livro:x", "outro:0"):
+        assert isinstance(docstore.search(unknown), str)
+
+
+def test_mmap_search_matches_in_memory_search(shard, embeddings):
+    in_memory, folder = shard
+    mapped = load_mmap_vectorstore(folder, embeddings, PREFIX)
+    for query in ("Trecho 3", "Capitu é ção", "Trecho 41: Capitu"):
+        expected = in_memory.similarity_search_with_score(query, k=5)
+        got = mapped.similarity_search_with_score(query, k=5)
+        assert [doc.metadata["chunk_id"] for doc, _ in got] == [doc.metadata["chunk_id"] for doc, _ in expected]
+        assert [score for _, score in got] == pytest.approx([score for _, score in expected])
+
+
+def test_fp16_copy_keeps_recall(shard, embeddings):
+    in_memory, folder = shard
+    assert write_fp16_index(folder, in_memory.index)
+    mapped = load_mmap_vectorstore(folder, embeddings, PREFIX, fp16=True)
+    assert isinstance(mapped.index, faiss.IndexScalarQuantizer)
+
+    queries = np.random.default_rng(5).standard_normal((20, 16)).astype(np.float32)
+    _, exact = in_memory.index.search(queries, 5)
+    _, approx = mapped.index.search(queries, 5)
+    recall = np.mean([len(set(e) & set(a)) / 5 for e, a in zip(exact, approx)])
+    assert recall >= 0.95
+
+
+def test_fp16_is_skipped_for_non_flat_indexes(tmp_path):
+    quantizer = faiss.IndexFlatL2(16)
+    assert not write_fp16_index(str(tmp_path), faiss.IndexIVFFlat(quantizer, 16, 4))
+
+
+def test_mismatched_chunk_store_is_rejected(shard, embeddings, documents):
+    _, folder = shard
+    write_chunk_store(folder, documents[:-1])
+    with pytest.raises(ValueError):
+        load_mmap_vectorstore(folder, embeddings, PREFIX)
+
+
+def test_offset_records_read_their_text_from_the_corpus(tmp_path):
+    corpus = "CAPÍTULO I\n\nCapitu e Escobar.\n\nJosé Dias chegou."
+    corpus_path = tmp_path / "livro.txt"
+    corpus_path.write_text(corpus, encoding="utf-8")
+    data = corpus.encode("utf-8")
+    spans = [(0, data.index(b"\n\nJos")), (data.index(b"Jos"), len(data))]
+    documents = [
+        make_doc(f"{PREFIX}{i}", data[start:end].decode("utf-8"), start=start, end=end)
+        for i, (start, end) in enumerate(spans)
+    ]
+    folder = tmp_path / "shard"
+    folder.mkdir()
+    write_chunk_store(str(folder), documents, offsets_only=True)
+
+    assert b"Escobar" not in (folder / "chunks.bin").read_bytes()
+    docstore = MmapDocstore(str(folder), PREFIX, corpus_path=str(corpus_path))
+    assert [docstore.search(f"{PREFIX}{i}").page_content for i in range(2)] == [doc.page_content for doc in documents]
+    with pytest.raises(ValueError):
+        MmapDocstore(str(folder), PREFIX).search(f"{PREFIX}0")
@@ -0,0 +1,101 @@
+"""Fusão de chunks sobrepostos ou adjacentes (merge_adjacent) e MMR com os vetores do índice."""
+from typing import List
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from fakes import make_doc
+from src.infrastructure.postprocessing import ContextPostprocessor, merge_adjacent
+from src.infrastructure.retrievers import ShardedRetriever
+
+TEXT = "Capitu e Bentinho cresceram juntos na rua de Matacavalos, vizinhos de muro."
+
+
+def recursive_chunk(chunk_id: str, start: int, end: int):
+    return make_doc(chunk_id, TEXT[start:end], start_index=start)
+
+
+def chapter_chunk(chunk_id: str, start: int, end: int, chapter_index: int = 1):
+    return make_doc(chunk_id, f"trecho {start}-{end}", start=start, end=end, chapter_index=chapter_index)
+
+
+def test_overlapping_recursive_chunks_keep_the_overlap_once():
+    merged = merge_adjacent([recursive_chunk("livro:1", 20, 60), recursive_chunk("livro:0", 0, 30)])
+    assert len(merged) == 1
+    assert merged[0].page_content == TEXT[0:60]
+    assert merged[0].metadata["merged_chunk_ids"] == ["livro:0", "livro:1"]
+    assert merged[0].metadata["chunk_id"] == "livro:0+livro:1"
+
+
+def test_chunk_inside_another_adds_no_text():
+    merged = merge_adjacent([recursive_chunk("livro:0", 0, 60), recursive_chunk("livro:1", 10, 30)])
+    assert [doc.page_content for doc in merged] == [TEXT[0:60]]
+
+
+def test_adjacent_chunks_merge_within_max_gap():
+    docs = [chapter_chunk("livro:0", 0, 100), chapter_chunk("livro:1", 103, 200)]
+    assert len(merge_adjacent(docs, max_gap=0)) == 2
+
+    merged = merge_adjacent(docs, max_gap=4)
+    assert len(merged) == 1
+    assert merged[0].page_content == "trecho 0-100\n\ntrecho 103-200"
+    assert (merged[0].metadata["start"], merged[0].metadata["end"]) == (0, 200)
+
+
+def test_chunks_from_other_chapters_or_books_are_not_merged():
+    docs = [
+        chapter_chunk("livro:0", 0, 100, chapter_index=1),
+        chapter_chunk("livro:1", 100, 200, chapter_index=2),
+        chapter_chunk("outro:0", 100, 200, chapter_index=1),
+    ]
+    assert len(merge_adjacent(docs)) == 3
+
+
+def test_merged_document_takes_the_best_rank():
+    docs = [
+        chapter_chunk("livro:9", 900, 1000),
+        make_doc("sem_offset:0", "chunk sem deslocamento"),
+        chapter_chunk("livro:1", 100, 200),
+        chapter_chunk("livro:0", 0, 100),
+    ]
+    merged = merge_adjacent(docs)
+    assert [doc.metadata["chunk_id"] for doc in merged] == ["livro:9", "sem_offset:0", "livro:0+livro:1"]
+
+
+def test_postprocessor_without_retriever_only_merges():
+    processor = ContextPostprocessor(retriever=None, merge=True, mmr_k=1)
+    docs = [recursive_chunk("livro:0", 0, 30), recursive_chunk("livro:1", 20, 60), make_doc("x:0", "outro")]
+    assert len(processor.process("pergunta", docs)) == 2
+
+
+class QueryOnlyEmbeddings(Embeddings):
+    """Pergunta sempre no eixo x; embedar documentos seria uma chamada de rede indevida."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        raise AssertionError("o MMR não deve embedar documentos")
+
+    def embed_query(self, text: str) -> List[float]:
+        return [1.0, 0.0]
+
+
+def mmr_retriever() -> ShardedRetriever:
+    # livro:1 quase repete livro:0; livro:2 é menos relevante, mas traz outra informação
+    vectors = {"livro:0": [1.0, 0.0], "livro:1": [0.99, 0.14], "livro:2": [0.7, 0.7]}
+    embeddings = QueryOnlyEmbeddings()
+    store = FAISS.from_embeddings(
+        [(chunk_id, vector) for chunk_id, vector in vectors.items()], embeddings,
+        metadatas=[make_doc(chunk_id, chunk_id).metadata for chunk_id in vectors], ids=list(vectors)
+    )
+    return ShardedRetriever(shards={"livro": store}, embeddings=embeddings)
+
+
+def test_mmr_uses_the_stored_vectors():
+    processor = ContextPostprocessor(mmr_retriever(), merge=False, mmr_k=2, mmr_lambda=0.3)
+    docs = [make_doc(f"livro:{i}", f"trecho {i}") for i in range(3)]
+    assert [doc.metadata["chunk_id"] for doc in processor.process("pergunta", docs)] == ["livro:0", "livro:2"]
+
+
+def test_mmr_without_stored_vectors_keeps_the_search_order():
+    processor = ContextPostprocessor(mmr_retriever(), merge=False, mmr_k=2)
+    docs = [make_doc("outro:0", "a"), make_doc("livro:2", "b"), make_doc("livro:0", "c")]
+    assert [doc.metadata["chunk_id"] for doc in processor.process("pergunta", docs)] == ["outro:0", "livro:2"]
@@ -0,0 +1,148 @@
+"""Reranqueamento local: sobreposição léxica, vetores do índice, corte por top_n/limiar e combinação ponderada."""
+from typing import List, Sequence
+
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+from fakes import make_doc
+from src.config import settings
+from src.infrastructure.reranker import (
+    CompositeReranker,
+    EmbeddingSimilarityReranker,
+    LexicalOverlapReranker,
+    Reranker,
+    build_reranker,
+)
+from src.infrastructure.retrievers import ShardedRetriever
+
+DOCS = [
+    make_doc("livro:0", "Escobar morreu afogado no mar."),
+    make_doc("livro:1", "Capitu tinha olhos de ressaca."),
+    make_doc("livro:2", "Os olhos de Capitu eram de cigana oblíqua e dissimulada."),
+]
+
+
+class FixedReranker(Reranker):
+    def __init__(self, scores: List[float]):
+        self.scores = scores
+
+    def score(self, question: str, documents: Sequence) -> List[float]:
+        return self.scores[:len(documents)]
+
+
+class CountingEmbeddings(Embeddings):
+    """Embeddings determinísticos que contam as chamadas de rede simuladas."""
+
+    def __init__(self):
+        self.inner = DeterministicFakeEmbedding(size=16)
+        self.documents = 0
+        self.queries = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.documents += 1
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self.queries += 1
+        return self.inner.embed_query(text)
+
+
+@pytest.fixture
+def embeddings() -> CountingEmbeddings:
+    return CountingEmbeddings()
+
+
+@pytest.fixture
+def retriever(embeddings) -> ShardedRetriever:
+    vectors = embeddings.inner.embed_documents([doc.page_content for doc in DOCS])
+    store = FAISS.from_embeddings(
+        [(doc.page_content, vector) for doc, vector in zip(DOCS, vectors)], embeddings,
+        metadatas=[doc.metadata for doc in DOCS], ids=[doc.metadata["chunk_id"] for doc in DOCS]
+    )
+    return ShardedRetriever(shards={"livro": store}, embeddings=embeddings)
+
+
+def cosine(matrix, query) -> List[float]:
+    matrix, query = np.asarray(matrix), np.asarray(query)
+    return (matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))).tolist()
+
+
+def ids(scored):
+    return [doc.metadata["chunk_id"] for doc, _ in scored]
+
+
+def test_lexical_overlap_is_the_fraction_of_question_terms():
+    scores = LexicalOverlapReranker().score("Olhos de cigana de Capitu?", DOCS)
+    # Termos da pergunta: "olho", "cigan", "capitu"
+    assert scores == pytest.approx([0.0, 2 / 3, 1.0])
+    assert LexicalOverlapReranker().score("de que?", DOCS) == [0.0, 0.0, 0.0]
+
+
+def test_rerank_orders_and_cuts_by_top_n_and_threshold():
+    reranker = LexicalOverlapReranker()
+    assert ids(reranker.rerank("olhos de Capitu", DOCS)) == ["livro:1", "livro:2", "livro:0"]
+    assert ids(reranker.rerank("olhos de Capitu", DOCS, top_n=1)) == ["livro:1"]
+    assert ids(reranker.rerank("Olhos de cigana de Capitu?", DOCS, threshold=0.5)) == ["livro:2", "livro:1"]
+    assert reranker.rerank("olhos", []) == []
+
+
+def test_composite_blends_weighted_scores():
+    blended = CompositeReranker([(FixedReranker([1.0, 0.0, 0.5]), 0.3), (FixedReranker([0.0, 1.0, 0.5]), 0.7)])
+    assert blended.score("pergunta", DOCS) == pytest.approx([0.3, 0.7, 0.5])
+    assert ids(blended.rerank("pergunta", DOCS)) == ["livro:1", "livro:2", "livro:0"]
+
+
+def test_embedding_scores_use_the_stored_vectors(retriever, embeddings):
+    question = "Olhos de Capitu"
+    scores = EmbeddingSimilarityReranker(retriever).score(question, DOCS)
+    stored = embeddings.inner.embed_documents([doc.page_content for doc in DOCS])
+    assert scores == pytest.approx(cosine(stored, embeddings.inner.embed_query(question)), abs=1e-5)
+    # Só a pergunta é embedada; os documentos nunca voltam à API
+    assert (embeddings.documents, embeddings.queries) == (0, 1)
+
+
+def test_merged_documents_score_with_the_mean_of_their_chunks(retriever, embeddings):
+    merged = make_doc("livro:1+livro:2", "texto fundido", merged_chunk_ids=["livro:1", "livro:2"])
+    score = EmbeddingSimilarityReranker(retriever).score("Capitu", [merged])
+    mean = np.mean(embeddings.inner.embed_documents([DOCS[1].page_content, DOCS[2].page_content]), axis=0)
+    assert score == pytest.approx(cosine([mean], embeddings.inner.embed_query("Capitu")), abs=1e-5)
+    assert embeddings.documents == 0
+
+
+def test_unknown_chunks_fall_back_to_lexical_overlap(retriever, embeddings):
+    unknown = [*DOCS[:2], make_doc("outro_livro:0", "Capitu de olhos de cigana.")]
+    scores = EmbeddingSimilarityReranker(retriever).score("Olhos de cigana de Capitu?", unknown)
+    assert scores == LexicalOverlapReranker().score("Olhos de cigana de Capitu?", unknown)
+    assert (embeddings.documents, embeddings.queries) == (0, 0)
+
+
+def test_hybrid_blends_lexical_and_stored_vector_scores(retriever, embeddings, monkeypatch):
+    monkeypatch.setattr(settings, "rerank_enabled", True)
+    monkeypatch.setattr(settings, "rerank_method", "hybrid")
+    monkeypatch.setattr(settings, "rerank_lexical_weight", 0.25)
+    question = "Olhos de cigana de Capitu?"
+    lexical = np.asarray(LexicalOverlapReranker().score(question, DOCS))
+    dense = np.asarray(EmbeddingSimilarityReranker(retriever).score(question, DOCS))
+    assert build_reranker(retriever).score(question, DOCS) == pytest.approx(0.25 * lexical + 0.75 * dense, abs=1e-5)
+    assert embeddings.documents == 0
+
+
+def test_build_reranker_follows_settings(monkeypatch, retriever):
+    monkeypatch.setattr(settings, "rerank_enabled", False)
+    assert build_reranker(retriever) is None
+
+    monkeypatch.setattr(settings, "rerank_enabled", True)
+    monkeypatch.setattr(settings, "rerank_method", "lexical")
+    assert isinstance(build_reranker(retriever), LexicalOverlapReranker)
+
+    monkeypatch.setattr(settings, "rerank_method", "embedding")
+    assert isinstance(build_reranker(retriever), EmbeddingSimilarityReranker)
+
+    monkeypatch.setattr(settings, "rerank_method", "hybrid")
+    monkeypatch.setattr(settings, "rerank_lexical_weight", 0.25)
+    hybrid = build_reranker(retriever)
+    assert [weight for _, weight in hybrid.components] == [0.25, 0.75]
+    # Sem um retriever com vetores gravados, o modo híbrido cai para o reranker léxico
+    assert isinstance(build_reranker(None), LexicalOverlapReranker)
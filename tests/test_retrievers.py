@@ -0,0 +1,125 @@
+"""Busca em shards: top-k global, seleção de livros, fusão RRF do modo híbrido, caches e get_by_ids."""
+from typing import Dict, List, Tuple
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+from fakes import make_doc
+from src.infrastructure.retrievers import ShardedRetriever, reciprocal_rank_fusion
+from src.utils.cache import LRUCache
+
+
+class FakeShard:
+    """Vectorstore com ranking denso fixo (distâncias L2) e docstore em memória."""
+
+    def __init__(self, ranked: List[Tuple[str, float]], texts: Dict[str, str]):
+        self.docstore = InMemoryDocstore({chunk_id: make_doc(chunk_id, text) for chunk_id, text in texts.items()})
+        self.ranked = ranked
+        self.searches = 0
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int):
+        self.searches += 1
+        return [(self.docstore.search(chunk_id), score) for chunk_id, score in self.ranked[:k]]
+
+
+class FakeLexical:
+    def __init__(self, ranked: List[Tuple[str, float]]):
+        self.ranked = ranked
+
+    def search(self, query: str, k: int):
+        return self.ranked[:k]
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        return [1.0, 0.0]
+
+
+def test_rrf_sums_reciprocal_ranks():
+    # a: 1/61 + 1/62, c: 1/63 + 1/61, b: 1/62
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60) == ["a", "c", "b"]
+
+
+def test_rrf_ties_keep_first_seen_order():
+    assert reciprocal_rank_fusion([["a", "b"], ["b", "a"]], k=60) == ["a", "b"]
+    assert reciprocal_rank_fusion([["x"], ["y"]], k=60) == ["x", "y"]
+
+
+def test_rrf_favours_documents_found_by_both_rankings():
+    fused = reciprocal_rank_fusion([["a", "b", "c", "d"], ["d", "e"]], k=1)
+    assert fused[0] == "d"
+
+
+def _hybrid_retriever(k: int = 2) -> Tuple[ShardedRetriever, FakeShard]:
+    shard = FakeShard(
+        ranked=[("livro:0", 0.1), ("livro:1", 0.2), ("livro:2", 0.3)],
+        texts={"livro:0": "Capitu", "livro:1": "Bentinho", "livro:2": "Escobar", "livro:3": "José Dias"},
+    )
+    lexical = FakeLexical([("livro:3", 9.0), ("livro:1", 5.0)])
+    retriever = ShardedRetriever(
+        shards={"livro": shard}, lexical={"livro": lexical}, embeddings=FakeEmbeddings(),
+        k=k, mode="hybrid", fetch_k=3, rrf_k=60
+    )
+    return retriever, shard
+
+
+def test_hybrid_fuses_dense_and_lexical_rankings():
+    retriever, _ = _hybrid_retriever(k=3)
+    ids = [doc.metadata["chunk_id"] for doc in retriever.invoke("José Dias e Bentinho")]
+    # livro:1 aparece nas duas listas; livro:0 e livro:3 empatam (1º em uma lista só)
+    assert ids == ["livro:1", "livro:0", "livro:3"]
+
+
+def test_hybrid_loads_lexical_only_hits_from_docstore():
+    retriever, _ = _hybrid_retriever(k=4)
+    docs = {doc.metadata["chunk_id"]: doc for doc in retriever.invoke("José Dias")}
+    assert docs["livro:3"].page_content == "José Dias"
+
+
+def test_dense_mode_ignores_lexical_index():
+    retriever, _ = _hybrid_retriever(k=2)
+    retriever.mode = "dense"
+    assert [doc.metadata["chunk_id"] for doc in retriever.invoke("José Dias")] == ["livro:0", "livro:1"]
+
+
+def test_shards_are_merged_by_distance():
+    first = FakeShard([("a:0", 0.5), ("a:1", 0.9)], {"a:0": "um", "a:1": "dois"})
+    second = FakeShard([("b:0", 0.1), ("b:1", 0.7)], {"b:0": "três", "b:1": "quatro"})
+    retriever = ShardedRetriever(shards={"a": first, "b": second}, embeddings=FakeEmbeddings(), k=3)
+    assert [doc.metadata["chunk_id"] for doc in retriever.invoke("pergunta")] == ["b:0", "a:0", "b:1"]
+
+
+def test_book_ids_restrict_the_search():
+    first = FakeShard([("a:0", 0.5)], {"a:0": "um"})
+    second = FakeShard([("b:0", 0.1)], {"b:0": "dois"})
+    retriever = ShardedRetriever(shards={"a": first, "b": second}, embeddings=FakeEmbeddings(), k=3, book_ids=["a", "c"])
+    assert [doc.metadata["chunk_id"] for doc in retriever.invoke("pergunta")] == ["a:0"]
+    assert second.searches == 0
+
+
+def test_get_by_ids_skips_unknown_shards_and_chunks():
+    retriever, _ = _hybrid_retriever()
+    docs = retriever.get_by_ids(["livro:2", "outro:0", "livro:99", "livro:0"])
+    assert [doc.metadata["chunk_id"] for doc in docs] == ["livro:2", "livro:0"]
+
+
+def test_result_and_embedding_caches_skip_repeated_searches():
+    retriever, shard = _hybrid_retriever()
+    retriever.query_embedding_cache = LRUCache(16)
+    retriever.result_cache = LRUCache(16)
+
+    first = retriever.invoke("Quem é Capitu?")
+    second = retriever.invoke("  quem é   capitu? ")
+    assert [d.metadata["chunk_id"] for d in first] == [d.metadata["chunk_id"] for d in second]
+    assert shard.searches == 1
+    assert retriever.embeddings.calls == 1
+
+
+def test_retriever_sees_shards_replaced_in_place():
+    shards = {"livro": FakeShard([("livro:0", 0.1)], {"livro:0": "antigo"})}
+    retriever = ShardedRetriever(shards=shards, embeddings=FakeEmbeddings(), k=1)
+    shards["livro"] = FakeShard([("livro:0", 0.1)], {"livro:0": "reconstruído"})
+    assert retriever.invoke("pergunta")[0].page_content == "reconstruído"
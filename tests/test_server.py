@@ -0,0 +1,119 @@
+"""Servidor ASGI sobre o grafo real, com LLM e embeddings falsos (sem rede)."""
+import asyncio
+import json
+from typing import List
+
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+
+from fakes import ANSWER, StaticRetriever, make_doc
+from src.server import RAGServer
+from src.use_cases.graph import RAGGraphBuilder
+from src.use_cases.service import RAGService
+
+
+async def request(app, method: str, path: str, body=None):
+    """Executa uma requisição HTTP no app ASGI: (status, headers, corpo)."""
+    payload = json.dumps(body).encode("utf-8") if body is not None else b""
+    messages = [{"type": "http.request", "body": payload, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app({"type": "http", "method": method, "path": path}, receive, send)
+    start = sent[0]
+    headers = {key.decode(): value.decode() for key, value in start["headers"]}
+    content = b"".join(message.get("body", b"") for message in sent[1:])
+    return start["status"], headers, content
+
+
+def sse_events(content: bytes) -> List[dict]:
+    events = []
+    for block in content.decode("utf-8").strip().split("\n\n"):
+        data = [line[len("data: "):] for line in block.splitlines() if line.startswith("data: ")]
+        events.append(json.loads(data[0]))
+    return events
+
+
+@pytest.fixture
+def service(fake_llm, fake_embeddings):
+    retriever = StaticRetriever(
+        documents=[
+            make_doc("dom_casmurro:0", "Bentinho conta a própria história já velho, no Engenho Novo."),
+            make_doc("dom_casmurro:1", "Capitu tinha olhos de cigana oblíqua e dissimulada."),
+        ],
+        embeddings=fake_embeddings,
+    )
+    builder = RAGGraphBuilder(retriever, corpus_description="o livro 'Dom Casmurro'", checkpointer=MemorySaver())
+    return RAGService(builder.build(async_mode=True))
+
+
+def test_health_and_ready(service):
+    async def scenario():
+        server = RAGServer(service=service)
+        return await request(server, "GET", "/health"), await request(server, "GET", "/ready")
+
+    (health_status, _, health), (ready_status, _, ready) = asyncio.run(scenario())
+    assert health_status == 200 and json.loads(health) == {"status": "ok"}
+    assert ready_status == 200 and json.loads(ready)["status"] == "ready"
+
+
+def test_ready_reports_load_error():
+    def failing_factory():
+        raise RuntimeError("índice ausente")
+
+    status, _, body = asyncio.run(request(RAGServer(service_factory=failing_factory), "GET", "/ready"))
+    assert status == 503
+    assert json.loads(body) == {"status": "error", "error": "índice ausente"}
+
+
+def test_ask_returns_answer_and_sources(service):
+    server = RAGServer(service=service)
+    status, headers, body = asyncio.run(
+        request(server, "POST", "/ask", {"question": "Quem narra Dom Casmurro?", "session_id": "s1"})
+    )
+    payload = json.loads(body)
+    assert status == 200
+    assert headers["content-type"].startswith("application/json")
+    assert payload["answer"] == ANSWER
+    assert payload["validated"] is True
+    assert payload["session_id"] == "s1"
+    assert set(payload["sources"]) <= {"dom_casmurro:0", "dom_casmurro:1"} and payload["sources"]
+
+
+def test_ask_validates_body(service):
+    server = RAGServer(service=service)
+    status, _, body = asyncio.run(request(server, "POST", "/ask", {"question": "  "}))
+    assert status == 400
+    assert "question" in json.loads(body)["error"]
+
+
+def test_ask_stream_emits_tokens_then_done(service):
+    server = RAGServer(service=service)
+    status, headers, body = asyncio.run(
+        request(server, "POST", "/ask/stream", {"question": "Quem narra Dom Casmurro?", "session_id": "s2"})
+    )
+    events = sse_events(body)
+    assert status == 200
+    assert headers["content-type"].startswith("text/event-stream")
+    assert "".join(event["text"] for event in events if event["kind"] == "token") == ANSWER
+    assert [event["validated"] for event in events if event["kind"] == "validated"] == [True]
+    assert events[-1]["kind"] == "done" and events[-1]["answer"] == ANSWER
+
+
+def test_session_locks_are_released(service):
+    async def scenario():
+        server = RAGServer(service=service)
+        await asyncio.gather(
+            request(server, "POST", "/ask", {"question": "Quem narra Dom Casmurro?", "session_id": "s3"}),
+            request(server, "POST", "/ask", {"question": "Quem é Capitu?", "session_id": "s3"}),
+            request(server, "POST", "/ask", {"question": "Quem é Capitu?"}),
+        )
+
+    asyncio.run(scenario())
+    assert service._session_locks == {}
+    assert service._session_users == {}
@@ -0,0 +1,52 @@
+"""RAGService: várias sessões concorrentes no mesmo grafo assíncrono."""
+import asyncio
+
+from fakes import ANSWER, StaticRetriever, make_doc
+from src.use_cases.graph import RAGGraphBuilder
+from src.use_cases.service import RAGService
+
+
+def service() -> RAGService:
+    retriever = StaticRetriever(documents=[make_doc("livro:0", "Bentinho narra a história.")])
+    builder = RAGGraphBuilder(retriever=retriever, corpus_description="o livro 'Dom Casmurro'", speculative=False)
+    return RAGService(builder.build(async_mode=True))
+
+
+def test_sessions_keep_separate_histories(fake_llm):
+    rag = service()
+
+    async def run():
+        await asyncio.gather(
+            rag.ask("Quem narra o livro?", "a"),
+            rag.ask("Quem é Capitu?", "b"),
+        )
+        await rag.ask("E Escobar?", "a")
+        return [(await rag.app.aget_state(rag.config_for(session))).values for session in ("a", "b")]
+
+    first, second = asyncio.run(run())
+    assert first["generation"] == second["generation"] == ANSWER
+    assert len(first["chat_history"]) == 2 * len(second["chat_history"])
+
+
+def test_questions_of_one_session_run_one_at_a_time(fake_llm):
+    rag = service()
+    running = []
+    overlaps = []
+    ainvoke = rag.app.ainvoke
+
+    async def tracked(inputs, config=None, **kwargs):
+        running.append(config["configurable"]["thread_id"])
+        overlaps.append(len(running))
+        await asyncio.sleep(0.01)
+        try:
+            return await ainvoke(inputs, config=config, **kwargs)
+        finally:
+            running.pop()
+
+    rag.app.ainvoke = tracked
+
+    async def run():
+        await asyncio.gather(*(rag.ask(f"Pergunta {i}", "a") for i in range(3)))
+
+    asyncio.run(run())
+    assert overlaps == [1, 1, 1]
@@ -0,0 +1,90 @@
+"""Conversão dos eventos do grafo em StreamEvents: tokens, validação e retração."""
+import asyncio
+
+from langchain_core.messages import AIMessageChunk
+
+from src.use_cases.streaming import (
+    GENERATION_NODE,
+    REWRITE_NODE,
+    VALIDATION_NODE,
+    _StreamTracker,
+    astream_graph,
+    stream_graph,
+)
+
+
+def token(text: str, node: str = GENERATION_NODE):
+    return "messages", (AIMessageChunk(content=text), {"langgraph_node": node})
+
+
+def update(node: str, values=None):
+    return "updates", {node: values or {}}
+
+
+def kinds(events):
+    return [event.kind for event in events]
+
+
+class ScriptedGraph:
+    """Grafo compilado falso: repete uma sequência fixa de eventos de stream."""
+
+    def __init__(self, script, final_state):
+        self.script = script
+        self.final_state = final_state
+
+    def stream(self, inputs, config=None, stream_mode=None):
+        yield from self.script
+
+    async def astream(self, inputs, config=None, stream_mode=None):
+        for item in self.script:
+            yield item
+
+    def get_state(self, config):
+        return type("Snapshot", (), {"values": self.final_state})()
+
+    async def aget_state(self, config):
+        return self.get_state(config)
+
+
+def test_only_generation_tokens_are_streamed():
+    tracker = _StreamTracker()
+    events = [*tracker.events(*token("{\"binary_score\"", node="grade_documents")), *tracker.events(*token("Capitu"))]
+    assert [(event.kind, event.text) for event in events] == [("token", "Capitu")]
+    assert tracker.ttft is not None
+
+
+def test_content_parts_are_joined():
+    tracker = _StreamTracker()
+    chunk = AIMessageChunk(content=[{"type": "text", "text": "olhos "}, {"type": "text", "text": "de ressaca"}])
+    events = list(tracker.events("messages", (chunk, {"langgraph_node": GENERATION_NODE})))
+    assert events[0].text == "olhos de ressaca"
+
+
+def test_rejected_answer_is_retracted_before_the_retry():
+    script = [
+        token("Primeira "), token("versão"),
+        update(VALIDATION_NODE, {"validated": False}),
+        update(REWRITE_NODE, {"question": "pergunta reescrita"}),
+        token("Segunda versão"),
+        update(VALIDATION_NODE, {"validated": True}),
+    ]
+    events = list(stream_graph(ScriptedGraph(script, {"generation": "Segunda versão"}), {}, {}))
+    assert kinds(events) == ["token", "token", "validated", "retract", "token", "validated", "done"]
+    assert [event.validated for event in events if event.kind == "validated"] == [False, True]
+    assert events[-1].state == {"generation": "Segunda versão"}
+
+
+def test_no_retraction_when_nothing_was_streamed():
+    tracker = _StreamTracker()
+    events = [*tracker.events(*update(REWRITE_NODE)), *tracker.events(*update(VALIDATION_NODE, {"validated": True}))]
+    assert events == []
+
+
+def test_async_stream_emits_the_same_events():
+    script = [token("Capitu"), update(VALIDATION_NODE, {"validated": True})]
+    graph = ScriptedGraph(script, {"generation": "Capitu"})
+
+    async def collect():
+        return [event async for event in astream_graph(graph, {}, {})]
+
+    assert kinds(asyncio.run(collect())) == kinds(stream_graph(graph, {}, {})) == ["token", "validated", "done"]
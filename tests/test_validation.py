@@ -0,0 +1,33 @@
+"""Guardrail de entrada e validação de alucinação quando o modelo não chama a ferramenta."""
+import asyncio
+
+import pytest
+
+from fakes import ANSWER, NO_TOOL_CALL, make_doc
+from src.use_cases.nodes import RAGNodes
+
+
+@pytest.fixture
+def nodes(fake_llm):
+    return RAGNodes(retriever=None, corpus_description="o livro 'Dom Casmurro'")
+
+
+def generation_state(text: str) -> dict:
+    return {"question": "Quem narra o livro?", "generation": ANSWER, "context": text,
+            "documents": [make_doc("livro:0", text)]}
+
+
+def test_guardrail_without_tool_call_is_an_error(nodes, fake_llm):
+    question = f"Quem é Capitu? {NO_TOOL_CALL}"
+    # Mesmo caminho de uma falha da API: a pergunta segue sem decisão do guardrail
+    assert nodes.guardrails_check({"question": question}) == {"question": question}
+    assert asyncio.run(nodes.aguardrails_check({"question": question})) == {"question": question}
+    assert fake_llm.calls == {"InputGuardrail": 2}
+
+
+def test_validation_without_tool_call_is_not_validated(nodes):
+    state = generation_state(f"Bentinho narra a história. {NO_TOOL_CALL}")
+    expected = {"generation": ANSWER, "hallucination": False, "validated": False}
+    assert nodes.validate_generation(state) == expected
+    assert asyncio.run(nodes.avalidate_generation(state)) == expected
+    assert nodes.validate_generation(generation_state("Bentinho narra a história."))["validated"] is True